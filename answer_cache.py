@@ -0,0 +1,74 @@
+# answer_cache.py
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+# ===========================
+# Configuración
+# ===========================
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "128"))
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+class SemanticAnswerCache:
+    """
+    Caché de respuestas del chat indexada por el embedding de la pregunta y el
+    conjunto de archivos de la colección. Una pregunta cuya similitud coseno con
+    otra ya respondida supere 'threshold' reutiliza su respuesta y contexto.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, query_vector: List[float], file_hashes: Iterable[str]) -> Optional[dict]:
+        files = frozenset(file_hashes)
+        query = _normalize(query_vector)
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id, entry in self._entries.items():
+                if entry["files"] != files:
+                    continue
+                score = sum(a * b for a, b in zip(query, entry["vector"]))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            entry = self._entries[best_id]
+            return {"answer": entry["answer"], "context": entry["context"], "score": best_score}
+
+    def store(self, query_vector: List[float], file_hashes: Iterable[str], answer: str, context: list):
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": _normalize(query_vector),
+                "files": frozenset(file_hashes),
+                "answer": answer,
+                "context": context,
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Descarta todas las respuestas (la colección de documentos cambió)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+API HTTP ligera (asyncio, sin Streamlit) sobre el mismo código de recuperación
+y prompts que la app:
+
+    POST /ingest   cuerpo = bytes del PDF, cabecera X-Filename opcional
+    POST /query    {"question": "...", "filehashes": ["..."], "k": 5}
+                   (o "all_documents": true para buscar en todo el índice)
+    POST /summary  {"filehash": "..."}
+    GET  /health
+    GET  /metrics  métricas en formato de texto de Prometheus
+
+    python api_server.py --host 0.0.0.0 --port 8000
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Union
+
+from context_packing import strip_overlap
+from metrics import REGISTRY, stage_timer
+from prompts import build_chat_prompt, build_summary_prompt
+
+logger = logging.getLogger("api_server")
+
+# ===========================
+# Configuración
+# ===========================
+API_MAX_BODY_MB = float(os.getenv("API_MAX_BODY_MB", "200"))
+API_WORKERS = int(os.getenv("API_WORKERS", "8"))
+API_LLM_CONCURRENCY = int(os.getenv("API_LLM_CONCURRENCY", "2"))
+API_MAX_K = int(os.getenv("API_MAX_K", "50"))
+SUMMARY_HEAD_CHARS = 2000
+# Chunks que se leen del índice para rehacer la cabecera de un archivo
+SUMMARY_HEAD_CHUNKS = 10
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 501: "Not Implemented"}
+
+
+class CopilotService:
+    """
+    Operaciones de la API. Los componentes (embeddings, índice, LLM) se inyectan
+    para poder probar el servidor con dobles en lugar de Ollama y Chroma.
+    """
+
+    def __init__(self, embeddings, index, llm, ingest_fn=None):
+        self.embeddings = embeddings
+        self.index = index
+        self.llm = llm
+        self.ingest_fn = ingest_fn
+
+    def ingest(self, file_bytes: bytes, filename: str) -> dict:
+        if self.ingest_fn is None:
+            raise HTTPError(501, "La ingesta no está disponible en este servidor")
+        return self.ingest_fn(file_bytes, filename)
+
+    def retrieve(self, question: str, filehashes=None, k: int = 5) -> list:
+        query_vector = self.embeddings.embed_query(question)
+        kwargs = {}
+        if filehashes:
+            kwargs["filter"] = {"filehash": {"$in": sorted(filehashes)}}
+        with stage_timer("retrieval"):
+            return self.index.similarity_search_by_vector(query_vector, k=k, **kwargs)
+
+    def query(self, question: str, filehashes=None, k: int = 5) -> dict:
+        relevant_chunks = self.retrieve(question, filehashes, k)
+        with stage_timer("prompt_build"):
+            prompt = build_chat_prompt(question, relevant_chunks)
+        with stage_timer("llm_chat"):
+            answer = self.llm.invoke(prompt, operation="chat")
+        return {
+            "answer": answer,
+            "context": [
+                {
+                    "source": chunk.metadata.get("source"),
+                    "filehash": chunk.metadata.get("filehash"),
+                    "chunk_id": chunk.metadata.get("chunk_id"),
+                    "content": chunk.page_content,
+                }
+                for chunk in relevant_chunks
+            ],
+        }
+
+    def summary(self, text: str, doc_type: str) -> dict:
+        with stage_timer("prompt_build"):
+            prompt = build_summary_prompt(text[:SUMMARY_HEAD_CHARS], doc_type)
+        with stage_timer("llm_summary"):
+            summary = self.llm.invoke(prompt, operation="summary")
+        return {"summary": summary, "doc_type": doc_type}
+
+    def indexed_head(self, filehash: str) -> Tuple[str, str]:
+        """
+        Cabecera de un archivo rehecha con sus primeros chunks del índice (los
+        ids son {filehash}-{n}), para cuando su texto no está en la caché de
+        extracción. Devuelve (texto, tipo de documento).
+        """
+        found = self.index.get(ids=[f"{filehash}-{i}" for i in range(SUMMARY_HEAD_CHUNKS)],
+                               include=["documents", "metadatas"])
+        if not found["ids"]:
+            raise HTTPError(404, f"Archivo no ingerido: {filehash}")
+        chunks = sorted(zip(found["metadatas"], found["documents"]),
+                        key=lambda item: item[0].get("chunk_id", 0))
+        head = ""
+        for _, text in chunks:
+            following = strip_overlap(head, text) if head else text
+            # Sin solapamiento detectado los chunks se separan con un salto de línea
+            head += following if len(following) < len(text.lstrip()) else "\n" + following
+            if len(head) >= SUMMARY_HEAD_CHARS:
+                break
+        return head.strip()[:SUMMARY_HEAD_CHARS], chunks[0][0].get("doc_type", "documento_generico")
+
+
+def build_default_service() -> Tuple[CopilotService, callable]:
+    """Servicio real: embeddings compartidos, índice persistente y Ollama."""
+    from boilerplate import config_version
+    from embedding_service import get_shared_embeddings
+    from extraction_cache import get_extraction_cache
+    from llm_client import get_llm_client
+    from pipeline import open_document
+    from vector_index import get_shared_index, index_chunks
+
+    embeddings = get_shared_embeddings()
+    index = get_shared_index(embeddings)
+    llm = get_llm_client()
+    llm.preload_async()
+
+    def ingest(file_bytes: bytes, filename: str) -> dict:
+        filehash = hashlib.md5(file_bytes).hexdigest()
+        document = open_document(file_bytes, filehash, filename)
+        file_chunks, embedded = index_chunks(
+            index, filehash, filename, document.doc_type, document.chunks(),
+            complete=lambda: not document.skipped_pages)
+        file_chunks.close()
+        return {"filehash": filehash, "doc_type": document.doc_type,
+                "chunks": len(file_chunks), "embedded": embedded,
+                "boilerplate_chars": document.boilerplate_chars,
+                "skipped_pages": document.skipped_pages}
+
+    def summary_source(filehash: str) -> Optional[Tuple[str, str]]:
+        """Cabecera desde la caché de extracción (None si no está)."""
+        opened = get_extraction_cache().open_pages(filehash, config_version())
+        if opened is None:
+            return None
+        doc_type, pages = opened
+        head = ""
+        for page in pages:
+            if page:
+                head += page + "\n"
+            if len(head) >= SUMMARY_HEAD_CHARS:
+                break
+        pages.close()
+        return head[:SUMMARY_HEAD_CHARS], doc_type
+
+    return CopilotService(embeddings, index, llm, ingest_fn=ingest), summary_source
+
+
+class APIServer:
+    def __init__(self, service: CopilotService, summary_source=None,
+                 workers: int = API_WORKERS, llm_concurrency: int = API_LLM_CONCURRENCY,
+                 max_body_bytes: int = int(API_MAX_BODY_MB * 1024 * 1024)):
+        self.service = service
+        self.summary_source = summary_source
+        self.max_body_bytes = max_body_bytes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._llm_slots = asyncio.Semaphore(llm_concurrency)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str, port: int) -> int:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Línea de petición inválida")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HTTPError(400, "Content-Length inválido")
+        if length < 0:
+            raise HTTPError(400, "Content-Length inválido")
+        if length > self.max_body_bytes:
+            raise HTTPError(413, "Cuerpo demasiado grande")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, payload = 200, await self._dispatch(method, path, headers, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    logger.exception("❌ Error atendiendo petición")
+                    status, payload = 500, {"error": str(e)}
+
+                if isinstance(payload, str):
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                    data = payload.encode("utf-8")
+                else:
+                    content_type = "application/json; charset=utf-8"
+                    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                     f"Content-Type: {content_type}\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                     ).encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _json(body: bytes) -> dict:
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "JSON inválido")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Se esperaba un objeto JSON")
+        return data
+
+    async def _dispatch(self, method: str, path: str, headers: dict, body: bytes) -> Union[dict, str]:
+        if path == "/health":
+            return {"status": "ok"}
+        if path == "/metrics":
+            return REGISTRY.render()
+        if method != "POST":
+            raise HTTPError(405 if path in ("/ingest", "/query", "/summary") else 404,
+                            f"{method} {path} no soportado")
+
+        if path == "/ingest":
+            if not body:
+                raise HTTPError(400, "Falta el PDF en el cuerpo")
+            filename = headers.get("x-filename", "documento.pdf")
+            return await self._run(self.service.ingest, body, filename)
+
+        if path == "/query":
+            data = self._json(body)
+            question = data.get("question")
+            if not isinstance(question, str) or not question.strip():
+                raise HTTPError(400, "Falta 'question'")
+            question = question.strip()
+            # Buscar en todo el índice mezcla documentos de otros usuarios: solo a petición
+            if data.get("all_documents") is True:
+                filehashes = None
+            else:
+                filehashes = data.get("filehashes")
+                if not (isinstance(filehashes, list) and filehashes
+                        and all(isinstance(h, str) and h for h in filehashes)):
+                    raise HTTPError(400, "'filehashes' debe ser una lista no vacía de hashes "
+                                         "(o \"all_documents\": true)")
+            k = data.get("k", 5)
+            if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= API_MAX_K:
+                raise HTTPError(400, f"'k' debe ser un entero entre 1 y {API_MAX_K}")
+            async with self._llm_slots:
+                return await self._run(self.service.query, question, filehashes, k)
+
+        if path == "/summary":
+            data = self._json(body)
+            if "text" in data:
+                text, doc_type = data["text"], data.get("doc_type", "documento_generico")
+                if not isinstance(text, str) or not text.strip():
+                    raise HTTPError(400, "'text' debe ser un texto no vacío")
+                if not isinstance(doc_type, str):
+                    raise HTTPError(400, "'doc_type' debe ser un texto")
+            elif isinstance(data.get("filehash"), str) and data["filehash"]:
+                source = None
+                if self.summary_source is not None:
+                    source = await self._run(self.summary_source, data["filehash"])
+                if source is None:
+                    # Fuera de la caché (desalojado o con páginas omitidas): del índice
+                    source = await self._run(self.service.indexed_head, data["filehash"])
+                text, doc_type = source
+            else:
+                raise HTTPError(400, "Falta 'filehash' o 'text'")
+            async with self._llm_slots:
+                return await self._run(self.service.summary, text, doc_type)
+
+        raise HTTPError(404, f"Ruta desconocida: {path}")
+
+
+async def _main_async(host: str, port: int):
+    service, summary_source = build_default_service()
+    server = APIServer(service, summary_source)
+    bound = await server.start(host, port)
+    logger.info(f"🚀 API escuchando en http://{host}:{bound}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    try:
+        asyncio.run(_main_async(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,23 @@
 import streamlit as st
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_community.llms import Ollama
-from langchain.schema import Document
 import re
-import hashlib
-import io
 import uuid
-import shutil
 import os
 import logging
 import time
 from datetime import datetime
 
 from prompts import build_summary_prompt, build_chat_prompt
-from patterns import detect_document_type
+from pipeline import fileobj_md5, open_document
+from embedding_service import get_shared_embeddings, warm_up_async
+from streaming import StreamStats, timed_stream
+from summary_worker import collect_finished, submit_summary
+from answer_cache import SemanticAnswerCache
+from metrics import stage_timer, start_exporters, timed_iter
+from llm_client import OllamaClient, get_llm_client
+from chunk_registry import ChunkRegistry
+from chunk_store import sweep_stale_files_once
+from embedding_cache import stats_delta
+from vector_index import get_shared_index, index_chunks, session_filter
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,7 +34,15 @@ st.title("Copiloto Conversacional para PDFs")
 # ===========================
 # Configuración
 # ===========================
-CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "")
+SUMMARY_HEAD_CHARS = 2000
+SUMMARY_POLL_SECONDS = float(os.getenv("SUMMARY_POLL_SECONDS", "2"))
+
+# El modelo de embeddings es único por proceso; se precarga al arrancar el servidor
+warm_up_async()
+# Endpoint /metrics o volcado a archivo (METRICS_PORT / METRICS_FILE), una vez por proceso
+start_exporters()
+# Archivos de chunks de sesiones de procesos anteriores, una vez por proceso
+sweep_stale_files_once()
 
 
 # ===========================
@@ -41,36 +50,24 @@ CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "")
 # ===========================
 
 def remove_file_by_hash(filehash: str):
-    try:
-        vs = st.session_state.get("vectorstore")
-        ids = st.session_state.get("doc_ids_by_filehash", {}).get(filehash, [])
-        if vs is not None:
-            if ids:
-                try:
-                    vs.delete(ids=ids)
-                except Exception:
-                    pass
-            else:
-                try:
-                    vs.delete(where={"filehash": filehash})
-                except Exception:
-                    pass
-    except Exception:
-        pass
-
-    st.session_state["pdf_chunks"] = [
-        d for d in st.session_state.get("pdf_chunks", [])
-        if d.metadata.get("filehash") != filehash
-    ]
+    # Los vectores del archivo quedan en el índice compartido para otras
+    # sesiones; basta con sacarlo del filtro de esta sesión.
+    if "chunk_registry" in st.session_state:
+        st.session_state["chunk_registry"].remove_file(filehash)
 
     st.session_state["summaries"] = [
         s for s in st.session_state.get("summaries", [])
         if s.get("filehash") != filehash
     ]
 
+    future = st.session_state.get("summary_futures", {}).pop(filehash, None)
+    if future is not None:
+        future.cancel()
+
+    if "answer_cache" in st.session_state:
+        st.session_state["answer_cache"].invalidate()
+
     st.session_state.get("processed_hashes", set()).discard(filehash)
-    if "doc_ids_by_filehash" in st.session_state:
-        st.session_state["doc_ids_by_filehash"].pop(filehash, None)
 
 
 def remove_all_files_one_by_one():
@@ -79,51 +76,23 @@ def remove_all_files_one_by_one():
         remove_file_by_hash(fh)
 
 
-def _delete_chroma_collection_if_possible():
-    """Intenta borrar la colección actual de Chroma (si existe y hay cliente)."""
-    try:
-        vs = st.session_state.get("vectorstore")
-        col_name = st.session_state.get("collection_name")
-        if vs is not None and col_name:
-            try:
-                vs._client.delete_collection(name=col_name)
-            except Exception:
-                try:
-                    coll = vs._client.get_collection(name=col_name)
-                    vs._client.delete_collection(name=coll.name)
-                except Exception:
-                    pass
-    except Exception:
-        pass
-
-
-def _delete_persist_dir_if_configured():
-    """Si hay persistencia configurada, borra el directorio en disco."""
-    try:
-        if CHROMA_PERSIST_DIR:
-            if os.path.isdir(CHROMA_PERSIST_DIR):
-                shutil.rmtree(CHROMA_PERSIST_DIR, ignore_errors=True)
-    except Exception:
-        pass
-
-
 def _reset_core_state(regen_uploader: bool = True):
     st.session_state["vectorstore"] = None
     st.session_state["embeddings"] = None
     st.session_state["chat_messages"] = []
-    st.session_state["pdf_chunks"] = []
+    if "chunk_registry" in st.session_state:
+        st.session_state["chunk_registry"].clear()
+    st.session_state["chunk_registry"] = ChunkRegistry()
     st.session_state["summaries"] = []
+    st.session_state["summary_futures"] = {}
+    st.session_state["answer_cache"] = SemanticAnswerCache()
     st.session_state["processed_hashes"] = set()
-    st.session_state["doc_ids_by_filehash"] = {}
-    st.session_state["collection_name"] = f"langchain-{uuid.uuid4().hex[:8]}"
     if regen_uploader:
         st.session_state["uploader_key"] = f"uploader-{uuid.uuid4().hex[:6]}"
 
 
 def _full_reset(regen_uploader: bool = True):
     remove_all_files_one_by_one()
-    _delete_chroma_collection_if_possible()
-    _delete_persist_dir_if_configured()
     _reset_core_state(regen_uploader=regen_uploader)
 
 
@@ -135,8 +104,8 @@ if "_fresh_session_initialized" not in st.session_state:
     _full_reset(regen_uploader=True)
     st.session_state["_fresh_session_initialized"] = True
 
-if 'pdf_chunks' not in st.session_state:
-    st.session_state.pdf_chunks = []
+if 'chunk_registry' not in st.session_state:
+    st.session_state.chunk_registry = ChunkRegistry()
 if 'vectorstore' not in st.session_state:
     st.session_state.vectorstore = None
 if 'embeddings' not in st.session_state:
@@ -147,10 +116,12 @@ if 'chat_messages' not in st.session_state:
     st.session_state.chat_messages = []
 if 'summaries' not in st.session_state:
     st.session_state.summaries = []
-if 'collection_name' not in st.session_state:
-    st.session_state.collection_name = f"langchain-{uuid.uuid4().hex[:8]}"
-if 'doc_ids_by_filehash' not in st.session_state:
-    st.session_state.doc_ids_by_filehash = {}
+if 'summary_futures' not in st.session_state:
+    st.session_state.summary_futures = {}
+if 'answer_cache' not in st.session_state:
+    st.session_state.answer_cache = SemanticAnswerCache()
+if 'upload_hashes' not in st.session_state:
+    st.session_state.upload_hashes = {}
 if 'uploader_key' not in st.session_state:
     st.session_state.uploader_key = f"uploader-{uuid.uuid4().hex[:6]}"
 
@@ -196,83 +167,20 @@ with st.sidebar:
 # Inicializar Llama3 local
 # ===========================
 
-ollama_base = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
-ollama_model = os.getenv("OLLAMA_MODEL", "llama3:8b")
-
-# Inicializar el modelo de lenguaje local
-llm: Ollama = Ollama(
-    model=ollama_model,
-    temperature=0.1,
-    base_url=ollama_base,
-    num_predict=512,
-    top_k=10,
-    top_p=0.9,
-    repeat_penalty=1.1
-)
-
-# ===========================
-# Patterns
-# ===========================
-
-
-def create_adaptive_chunks(text: str, doc_type: str, filename: str, filehash: str):
-    if doc_type == 'guion_pelicula':
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=2000, chunk_overlap=300,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]
-        )
-    elif doc_type == 'articulo_academico':
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1500, chunk_overlap=200,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]
-        )
-    elif doc_type == 'curriculum_vitae':
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800, chunk_overlap=100,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]
-        )
-    elif doc_type == 'brochure_educativo':
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800, chunk_overlap=100,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]
-        )
-    elif doc_type == 'brochure_servicios':
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800, chunk_overlap=100,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]
-        )
-    else:
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1200, chunk_overlap=200,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]
-        )
-
-    basic_chunks = splitter.split_text(text)
-    documents = []
-    for i, chunk in enumerate(basic_chunks):
-        documents.append(
-            Document(
-                page_content=chunk,
-                metadata={
-                    'source': filename,
-                    'filehash': filehash,
-                    'doc_type': doc_type,
-                    'chunk_id': i,
-                    'chunk_size': len(chunk),
-                    'total_chunks': len(basic_chunks)
-                }
-            )
-        )
-    return documents
-
+# Cliente único por proceso (pool de conexiones y keep_alive); la precarga
+# del modelo se lanza al arrancar para que la primera pregunta no la pague
+llm: OllamaClient = get_llm_client()
+llm.preload_async()
 
 def create_smart_summary(text: str, doc_type: str, filename: str) -> str:
-    text_limited = text[:2000] if len(text) > 2000 else text
+    text_limited = text[:SUMMARY_HEAD_CHARS] if len(text) > SUMMARY_HEAD_CHARS else text
     logger.info(
         f"📝 Texto limitado a {len(text_limited)} caracteres para resumen")
 
-    prompt = build_summary_prompt(text_limited, doc_type)
-    return llm.invoke(prompt)
+    with stage_timer("prompt_build"):
+        prompt = build_summary_prompt(text_limited, doc_type)
+    with stage_timer("llm_summary"):
+        return llm.invoke(prompt, operation="summary")
 
 
 def unique_label(base_label: str, existing_labels: set, suffix: str) -> str:
@@ -299,14 +207,19 @@ if 'uploaded_files' not in locals():
 
 if uploaded_files:
     if st.session_state.embeddings is None:
-        st.session_state.embeddings = SentenceTransformerEmbeddings(
-            model_name="all-MiniLM-L6-v2"
-        )
-
-    current_hashes = set()
-    for f in uploaded_files:
-        fb = f.getvalue()
-        current_hashes.add(hashlib.md5(fb).hexdigest())
+        st.session_state.embeddings = get_shared_embeddings()
+
+    # Hash por subida, calculado leyendo por bloques y memorizado por file_id:
+    # en cada rerun no se vuelven a copiar ni a hashear los bytes
+    known_hashes = st.session_state.upload_hashes
+    upload_keys = [getattr(f, "file_id", None) or f"{f.name}:{f.size}" for f in uploaded_files]
+    for key, f in zip(upload_keys, uploaded_files):
+        if key not in known_hashes:
+            known_hashes[key] = fileobj_md5(f)
+    for key in set(known_hashes) - set(upload_keys):
+        del known_hashes[key]
+    file_hashes = [known_hashes[key] for key in upload_keys]
+    current_hashes = set(file_hashes)
 
     removed_hashes = st.session_state.processed_hashes - current_hashes
     for fh in list(removed_hashes):
@@ -314,101 +227,71 @@ if uploaded_files:
 
     existing_labels = {item['label'] for item in st.session_state.summaries}
 
-    for pdf_file in uploaded_files:
+    ingest_bar = st.progress(0, text="Procesando archivos...")
+    files_done = 0
+
+    for pdf_file, filehash in zip(uploaded_files, file_hashes):
         start_time = time.time()
         logger.info(f"🚀 Iniciando procesamiento de: {pdf_file.name}")
 
         try:
-            file_bytes = pdf_file.getvalue()
-            filehash = hashlib.md5(file_bytes).hexdigest()
             logger.info(f"📄 Hash del archivo: {filehash[:8]}...")
 
             if filehash in st.session_state.processed_hashes:
                 logger.info(f"⏭️ Archivo ya procesado: {pdf_file.name}")
                 continue
 
-            logger.info(f"📖 Extrayendo texto de {pdf_file.name}...")
-            reader = PdfReader(io.BytesIO(file_bytes))
-            full_text = ""
-            total_pages = len(reader.pages)
-            logger.info(f"📄 Total de páginas: {total_pages}")
-
-            for i, page in enumerate(reader.pages, 1):
-                page_text = page.extract_text()
-                if page_text:
-                    full_text += page_text + "\n"
-                    if i % 5 == 0:  # Log cada 5 páginas
-                        logger.info(f"📄 Página {i}/{total_pages} procesada")
-
-            logger.info(f"✅ Texto extraído: {len(full_text)} caracteres")
-
-            logger.info(f"🔍 Detectando tipo de documento...")
-
-            # Aquí se usa Patterns #
-
-            doc_type = detect_document_type(full_text, pdf_file.name)
+            extract_bar = st.progress(
+                0, text=f"Extrayendo texto de {pdf_file.name}...")
+
+            def _on_extract_progress(done: int, total: int):
+                extract_bar.progress(
+                    done / total, text=f"Extrayendo texto de {pdf_file.name}... {done}/{total} páginas")
+                if done == total or done % 5 == 0:
+                    logger.info(f"📄 Página {done}/{total} procesada")
+
+            # El resumen sólo necesita la cabecera: se encola en cuanto está
+            # extraída y se genera en paralelo con el resto de la ingesta
+            def _dispatch_summary(head: str, doc_type: str):
+                logger.info(f"🤖 Encolando resumen con IA ({len(head)} caracteres iniciales)...")
+                st.session_state.summary_futures[filehash] = submit_summary(
+                    create_smart_summary, pdf_file.name, head, doc_type, pdf_file.name)
+
+            # Ingesta en streaming: páginas → chunks → lotes de embeddings.
+            # En memoria sólo quedan la cabecera para el resumen y un lote de chunks.
+            document = open_document(
+                pdf_file, filehash, pdf_file.name,
+                progress_callback=_on_extract_progress,
+                head_chars=SUMMARY_HEAD_CHARS,
+                on_head=_dispatch_summary)
+            doc_type = document.doc_type
             logger.info(f"🏷️ Tipo detectado: {doc_type}")
 
-            logger.info(f"✂️ Creando chunks adaptativos...")
-            documents = create_adaptive_chunks(
-                full_text, doc_type, pdf_file.name, filehash
-            )
-            logger.info(f"📦 Chunks creados: {len(documents)} chunks")
-
-            ids = [f"{filehash}-{i}" for i in range(len(documents))]
-
-            logger.info(f"🗄️ Indexando documentos en vectorstore...")
             if st.session_state.vectorstore is None:
-                logger.info(
-                    f"🆕 Creando nueva colección: {st.session_state.collection_name}")
-                st.session_state.vectorstore = Chroma.from_documents(
-                    documents,
-                    embedding=st.session_state.embeddings,
-                    collection_name=st.session_state.collection_name,
-                    persist_directory=(CHROMA_PERSIST_DIR or None),
-                    ids=ids
-                )
-                logger.info(f"✅ Colección creada exitosamente")
-            else:
-                logger.info(f"➕ Agregando documentos a colección existente")
-                st.session_state.vectorstore.add_documents(documents, ids=ids)
-                logger.info(f"✅ Documentos agregados a la colección")
-
-            st.session_state.doc_ids_by_filehash[filehash] = ids
-            st.session_state.pdf_chunks.extend(documents)
-
-            logger.info(f"🤖 Generando resumen con IA...")
-            summary_start = time.time()
-
-            progress_text = f"Generando resumen para {pdf_file.name}..."
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
-            with st.spinner(progress_text):
-                try:
-                    for i in range(5):
-                        progress_bar.progress((i + 1) * 20)
-                        status_text.text(f"Procesando... {20 * (i + 1)}%")
-                        time.sleep(0.1)
-
-                    summary = create_smart_summary(
-                        full_text, doc_type, pdf_file.name)
-
-                    summary_time = time.time() - summary_start
-                    logger.info(f"✅ Resumen generado en {summary_time:.2f}s")
-
-                    progress_bar.progress(100)
-                    status_text.text("✅ Resumen completado!")
-
-                except Exception as e:
-                    logger.error(f"❌ Error generando resumen: {e}")
-                    st.error(f"Error generando resumen: {e}")
-                    summary = f"Error al procesar el resumen: {str(e)}"
+                st.session_state.vectorstore = get_shared_index(
+                    st.session_state.embeddings)
+            logger.info(f"✂️ Troceando e indexando en streaming...")
+            stats_before = st.session_state.embeddings.stats()
+            file_chunks, _ = index_chunks(
+                st.session_state.vectorstore, filehash, pdf_file.name, doc_type,
+                document.chunks(), complete=lambda: not document.skipped_pages)
+            extract_bar.empty()
+            logger.info(
+                f"✅ {document.page_count} páginas, {document.char_count} caracteres, "
+                f"{len(file_chunks)} chunks")
+            if document.skipped_pages:
+                st.warning(
+                    f"{pdf_file.name}: no se pudo extraer el texto de las páginas "
+                    f"{', '.join(map(str, document.skipped_pages))}; se indexó el resto.")
+
+            # Las estadísticas son del proceso (compartidas entre sesiones):
+            # se registra solo lo que cambió al indexar este archivo
+            cache_stats = stats_delta(stats_before, st.session_state.embeddings.stats())
+            logger.info(
+                f"🧮 Caché de embeddings para {pdf_file.name}: {cache_stats['hits']} aciertos, "
+                f"{cache_stats['misses']} fallos ({cache_stats['hit_rate']:.0%})")
 
-                finally:
-                    time.sleep(2)
-                    progress_bar.empty()
-                    status_text.empty()
+            st.session_state.chunk_registry.add(file_chunks)
 
             label = unique_label(
                 pdf_file.name, existing_labels, suffix=filehash[:6])
@@ -419,28 +302,61 @@ if uploaded_files:
                 f"🎉 Procesamiento completado: {pdf_file.name} en {total_time:.2f}s")
 
             st.session_state.processed_hashes.add(filehash)
+            st.session_state.answer_cache.invalidate()
             st.session_state.summaries.append({
                 "label": label,
                 "filename": pdf_file.name,
                 "filehash": filehash,
-                "summary": summary
+                "summary": None,
+                "pending": True
             })
 
         except Exception as e:
             st.error(f"No se pudo procesar {pdf_file.name}: {e}")
+            # El resumen pudo encolarse antes del fallo
+            future = st.session_state.summary_futures.pop(filehash, None)
+            if future is not None:
+                future.cancel()
+
+        finally:
+            files_done += 1
+            ingest_bar.progress(
+                files_done / len(uploaded_files),
+                text=f"Archivos procesados: {files_done}/{len(uploaded_files)}")
+
+    ingest_bar.empty()
 
 # ===========================
 # Interfaz principal
 # ===========================
 
-if st.session_state.summaries:
+collect_finished(st.session_state.summaries, st.session_state.summary_futures)
+summaries_polling = bool(st.session_state.summary_futures)
+
+
+@st.fragment(run_every=(SUMMARY_POLL_SECONDS if summaries_polling else None))
+def render_summaries():
+    pending = collect_finished(
+        st.session_state.summaries, st.session_state.summary_futures)
+    if summaries_polling and not pending:
+        # Rerun completo para dejar de refrescar el fragmento
+        st.rerun()
+
+    if not st.session_state.summaries:
+        return
     st.subheader("🤖 Resúmenes Inteligentes")
     labels = [item["label"] for item in st.session_state.summaries]
     tabs = st.tabs(labels)
     for tab, item in zip(tabs, st.session_state.summaries):
         with tab:
             st.markdown(f"### 📄 {item['filename']}")
-            st.markdown(item["summary"])
+            if item.get("pending"):
+                st.info("⏳ Generando resumen... puedes chatear mientras tanto.")
+            else:
+                st.markdown(item["summary"])
+
+
+render_summaries()
 
 st.markdown("---")
 st.subheader("💬 Chat con el Copiloto")
@@ -451,7 +367,7 @@ for message in st.session_state.chat_messages:
         st.markdown(message["content"])
 
 # Mostrar mensaje de bienvenida si no hay PDFs
-if not st.session_state.pdf_chunks:
+if not st.session_state.chunk_registry:
     with st.chat_message("assistant"):
         st.markdown(
             "👋 ¡Hola! Sube algunos PDFs para poder ayudarte a responder preguntas sobre tu contenido.")
@@ -478,30 +394,55 @@ else:
             logger.info(
                 f"💬 Procesando pregunta del chat: {prompt[:50]}...")
 
-            with st.spinner("🤔 Pensando..."):
-                logger.info(f"🔍 Buscando chunks relevantes...")
-                relevant_chunks = st.session_state.vectorstore.similarity_search(
-                    prompt, k=5)
-                logger.info(
-                    f"📚 Chunks encontrados: {len(relevant_chunks)}")
+            query_vector = st.session_state.embeddings.embed_query(prompt)
+            cached_answer = st.session_state.answer_cache.lookup(
+                query_vector, st.session_state.processed_hashes)
 
-                final_prompt = build_chat_prompt(prompt, relevant_chunks)
-                logger.info(f"🤖 Generando respuesta con IA...")
-                response = llm.invoke(final_prompt)
-                chat_time = time.time() - chat_start
-                logger.info(f"✅ Respuesta generada en {chat_time:.2f}s")
+            if cached_answer is not None:
+                logger.info(
+                    f"♻️ Respuesta recuperada de caché (similitud {cached_answer['score']:.3f})")
+                response = cached_answer["answer"]
+                relevant_chunks = cached_answer["context"]
                 st.markdown(response)
+            else:
+                with st.spinner("🤔 Pensando..."):
+                    logger.info(f"🔍 Buscando chunks relevantes...")
+                    with stage_timer("retrieval"):
+                        relevant_chunks = [
+                            st.session_state.chunk_registry.resolve(doc)
+                            for doc in st.session_state.vectorstore.similarity_search_by_vector(
+                                query_vector, k=5,
+                                filter=session_filter(st.session_state.processed_hashes))
+                        ]
+                    logger.info(
+                        f"📚 Chunks encontrados: {len(relevant_chunks)}")
+
+                    with stage_timer("prompt_build"):
+                        final_prompt = build_chat_prompt(prompt, relevant_chunks)
 
-                with st.expander("🔍 Ver contexto usado para esta respuesta"):
-                    for i, chunk in enumerate(relevant_chunks, 1):
-                        md = chunk.metadata
-                        st.markdown(
-                            f"**Chunk {i}** - Fuente: {md.get('source', 'N/A')}")
-                        st.markdown(
-                            f"*Tipo: {md.get('doc_type', 'N/A')} | Tamaño: {md.get('chunk_size', 'N/A')} chars*")
-                        st.text(chunk.page_content)
-                        if i < len(relevant_chunks):
-                            st.divider()
+                logger.info(f"🤖 Generando respuesta con IA...")
+                stream_stats = StreamStats()
+                response = st.write_stream(
+                    timed_stream(timed_iter(
+                        llm.stream(final_prompt, operation="chat"),
+                        "llm_chat"), stream_stats))
+                st.session_state.answer_cache.store(
+                    query_vector, st.session_state.processed_hashes,
+                    response, relevant_chunks)
+
+            chat_time = time.time() - chat_start
+            logger.info(f"✅ Respuesta generada en {chat_time:.2f}s")
+
+            with st.expander("🔍 Ver contexto usado para esta respuesta"):
+                for i, chunk in enumerate(relevant_chunks, 1):
+                    md = chunk.metadata
+                    st.markdown(
+                        f"**Chunk {i}** - Fuente: {md.get('source', 'N/A')}")
+                    st.markdown(
+                        f"*Tipo: {md.get('doc_type', 'N/A')} | Tamaño: {md.get('chunk_size', 'N/A')} chars*")
+                    st.text(chunk.page_content)
+                    if i < len(relevant_chunks):
+                        st.divider()
 
         st.session_state.chat_messages.append(
             {"role": "assistant", "content": response})
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Compara configuraciones del backend de embeddings en CPU (tamaño de lote,
+hilos de torch, cuantización int8 y salida float16) con el camino float32
+original (SentenceTransformerEmbeddings de LangChain). Mide textos por
+segundo y el recall@k de la búsqueda frente a los vectores float32. Uso:
+
+    python benchmarks/bench_embeddings.py [--texts 1000] [--queries 50] [--k 10]
+                                          [--batch-sizes 16,32,64] [--threads 1,4]
+                                          [--repeat 2] [--output resultados.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from embedding_backend import EMBEDDING_MODEL, SentenceTransformerBackend  # noqa: E402
+from synthetic_pdf import synthetic_text  # noqa: E402
+
+
+def make_corpus(num_texts: int, chunk_chars: int = 1000, seed: int = 11) -> List[str]:
+    text = synthetic_text(num_texts * chunk_chars, seed=seed)
+    return [text[i:i + chunk_chars] for i in range(0, num_texts * chunk_chars, chunk_chars)]
+
+
+def make_queries(corpus: List[str], n: int, seed: int = 5) -> List[str]:
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        words = rng.choice(corpus).split()
+        start = rng.randrange(max(1, len(words) - 12))
+        queries.append(" ".join(words[start:start + 12]))
+    return queries
+
+
+def top_k(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    docs = doc_vectors / np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    queries = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    scores = queries @ docs.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_at_k(reference: np.ndarray, candidate: np.ndarray) -> float:
+    k = reference.shape[1]
+    hits = sum(len(set(r) & set(c)) for r, c in zip(reference.tolist(), candidate.tolist()))
+    return hits / (k * len(reference))
+
+
+def measure(model, corpus: List[str], queries: List[str], repeat: int) -> Dict:
+    best = float("inf")
+    doc_vectors = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        doc_vectors = model.embed_documents(corpus)
+        best = min(best, time.perf_counter() - start)
+    query_vectors = [model.embed_query(q) for q in queries]
+    return {
+        "seconds": best,
+        "texts_per_second": len(corpus) / best,
+        "doc_vectors": np.asarray(doc_vectors, dtype=np.float32),
+        "query_vectors": np.asarray(query_vectors, dtype=np.float32),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-sizes", default="16,32,64")
+    parser.add_argument("--threads", default=str(os.cpu_count() or 1),
+                        help="Hilos de torch a probar, separados por comas")
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args(argv)
+
+    corpus = make_corpus(args.texts)
+    queries = make_queries(corpus, args.queries)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b]
+    threads = [int(t) for t in args.threads.split(",") if t]
+
+    # Camino original: wrapper de LangChain, float32, lote por defecto
+    from langchain_community.embeddings import SentenceTransformerEmbeddings
+    baseline_model = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL)
+    baseline_model.embed_query("warm up")
+    baseline = measure(baseline_model, corpus, queries, args.repeat)
+    reference = top_k(baseline["doc_vectors"], baseline["query_vectors"], args.k)
+
+    configs = [("langchain float32", None)]
+    for n in threads:
+        for batch in batch_sizes:
+            configs.append((f"float32 lote {batch} · {n} hilos",
+                            dict(batch_size=batch, num_threads=n)))
+        best_batch = max(batch_sizes)
+        configs.append((f"float16 lote {best_batch} · {n} hilos",
+                        dict(batch_size=best_batch, num_threads=n, storage_dtype="float16")))
+        configs.append((f"int8 lote {best_batch} · {n} hilos",
+                        dict(batch_size=best_batch, num_threads=n, quantize="int8")))
+        configs.append((f"int8+float16 lote {best_batch} · {n} hilos",
+                        dict(batch_size=best_batch, num_threads=n, quantize="int8",
+                             storage_dtype="float16")))
+
+    print(f"Modelo {EMBEDDING_MODEL}: {len(corpus)} textos de ~1000 caracteres, "
+          f"{len(queries)} consultas, recall@{args.k} frente a float32\n")
+    print(f"{'configuración':<34} {'textos/s':>10} {'speedup':>8} {'recall':>7} {'coseno':>7}")
+    results = []
+    for label, overrides in configs:
+        if overrides is None:
+            run = baseline
+        else:
+            model = SentenceTransformerBackend(EMBEDDING_MODEL, **overrides)
+            model.embed_query("warm up")
+            run = measure(model, corpus, queries, args.repeat)
+        candidate = top_k(run["doc_vectors"], run["query_vectors"], args.k)
+        recall = recall_at_k(reference, candidate)
+        a = run["doc_vectors"] / np.linalg.norm(run["doc_vectors"], axis=1, keepdims=True)
+        b = baseline["doc_vectors"] / np.linalg.norm(baseline["doc_vectors"], axis=1,
+                                                     keepdims=True)
+        cosine = float(np.mean(np.sum(a * b, axis=1)))
+        speedup = run["texts_per_second"] / baseline["texts_per_second"]
+        print(f"{label:<34} {run['texts_per_second']:>10.1f} {speedup:>7.2f}x "
+              f"{recall:>7.3f} {cosine:>7.4f}")
+        results.append({"config": label, "options": overrides or {},
+                        "seconds": run["seconds"], "texts_per_second": run["texts_per_second"],
+                        "speedup": speedup, "recall_at_k": recall, "mean_cosine": cosine})
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump({"model": EMBEDDING_MODEL, "texts": len(corpus), "k": args.k,
+                       "results": results}, fh, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
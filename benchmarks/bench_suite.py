@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de los caminos calientes de ingesta y consulta sobre PDFs
+sintéticos, con un stub de Ollama en lugar del modelo real. Uso:
+
+    python benchmarks/bench_suite.py [--pages 10,60] [--types articulo_academico,curriculum_vitae]
+                                     [--repeat 3] [--only extraction,chunking]
+                                     [--output resultados.json]
+                                     [--baseline base.json] [--tolerance 0.2]
+
+Los resultados se guardan en JSON. Con --baseline se comparan etapa a etapa y
+el proceso termina con código 1 si alguna es más lenta que la referencia por
+encima de la tolerancia. Las etapas cuyas dependencias no están instaladas
+se marcan como omitidas.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from synthetic_pdf import make_pdf, synthetic_pages  # noqa: E402
+
+STAGES = ["extraction_serial", "extraction_parallel", "classification", "chunking",
+          "embedding", "insert", "search", "insert_flat", "search_flat",
+          "ingest_e2e", "chat_e2e",
+          "chat_prefill_stateless", "chat_prefill_session"]
+
+# Por debajo de esta diferencia absoluta no se considera regresión (ruido)
+MIN_DELTA_SECONDS = 0.005
+
+
+class Document:
+    def __init__(self, doc_type: str, num_pages: int, seed: int = 7):
+        self.doc_type = doc_type
+        self.pages = synthetic_pages(num_pages, doc_type, seed=seed)
+        self.pdf = make_pdf(self.pages)
+        self.filehash = hashlib.md5(self.pdf).hexdigest()
+        self.name = f"{doc_type}-{num_pages}p.pdf"
+        self.text = "".join(p + "\n" for p in self.pages if p)
+        self.chunks: Optional[List[str]] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.doc_type}:{len(self.pages)}p"
+
+
+class Context:
+    """Recursos compartidos entre etapas (modelo, stub) que se crean una vez."""
+
+    def __init__(self, workdir: str, repeat: int):
+        self.workdir = workdir
+        self.repeat = repeat
+        self._model = None
+        self._stub = None
+        self._prefill_stub = None
+
+    def model(self):
+        if self._model is None:
+            from embedding_backend import SentenceTransformerBackend
+            self._model = SentenceTransformerBackend()
+            self._model.embed_query("warm up")
+        return self._model
+
+    def stub(self):
+        if self._stub is None:
+            from stub_ollama import StubOllama
+            self._stub = StubOllama(tokens=128)
+            self._stub.start()
+        return self._stub
+
+    def prefill_stub(self):
+        """Stub con coste de prefill (50 ms por 1000 caracteres no cacheados)."""
+        if self._prefill_stub is None:
+            from stub_ollama import StubOllama
+            self._prefill_stub = StubOllama(tokens=32, prefill_delay=0.05)
+            self._prefill_stub.start()
+        return self._prefill_stub
+
+    def new_index(self, embeddings, backend: str = "chroma"):
+        if backend == "flat":
+            from flat_index import FlatIndex
+            return FlatIndex(embeddings)
+        from langchain_community.vectorstores import Chroma
+        return Chroma(collection_name=f"bench-{uuid.uuid4().hex[:8]}",
+                      embedding_function=embeddings,
+                      persist_directory=os.path.join(self.workdir, "chroma"))
+
+    def close(self):
+        for stub in (self._stub, self._prefill_stub):
+            if stub is not None:
+                stub.stop()
+
+
+class FrozenEmbeddings:
+    """Embeddings precalculados: aísla el coste del índice del coste del modelo."""
+
+    def __init__(self, model, texts: List[str]):
+        self.vectors = dict(zip(texts, model.embed_documents(texts)))
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[t] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors.get(text) or self.model.embed_query(text)
+
+
+def timed(fn: Callable, repeat: int, setup: Optional[Callable] = None) -> float:
+    """Mejor tiempo de 'repeat' ejecuciones; setup() no se cronometra."""
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _queries(doc: Document, n: int = 20) -> List[str]:
+    rng = random.Random(3)
+    return [" ".join(rng.choice(doc.chunks).split()[:12]) for _ in range(n)]
+
+
+# ===========================
+# Etapas: cada una devuelve (segundos, unidades, nombre de la unidad)
+# ===========================
+
+def bench_extraction_serial(ctx: Context, doc: Document):
+    from extraction import extract_pages
+    seconds = timed(lambda: extract_pages(doc.pdf, max_workers=1, isolated=False),
+                    ctx.repeat)
+    return seconds, len(doc.pages), "páginas"
+
+
+def bench_extraction_parallel(ctx: Context, doc: Document):
+    from extraction import PDF_EXTRACT_MIN_PAGES_PARALLEL, extract_pages
+    if len(doc.pages) < PDF_EXTRACT_MIN_PAGES_PARALLEL:
+        return None
+    extract_pages(doc.pdf)  # arranque del pool fuera de la medida
+    seconds = timed(lambda: extract_pages(doc.pdf), ctx.repeat)
+    return seconds, len(doc.pages), "páginas"
+
+
+def bench_classification(ctx: Context, doc: Document):
+    from patterns import detect_document_type
+    seconds = timed(lambda: detect_document_type(doc.text, doc.name), ctx.repeat)
+    return seconds, len(doc.text) // 1000, "k caracteres"
+
+
+def _ensure_chunks(doc: Document):
+    if doc.chunks is None:
+        from pipeline import split_adaptive
+        doc.chunks = split_adaptive(doc.text, doc.doc_type)
+    return doc.chunks
+
+
+def bench_chunking(ctx: Context, doc: Document):
+    from pipeline import iter_adaptive_chunks
+    _ensure_chunks(doc)
+    seconds = timed(lambda: list(iter_adaptive_chunks(doc.pages, doc.doc_type)), ctx.repeat)
+    return seconds, len(doc.chunks), "chunks"
+
+
+def bench_embedding(ctx: Context, doc: Document):
+    chunks = _ensure_chunks(doc)
+    model = ctx.model()
+    seconds = timed(lambda: model.embed_documents(chunks), ctx.repeat)
+    return seconds, len(chunks), "chunks"
+
+
+def bench_insert(ctx: Context, doc: Document, backend: str = "chroma"):
+    from vector_index import index_chunks
+    chunks = _ensure_chunks(doc)
+    embeddings = FrozenEmbeddings(ctx.model(), chunks)
+
+    def run(vs):
+        file_chunks, _ = index_chunks(vs, doc.filehash, doc.name, doc.doc_type, iter(chunks))
+        file_chunks.close()
+
+    seconds = timed(run, ctx.repeat, setup=lambda: ctx.new_index(embeddings, backend))
+    return seconds, len(chunks), "chunks"
+
+
+def bench_search(ctx: Context, doc: Document, backend: str = "chroma"):
+    from vector_index import index_chunks, session_filter
+    chunks = _ensure_chunks(doc)
+    queries = _queries(doc)
+    embeddings = FrozenEmbeddings(ctx.model(), chunks + queries)
+    vs = ctx.new_index(embeddings, backend)
+    file_chunks, _ = index_chunks(vs, doc.filehash, doc.name, doc.doc_type, iter(chunks))
+    file_chunks.close()
+    vectors = [embeddings.embed_query(q) for q in queries]
+    where = session_filter([doc.filehash])
+
+    def run():
+        for vector in vectors:
+            vs.similarity_search_by_vector(vector, k=5, filter=where)
+
+    seconds = timed(run, ctx.repeat)
+    return seconds, len(queries), "consultas"
+
+
+def bench_insert_flat(ctx: Context, doc: Document):
+    return bench_insert(ctx, doc, backend="flat")
+
+
+def bench_search_flat(ctx: Context, doc: Document):
+    return bench_search(ctx, doc, backend="flat")
+
+
+def bench_ingest_e2e(ctx: Context, doc: Document):
+    from embedding_cache import CachedEmbeddings, EmbeddingCache
+    from extraction_cache import get_extraction_cache
+    from pipeline import open_document
+    from vector_index import index_chunks
+
+    model = ctx.model()
+
+    def setup():
+        # En frío: sin texto en caché, sin embeddings en caché y con índice vacío
+        get_extraction_cache().discard(doc.filehash)
+        cache = EmbeddingCache(
+            os.path.join(ctx.workdir, f"emb-{uuid.uuid4().hex[:8]}.sqlite"), 1_000_000)
+        return ctx.new_index(CachedEmbeddings(model, "bench", cache))
+
+    def run(vs):
+        document = open_document(doc.pdf, doc.filehash, doc.name)
+        file_chunks, _ = index_chunks(vs, doc.filehash, doc.name, document.doc_type,
+                                      document.chunks())
+        file_chunks.close()
+
+    seconds = timed(run, ctx.repeat, setup=setup)
+    return seconds, len(doc.pages), "páginas"
+
+
+def bench_chat_e2e(ctx: Context, doc: Document):
+    from llm_client import OllamaClient
+    from prompts import build_chat_prompt
+    from vector_index import index_chunks, session_filter
+
+    chunks = _ensure_chunks(doc)
+    queries = _queries(doc, n=5)
+    model = ctx.model()
+    vs = ctx.new_index(FrozenEmbeddings(model, chunks))
+    file_chunks, _ = index_chunks(vs, doc.filehash, doc.name, doc.doc_type, iter(chunks))
+    file_chunks.close()
+    llm = OllamaClient(base_url=ctx.stub().base_url, model="stub")
+    where = session_filter([doc.filehash])
+
+    def run():
+        for question in queries:
+            vector = model.embed_query(question)
+            relevant = vs.similarity_search_by_vector(vector, k=5, filter=where)
+            for _ in llm.stream(build_chat_prompt(question, relevant)):
+                pass
+
+    seconds = timed(run, ctx.repeat)
+    return seconds, len(queries), "consultas"
+
+
+def _chat_turns(doc: Document, turns: int = 4) -> List[tuple]:
+    """Preguntas con 5 chunks contiguos cada una, sin depender del índice."""
+    chunks = _ensure_chunks(doc)
+    questions = _queries(doc, n=turns)
+    result = []
+    for t, question in enumerate(questions):
+        start = (t * 5) % max(1, len(chunks) - 5)
+        relevant = [SimpleNamespace(page_content=chunks[i],
+                                    metadata={"source": doc.name, "filehash": doc.filehash,
+                                              "chunk_id": i})
+                    for i in range(start, min(len(chunks), start + 5))]
+        result.append((question, relevant))
+    return result
+
+
+def _bench_prefill(ctx: Context, doc: Document, session: bool):
+    """
+    Tiempo de prefill (el que informa Ollama) de una conversación de varias
+    preguntas: con prompts completos en cada turno o con ChatSession.
+    """
+    from chat_session import ChatSession
+    from llm_client import OllamaClient
+    from prompts import CHAT_PREFIX, build_chat_prompt, build_chat_turn
+
+    turns = _chat_turns(doc)
+    stub = ctx.prefill_stub()
+    llm = OllamaClient(base_url=stub.base_url, model="stub")
+    best = float("inf")
+    for _ in range(ctx.repeat):
+        stub.reset_cache()
+        chat = ChatSession(llm, CHAT_PREFIX)
+        prefill = []
+        for question, relevant in turns:
+            if session:
+                stream = chat.stream(build_chat_turn(question, relevant),
+                                     on_done=lambda s: prefill.append(s.prompt_eval_duration))
+            else:
+                stream = llm.stream(build_chat_prompt(question, relevant),
+                                    on_done=lambda s: prefill.append(s.prompt_eval_duration))
+            for _ in stream:
+                pass
+        best = min(best, sum(prefill))
+    return best, len(turns), "turnos"
+
+
+def bench_chat_prefill_stateless(ctx: Context, doc: Document):
+    return _bench_prefill(ctx, doc, session=False)
+
+
+def bench_chat_prefill_session(ctx: Context, doc: Document):
+    return _bench_prefill(ctx, doc, session=True)
+
+
+BENCHES = {name: globals()[f"bench_{name}"] for name in STAGES}
+
+
+# ===========================
+# Resultados y comparación
+# ===========================
+
+def run_suite(page_counts: List[int], doc_types: List[str], stages: List[str],
+              repeat: int, workdir: str) -> Dict[str, dict]:
+    ctx = Context(workdir, repeat)
+    results = {}
+    try:
+        for doc_type in doc_types:
+            for num_pages in page_counts:
+                doc = Document(doc_type, num_pages)
+                for stage in stages:
+                    key = f"{stage}[{doc.key}]"
+                    try:
+                        measured = BENCHES[stage](ctx, doc)
+                    except ImportError as e:
+                        results[key] = {"skipped": f"dependencia no disponible: {e}"}
+                        print(f"{key:52s} omitida ({e})")
+                        continue
+                    if measured is None:
+                        continue
+                    seconds, units, unit = measured
+                    results[key] = {"seconds": seconds, "units": units, "unit": unit}
+                    per_unit = seconds * 1000 / max(units, 1)
+                    print(f"{key:52s} {seconds * 1000:10.1f} ms  "
+                          f"({units} {unit}, {per_unit:.2f} ms c/u)")
+    finally:
+        ctx.close()
+    return results
+
+
+def compare_results(current: Dict[str, dict], baseline: Dict[str, dict],
+                    tolerance: float, min_delta: float = MIN_DELTA_SECONDS) -> List[dict]:
+    """Etapas presentes en ambas ejecuciones que son más lentas que la referencia."""
+    regressions = []
+    for key, result in sorted(current.items()):
+        base = baseline.get(key)
+        if not base or "seconds" not in base or "seconds" not in result:
+            continue
+        delta = result["seconds"] - base["seconds"]
+        if delta > min_delta and result["seconds"] > base["seconds"] * (1 + tolerance):
+            regressions.append({"stage": key, "baseline": base["seconds"],
+                                "current": result["seconds"],
+                                "ratio": result["seconds"] / base["seconds"]})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="10,60",
+                        help="Tamaños de documento en páginas, separados por comas")
+    parser.add_argument("--types", default="articulo_academico,curriculum_vitae,guion_pelicula")
+    parser.add_argument("--only", default=",".join(STAGES), help="Etapas a ejecutar")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--baseline", help="Resultados de referencia para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Margen relativo permitido antes de considerar regresión")
+    args = parser.parse_args(argv)
+
+    stages = [s for s in args.only.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Etapas desconocidas: {', '.join(sorted(unknown))}")
+
+    # Cachés aisladas: los benchmarks miden trabajo en frío y no tocan las de la app
+    workdir = tempfile.mkdtemp(prefix="copiloto-bench-")
+    os.environ["EXTRACTION_CACHE_DIR"] = os.path.join(workdir, "extraction")
+    os.environ["CHUNK_STORE_DIR"] = os.path.join(workdir, "chunks")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embeddings.sqlite")
+    try:
+        results = run_suite([int(p) for p in args.pages.split(",")],
+                            args.types.split(","), stages, args.repeat, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.output}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)["results"]
+    regressions = compare_results(results, baseline, args.tolerance)
+    for r in regressions:
+        print(f"REGRESIÓN {r['stage']}: {r['baseline'] * 1000:.1f} ms -> "
+              f"{r['current'] * 1000:.1f} ms ({r['ratio']:.2f}x)")
+    if regressions:
+        return 1
+    print(f"Sin regresiones frente a {args.baseline} (tolerancia {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# chat_session.py
+import logging
+import os
+import sys
+import threading
+from typing import Callable, Iterator, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import OLLAMA_NUM_CTX, GenerationStats, OllamaClient  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Tokens reservados para el turno nuevo (contexto recuperado, pregunta y respuesta)
+CHAT_TURN_RESERVE_TOKENS = int(os.getenv("CHAT_TURN_RESERVE_TOKENS", "2560"))
+
+
+class ChatSession:
+    """
+    Conversación con Ollama que reutiliza su estado entre turnos. El primer
+    turno envía el prefijo fijo (instrucciones) más el turno; los siguientes
+    solo el turno nuevo junto con el 'context' devuelto por Ollama, cuyo
+    KV sigue en memoria, así el prefill cubre únicamente lo nuevo. Cuando la
+    conversación no deja sitio para otro turno en num_ctx se empieza de cero.
+
+    Ollama guarda un solo KV por modelo: con varios usuarios intercalando
+    turnos cada 'context' vuelve a prefillar todo su historial, y las
+    respuestas dependen de chunks de turnos anteriores. Por eso la app usa
+    build_chat_prompt sin estado; esta clase queda para el benchmark
+    chat_prefill_session, que compara ambos enfoques.
+    """
+
+    def __init__(self, client: OllamaClient, prefix: str,
+                 max_context_tokens: int = OLLAMA_NUM_CTX - CHAT_TURN_RESERVE_TOKENS):
+        self.client = client
+        self.prefix = prefix
+        self.max_context_tokens = max_context_tokens
+        self.context: Optional[list] = None
+        self.turns = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.context = None
+            self.turns = 0
+
+    def _prompt(self, turn: str) -> tuple:
+        with self._lock:
+            if self.context is None:
+                return self.prefix + "\n\n" + turn, None
+            return "\n\n" + turn, self.context
+
+    def _remember(self, stats: GenerationStats):
+        with self._lock:
+            if stats.context and len(stats.context) <= self.max_context_tokens:
+                self.context = stats.context
+                self.turns += 1
+            else:
+                if stats.context:
+                    logger.info(f"🧹 Conversación de {len(stats.context)} tokens: "
+                                f"el próximo turno reenvía las instrucciones")
+                self.context = None
+                self.turns = 0
+
+    def stream(self, turn: str, options: Optional[dict] = None, operation: str = "chat",
+               on_done: Optional[Callable[[GenerationStats], None]] = None) -> Iterator[str]:
+        """Como OllamaClient.stream; si el turno se interrumpe no se recuerda."""
+        prompt, context = self._prompt(turn)
+
+        def done(stats: GenerationStats):
+            self._remember(stats)
+            if on_done is not None:
+                on_done(stats)
+
+        return self.client.stream(prompt, options, operation, on_done=done, context=context)
+
+    def invoke(self, turn: str, options: Optional[dict] = None, operation: str = "chat") -> str:
+        prompt, context = self._prompt(turn)
+        text, stats = self.client.generate(prompt, options, operation, context=context)
+        self._remember(stats)
+        return text
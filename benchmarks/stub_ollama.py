@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Servidor HTTP que imita la API de Ollama (/api/generate, /api/tags) con
+respuestas sintéticas y latencias configurables, para medir la app y la API
+sin un modelo real. Como el runner de Ollama, guarda el KV de la última
+petición: solo se paga el prefill de lo que no coincide con él, y acepta el
+'context' de una respuesta anterior para continuar la conversación. Uso:
+
+    python benchmarks/stub_ollama.py --port 11435 [--tokens 64] [--token-delay 0.01]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+# El 'context' simulado empaqueta 4 caracteres por entero (~1 token de Ollama)
+_CHARS_PER_TOKEN = 4
+_CHAR_BITS = 21
+_CHAR_MASK = (1 << _CHAR_BITS) - 1
+
+
+def encode_context(text: str) -> List[int]:
+    context = []
+    for i in range(0, len(text), _CHARS_PER_TOKEN):
+        value = 0
+        for j, ch in enumerate(text[i:i + _CHARS_PER_TOKEN]):
+            value |= ord(ch) << (_CHAR_BITS * j)
+        context.append(value)
+    return context
+
+
+def decode_context(context: List[int]) -> str:
+    chars = []
+    for value in context:
+        for j in range(_CHARS_PER_TOKEN):
+            code = (value >> (_CHAR_BITS * j)) & _CHAR_MASK
+            if code:
+                chars.append(chr(code))
+    return "".join(chars)
+
+
+def _common_prefix(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class StubOllama:
+    """
+    Simula un Ollama: el prefill cuesta prefill_delay segundos por cada 1000
+    caracteres de prompt no cacheados y cada token generado token_delay
+    segundos. Guarda en 'requests' un registro de cada petición para poder
+    inspeccionarlas.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tokens: int = 64,
+                 token_delay: float = 0.0, prefill_delay: float = 0.0):
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.prefill_delay = prefill_delay
+        self.requests: List[dict] = []
+        # Direcciones (host, puerto) de cliente vistas: permite comprobar la reutilización
+        self.connections = set()
+        # Texto cuyo KV tiene cargado el único slot del modelo
+        self.kv_text = ""
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(_Handler):
+            server_stub = stub
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_cache(self):
+        with self._lock:
+            self.kv_text = ""
+
+    def reserve(self, full_text: str) -> int:
+        """Devuelve cuántos caracteres de full_text no están en el KV."""
+        with self._lock:
+            cached = _common_prefix(self.kv_text, full_text)
+            self.kv_text = full_text
+        return len(full_text) - cached
+
+    def record(self, entry: dict, client_address):
+        with self._lock:
+            self.requests.append(entry)
+            self.connections.add(client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_stub: StubOllama = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, payload: dict):
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "stub:latest"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        self._generate(body)
+
+    def _generate(self, body: dict):
+        stub = self.server_stub
+        prompt = body.get("prompt", "")
+        if not prompt:
+            # Petición de carga del modelo: Ollama responde un único objeto
+            stub.record({"model": body.get("model"), "prompt_chars": 0, "context_tokens": 0,
+                         "prompt_eval_count": 0, "stream": body.get("stream", True),
+                         "keep_alive": body.get("keep_alive"),
+                         "options": body.get("options")}, self.client_address)
+            self._send_json(200, {"model": body.get("model", "stub"), "response": "",
+                                  "done": True, "done_reason": "load"})
+            return
+
+        num_predict = (body.get("options") or {}).get("num_predict") or stub.tokens
+        tokens = min(stub.tokens, num_predict)
+        words = [f"token{i} " for i in range(tokens)]
+        context = body.get("context") or []
+        full_text = decode_context(context) + prompt
+        start = time.perf_counter()
+
+        # Solo se procesa lo que no coincide con el KV cargado
+        new_chars = stub.reserve(full_text)
+        prompt_tokens = max(1, new_chars // _CHARS_PER_TOKEN)
+        prefill = stub.prefill_delay * new_chars / 1000
+        if prefill:
+            time.sleep(prefill)
+        stub.record({"model": body.get("model"), "prompt_chars": len(prompt),
+                     "context_tokens": len(context), "prompt_eval_count": prompt_tokens,
+                     "stream": body.get("stream", True),
+                     "keep_alive": body.get("keep_alive"),
+                     "options": body.get("options")}, self.client_address)
+        conversation = full_text + "".join(words)
+        stub.reserve(conversation)
+
+        def final(response: str) -> dict:
+            total = time.perf_counter() - start
+            return {
+                "model": body.get("model", "stub"), "response": response, "done": True,
+                "context": encode_context(conversation),
+                "total_duration": int(total * 1e9), "load_duration": 0,
+                "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(prefill * 1e9),
+                "eval_count": tokens, "eval_duration": int(tokens * stub.token_delay * 1e9),
+            }
+
+        if not body.get("stream", True):
+            if stub.token_delay:
+                time.sleep(stub.token_delay * tokens)
+            self._send_json(200, final("".join(words)))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in words:
+            if stub.token_delay:
+                time.sleep(stub.token_delay)
+            self._send_chunk({"model": body.get("model", "stub"), "response": word, "done": False})
+        self._send_chunk(final(""))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--prefill-delay", type=float, default=0.0,
+                        help="Segundos de prefill por cada 1000 caracteres de prompt")
+    args = parser.parse_args()
+    stub = StubOllama(args.host, args.port, args.tokens, args.token_delay, args.prefill_delay)
+    print(f"Stub de Ollama escuchando en {stub.base_url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Documentos sintéticos para benchmarks: texto sesgado hacia un tipo de
+documento y un escritor mínimo de PDF (sin dependencias) cuyas páginas se
+pueden extraer con PyPDF2 igual que un PDF real.
+"""
+import random
+import re
+import textwrap
+from typing import List
+
+from patterns import get_document_patterns
+
+_FILLER = ("el la de que en y a los se del las un por con no una su para es al "
+           "lo como más pero sus le ya o este sí porque esta entre cuando muy").split()
+
+
+def synthetic_text(target_chars: int, dominant: str = 'articulo_academico', seed: int = 7) -> str:
+    """Texto con palabras clave de todos los tipos, sesgado hacia 'dominant'."""
+    rng = random.Random(seed)
+    patterns = get_document_patterns()
+    keywords = [w for pattern_list in patterns.values()
+                for p in pattern_list for w in re.findall(r'[\w ]{3,}', p)]
+    keywords += [w for p in patterns.get(dominant, [])
+                 for w in re.findall(r'[\w ]{3,}', p)] * 20
+    parts, size = [], 0
+    while size < target_chars:
+        line = " ".join(rng.choice(keywords) if rng.random() < 0.08
+                        else rng.choice(_FILLER) for _ in range(14))
+        if rng.random() < 0.05:
+            line = line.upper()
+        parts.append(line)
+        size += len(line) + 1
+    return "\n".join(parts)
+
+
+def synthetic_pages(num_pages: int, dominant: str = 'articulo_academico',
+                    chars_per_page: int = 3000, seed: int = 7) -> List[str]:
+    """Páginas de texto sintético de unos chars_per_page caracteres cada una."""
+    text = synthetic_text(num_pages * chars_per_page, dominant, seed)
+    lines = text.split("\n")
+    pages, current, size = [], [], 0
+    for line in lines:
+        current.append(line)
+        size += len(line) + 1
+        if size >= chars_per_page and len(pages) < num_pages - 1:
+            pages.append("\n".join(current))
+            current, size = [], 0
+    pages.append("\n".join(current))
+    return pages
+
+
+def _pdf_string(line: str) -> bytes:
+    data = line.encode("latin-1", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def make_pdf(pages: List[str], width: int = 90, font_size: int = 9) -> bytes:
+    """
+    Genera un PDF de una página por elemento de 'pages' con Helvetica
+    (WinAnsiEncoding). Las líneas se ajustan a 'width' caracteres.
+    """
+    leading = font_size + 2
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # árbol de páginas, se rellena al final
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids = []
+    for text in pages:
+        lines = []
+        for paragraph in text.split("\n"):
+            lines.extend(textwrap.wrap(paragraph, width) or [""])
+        body = [f"BT /F1 {font_size} Tf {leading} TL 40 800 Td".encode("ascii")]
+        body += [_pdf_string(line) + b" Tj T*" for line in lines]
+        body.append(b"ET")
+        stream = b"\n".join(body)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref)
+    return bytes(out)
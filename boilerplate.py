@@ -0,0 +1,136 @@
+# boilerplate.py
+import logging
+import os
+import re
+from collections import Counter
+from typing import Iterable, Iterator, List, Set
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+BOILERPLATE_ENABLED = os.getenv("BOILERPLATE_ENABLED", "1") not in ("0", "false", "no")
+# Páginas con las que se aprenden las cabeceras y pies (las primeras no se
+# retienen hasta completarla: se limpian desde que hay BOILERPLATE_MIN_PAGES)
+BOILERPLATE_WINDOW = int(os.getenv("BOILERPLATE_WINDOW", "12"))
+# Fracción de las páginas de la ventana en que debe aparecer una línea
+BOILERPLATE_MIN_RATIO = float(os.getenv("BOILERPLATE_MIN_RATIO", "0.5"))
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+# Líneas no vacías del principio y del final de cada página que se examinan
+BOILERPLATE_EDGE_LINES = int(os.getenv("BOILERPLATE_EDGE_LINES", "3"))
+
+# Súbela si cambia el algoritmo: invalida el texto limpio guardado en caché
+BOILERPLATE_VERSION = 2
+
+BOILERPLATE_CHARS_REMOVED = REGISTRY.counter(
+    "copiloto_boilerplate_chars_removed_total",
+    "Caracteres de cabeceras y pies repetidos eliminados en la extracción")
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_line(line: str) -> str:
+    """Forma canónica de una línea: sin mayúsculas ni espacios extra y con los
+    números como '#', para que 'Página 3 de 40' y 'Página 4 de 40' coincidan."""
+    return _DIGITS_RE.sub("#", _SPACES_RE.sub(" ", line.strip().lower()))
+
+
+def config_version() -> str:
+    """
+    Identifica el algoritmo y la configuración de limpieza. La caché de
+    extracción guarda el texto ya limpio, así que lo usa como versión para no
+    servir texto limpiado con otros parámetros.
+    """
+    if not BOILERPLATE_ENABLED:
+        return "boilerplate=off"
+    return (f"boilerplate=v{BOILERPLATE_VERSION}:{BOILERPLATE_WINDOW}:{BOILERPLATE_MIN_RATIO}:"
+            f"{BOILERPLATE_MIN_PAGES}:{BOILERPLATE_EDGE_LINES}")
+
+
+def _edge_indices(lines: List[str], edge_lines: int) -> List[int]:
+    non_empty = [i for i, line in enumerate(lines) if line.strip()]
+    if len(non_empty) <= 2 * edge_lines:
+        return non_empty
+    return non_empty[:edge_lines] + non_empty[-edge_lines:]
+
+
+class BoilerplateStripper:
+    """
+    Elimina cabeceras, pies y números de página: líneas que se repiten (una
+    vez normalizadas) al principio o al final de muchas páginas del mismo
+    documento. Funciona en streaming: en cuanto ha leído min_pages páginas
+    las limpia con lo aprendido hasta ese momento y sigue afinando con cada
+    página nueva hasta completar 'window'; a partir de ahí cada página se
+    limpia según llega. Una cabecera que solo se reconoce más adelante (p. ej.
+    la de las páginas pares) puede quedar en las primeras páginas.
+    """
+
+    def __init__(self, window: int = BOILERPLATE_WINDOW, min_ratio: float = BOILERPLATE_MIN_RATIO,
+                 min_pages: int = BOILERPLATE_MIN_PAGES, edge_lines: int = BOILERPLATE_EDGE_LINES):
+        self.window = window
+        self.min_ratio = min_ratio
+        self.min_pages = min_pages
+        self.edge_lines = edge_lines
+        self.repeated: Set[str] = set()
+        self.chars_removed = 0
+        self.lines_removed = 0
+
+    def _edge_lines(self, page: str) -> Set[str]:
+        # Cada línea cuenta una vez por página
+        lines = page.split("\n")
+        return {normalize_line(lines[i]) for i in _edge_indices(lines, self.edge_lines)}
+
+    def _decide(self, counts: Counter, pages: int) -> Set[str]:
+        threshold = max(self.min_pages, self.min_ratio * pages)
+        self.repeated = {line for line, count in counts.items() if line and count >= threshold}
+        return self.repeated
+
+    def learn(self, pages: List[str]) -> Set[str]:
+        """Decide las líneas repetidas a partir de una muestra de páginas."""
+        counts = Counter()
+        for page in pages:
+            counts.update(self._edge_lines(page))
+        return self._decide(counts, len(pages))
+
+    def strip_page(self, page: str) -> str:
+        if not self.repeated or not page:
+            return page
+        lines = page.split("\n")
+        drop = {i for i in _edge_indices(lines, self.edge_lines)
+                if normalize_line(lines[i]) in self.repeated}
+        if not drop:
+            return page
+        stripped = "\n".join(line for i, line in enumerate(lines) if i not in drop)
+        self.lines_removed += len(drop)
+        self.chars_removed += len(page) - len(stripped)
+        return stripped
+
+    def strip(self, pages: Iterable[str], label: str = "") -> Iterator[str]:
+        """Devuelve las páginas limpias; retiene como mucho min_pages - 1 páginas."""
+        counts = Counter()
+        learned = 0
+        pending: List[str] = []
+        for page in pages:
+            if learned < self.window:
+                learned += 1
+                counts.update(self._edge_lines(page))
+                self._decide(counts, learned)
+                if learned < min(self.min_pages, self.window):
+                    pending.append(page)
+                    continue
+                for buffered in pending:
+                    yield self.strip_page(buffered)
+                pending = []
+            yield self.strip_page(page)
+        # Documento más corto que min_pages: no hay nada que reconocer
+        for buffered in pending:
+            yield self.strip_page(buffered)
+        if self.chars_removed:
+            BOILERPLATE_CHARS_REMOVED.inc(self.chars_removed)
+            logger.info(
+                f"🧹 {label or 'Documento'}: {self.lines_removed} líneas de cabecera/pie "
+                f"eliminadas ({self.chars_removed} caracteres)")
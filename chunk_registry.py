@@ -0,0 +1,124 @@
+# chunk_registry.py
+from typing import Dict, Iterator, List, Optional
+
+from chunk_store import CHUNK_STORE_DIR, ChunkFile
+
+
+class FileChunks:
+    """
+    Chunks de un archivo: metadatos compartidos una sola vez y los textos en un
+    ChunkFile en disco (en memoria sólo quedan offsets y longitudes).
+    """
+
+    __slots__ = ("filehash", "source", "doc_type", "store")
+
+    def __init__(self, filehash: str, source: str, doc_type: str, store: ChunkFile):
+        self.filehash = filehash
+        self.source = source
+        self.doc_type = doc_type
+        self.store = store
+
+    @classmethod
+    def from_texts(cls, filehash: str, source: str, doc_type: str, texts: List[str],
+                   directory: str = CHUNK_STORE_DIR) -> "FileChunks":
+        return cls(filehash, source, doc_type, ChunkFile.create(texts, directory))
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def ids(self) -> List[str]:
+        return [f"{self.filehash}-{i}" for i in range(len(self.store))]
+
+    def text(self, chunk_id: int) -> str:
+        return self.store.read(chunk_id)
+
+    def metadata(self, chunk_id: int) -> dict:
+        return {
+            'source': self.source,
+            'filehash': self.filehash,
+            'doc_type': self.doc_type,
+            'chunk_id': chunk_id,
+            'chunk_size': self.store.char_length(chunk_id),
+            'total_chunks': len(self.store)
+        }
+
+    def view(self, chunk_id: int) -> "ChunkView":
+        return ChunkView(self, chunk_id)
+
+    def close(self):
+        self.store.close()
+
+
+class ChunkView:
+    """
+    Referencia ligera a un chunk con la misma interfaz que un Document
+    (page_content / metadata); el texto se lee del disco al accederlo.
+    """
+
+    __slots__ = ("file_chunks", "chunk_id")
+
+    def __init__(self, file_chunks: FileChunks, chunk_id: int):
+        self.file_chunks = file_chunks
+        self.chunk_id = chunk_id
+
+    @property
+    def page_content(self) -> str:
+        return self.file_chunks.text(self.chunk_id)
+
+    @property
+    def metadata(self) -> dict:
+        return self.file_chunks.metadata(self.chunk_id)
+
+
+class ChunkRegistry:
+    """
+    Registro de chunks por archivo de una sesión. Eliminar un archivo es
+    O(chunks de ese archivo) y no se guarda un dict de metadatos por chunk.
+    """
+
+    def __init__(self):
+        self._files: Dict[str, FileChunks] = {}
+
+    def add(self, file_chunks: FileChunks) -> FileChunks:
+        previous = self._files.get(file_chunks.filehash)
+        if previous is not None and previous is not file_chunks:
+            previous.close()
+        self._files[file_chunks.filehash] = file_chunks
+        return file_chunks
+
+    def remove_file(self, filehash: str) -> Optional[FileChunks]:
+        file_chunks = self._files.pop(filehash, None)
+        if file_chunks is not None:
+            file_chunks.close()
+        return file_chunks
+
+    def clear(self):
+        for filehash in list(self._files):
+            self.remove_file(filehash)
+
+    def get(self, filehash: str) -> Optional[FileChunks]:
+        return self._files.get(filehash)
+
+    def resolve(self, doc):
+        """
+        Sustituye un resultado del vectorstore por una vista perezosa del chunk
+        registrado; si no está en el registro se devuelve tal cual.
+        """
+        md = getattr(doc, "metadata", None) or {}
+        file_chunks = self._files.get(md.get("filehash"))
+        chunk_id = md.get("chunk_id")
+        if file_chunks is None or chunk_id is None or not 0 <= chunk_id < len(file_chunks):
+            return doc
+        return file_chunks.view(chunk_id)
+
+    def files(self) -> Iterator[FileChunks]:
+        return iter(self._files.values())
+
+    def __contains__(self, filehash: str) -> bool:
+        return filehash in self._files
+
+    def __len__(self) -> int:
+        return sum(len(f) for f in self._files.values())
+
+    def __bool__(self) -> bool:
+        return any(len(f) for f in self._files.values())
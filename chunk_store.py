@@ -0,0 +1,190 @@
+# chunk_store.py
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from array import array
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+CHUNK_STORE_DIR = os.getenv(
+    "CHUNK_STORE_DIR", os.path.join(tempfile.gettempdir(), "copiloto_chunks"))
+# Los archivos más antiguos se consideran abandonados aunque su proceso siga vivo
+CHUNK_STORE_MAX_AGE_HOURS = float(os.getenv("CHUNK_STORE_MAX_AGE_HOURS", "48"))
+
+SUFFIX = ".chunks"
+
+_sweep_done = False
+_sweep_lock = threading.Lock()
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ChunkFile:
+    """
+    Textos de chunks guardados en un archivo en disco y leídos mediante mmap.
+    En memoria sólo quedan los offsets y longitudes (arrays compactos); el
+    texto lo pagina el sistema operativo bajo demanda. Si se pierde la
+    referencia sin llamar a close() (p. ej. una sesión de Streamlit que
+    caduca al cerrar el navegador) el archivo se borra al recolectarlo.
+    """
+
+    __slots__ = ("path", "offsets", "byte_lengths", "char_lengths", "_fh", "_mmap", "_lock",
+                 "_finalizer", "__weakref__")
+
+    def __init__(self, path: str, offsets: array, byte_lengths: array, char_lengths: array):
+        self.path = path
+        self.offsets = offsets
+        self.byte_lengths = byte_lengths
+        self.char_lengths = char_lengths
+        self._fh = None
+        self._mmap = None
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, _remove_quietly, path)
+
+    @classmethod
+    def create(cls, texts: Iterable[str], directory: str = CHUNK_STORE_DIR) -> "ChunkFile":
+        writer = ChunkFileWriter(directory)
+        try:
+            for text in texts:
+                writer.append(text)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.finish()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def _map(self):
+        if self._mmap is None:
+            self._fh = open(self.path, "rb")
+            self._mmap = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def read(self, i: int) -> str:
+        length = self.byte_lengths[i]
+        if length == 0:
+            return ""
+        start = self.offsets[i]
+        with self._lock:
+            return self._map()[start:start + length].decode("utf-8")
+
+    def char_length(self, i: int) -> int:
+        return self.char_lengths[i]
+
+    def close(self, delete: bool = True):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._fh.close()
+                self._mmap = None
+                self._fh = None
+            if delete:
+                self._finalizer()
+            else:
+                self._finalizer.detach()
+
+
+class ChunkFileWriter:
+    """
+    Escribe chunks en disco a medida que se producen (ingesta en streaming);
+    finish() devuelve el ChunkFile de sólo lectura.
+    """
+
+    __slots__ = ("path", "offsets", "byte_lengths", "char_lengths", "_fh", "_position")
+
+    def __init__(self, directory: str = CHUNK_STORE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        # El pid en el nombre permite a sweep_stale_files reconocer huérfanos
+        self.path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex}{SUFFIX}")
+        self.offsets, self.byte_lengths, self.char_lengths = array("q"), array("l"), array("l")
+        self._fh = open(self.path, "wb")
+        self._position = 0
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def append(self, text: str) -> int:
+        """Añade un chunk y devuelve su índice."""
+        data = text.encode("utf-8")
+        self._fh.write(data)
+        self.offsets.append(self._position)
+        self.byte_lengths.append(len(data))
+        self.char_lengths.append(len(text))
+        self._position += len(data)
+        return len(self.offsets) - 1
+
+    def finish(self) -> ChunkFile:
+        self._fh.close()
+        return ChunkFile(self.path, self.offsets, self.byte_lengths, self.char_lengths)
+
+    def abort(self):
+        self._fh.close()
+        _remove_quietly(self.path)
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True  # os.kill(pid, 0) terminaría el proceso en Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def sweep_stale_files(directory: str = CHUNK_STORE_DIR,
+                      max_age_hours: float = CHUNK_STORE_MAX_AGE_HOURS) -> int:
+    """
+    Borra los archivos de chunks de procesos que ya no existen (p. ej. tras un
+    reinicio) y los que superan max_age_hours. Devuelve cuántos borró.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in names:
+        if not name.endswith(SUFFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            expired = os.path.getmtime(path) < cutoff
+        except OSError:
+            continue
+        # Sin pid en el nombre (formato anterior) solo cuenta la antigüedad
+        owner = name.split("-", 1)[0]
+        orphan = owner.isdigit() and int(owner) != os.getpid() and not _pid_alive(int(owner))
+        if orphan or expired:
+            _remove_quietly(path)
+            removed += 1
+    if removed:
+        logger.info(f"🧹 {removed} archivos de chunks huérfanos eliminados de {directory}")
+    return removed
+
+
+def sweep_stale_files_once():
+    """sweep_stale_files una sola vez por proceso (al arrancar la app)."""
+    global _sweep_done
+    with _sweep_lock:
+        if _sweep_done:
+            return
+        _sweep_done = True
+    sweep_stale_files()
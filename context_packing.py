@@ -0,0 +1,193 @@
+# context_packing.py
+import logging
+import os
+import re
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+# Ventana de contexto del modelo (la misma que envía llm_client a Ollama)
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+# Tokens que se dejan para las instrucciones, la pregunta y la respuesta
+CONTEXT_PROMPT_RESERVE_TOKENS = int(os.getenv("CONTEXT_PROMPT_RESERVE_TOKENS", "2048"))
+# Presupuesto de tokens del contexto del chat (estimado como caracteres / 4);
+# por defecto, lo que queda de la ventana tras la reserva
+CONTEXT_TOKEN_BUDGET = int(os.getenv(
+    "CONTEXT_TOKEN_BUDGET", str(max(OLLAMA_NUM_CTX - CONTEXT_PROMPT_RESERVE_TOKENS, 512))))
+# Similitud de Jaccard (shingles de palabras) a partir de la cual dos chunks son duplicados
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+
+CHARS_PER_TOKEN = 4
+# El solapamiento del splitter nunca supera los 300 caracteres; se deja margen
+MAX_OVERLAP_CHARS = 400
+MIN_OVERLAP_CHARS = 20
+SHINGLE_SIZE = 3
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ContextBlock:
+    """Fragmento de contexto listo para el prompt: uno o varios chunks contiguos."""
+
+    __slots__ = ("source", "filehash", "chunk_ids", "content", "rank")
+
+    def __init__(self, source: str, filehash: Optional[str], chunk_ids: list,
+                 content: str, rank: int):
+        self.source = source
+        self.filehash = filehash
+        self.chunk_ids = chunk_ids
+        self.content = content
+        # Posición del chunk más relevante del bloque en la búsqueda
+        self.rank = rank
+
+    @property
+    def label(self) -> str:
+        ids = [str(c) for c in self.chunk_ids]
+        if len(ids) == 1:
+            return f"Chunk {ids[0]}"
+        return f"Chunks {ids[0]}-{ids[-1]}"
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.content)
+
+
+def strip_overlap(previous: str, following: str, max_overlap: int = MAX_OVERLAP_CHARS) -> str:
+    """
+    Devuelve 'following' sin el prefijo que ya aparece al final de 'previous'
+    (el chunk_overlap del splitter). Si no hay solapamiento lo devuelve entero.
+    """
+    following = following.lstrip()
+    limit = min(max_overlap, len(previous), len(following))
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:size]):
+            return following[size:]
+    return following
+
+
+def _chunk_fields(chunk):
+    md = getattr(chunk, "metadata", None) or {}
+    return (md.get("source", "N/A"), md.get("filehash"), md.get("chunk_id"),
+            getattr(chunk, "page_content", "") or "")
+
+
+def merge_adjacent(chunks: Sequence) -> List[ContextBlock]:
+    """
+    Une en un solo bloque los chunks consecutivos (chunk_id n, n+1...) del
+    mismo archivo, quitando el texto repetido por el solapamiento. Los chunks
+    sin chunk_id numérico se quedan como bloques sueltos.
+    """
+    blocks: List[ContextBlock] = []
+    by_file = {}
+    for position, chunk in enumerate(chunks):
+        source, filehash, chunk_id, content = _chunk_fields(chunk)
+        if not isinstance(chunk_id, int):
+            label = position + 1 if chunk_id is None else chunk_id
+            blocks.append(ContextBlock(source, filehash, [label], content, position))
+            continue
+        key = filehash or source
+        entries = by_file.setdefault(key, {})
+        # El mismo chunk puede llegar dos veces (p. ej. de dos búsquedas)
+        if chunk_id not in entries:
+            entries[chunk_id] = (position, source, filehash, content)
+
+    for entries in by_file.values():
+        current = None
+        for chunk_id in sorted(entries):
+            position, source, filehash, content = entries[chunk_id]
+            if current is not None and chunk_id == current.chunk_ids[-1] + 1:
+                tail = strip_overlap(current.content, content)
+                if tail:
+                    joined = current.content[-1:].isspace() or tail[:1].isspace()
+                    separator = "" if joined else " "
+                    current.content += separator + tail
+                current.chunk_ids.append(chunk_id)
+                current.rank = min(current.rank, position)
+                continue
+            current = ContextBlock(source, filehash, [chunk_id], content, position)
+            blocks.append(current)
+
+    blocks.sort(key=lambda block: block.rank)
+    return blocks
+
+
+def _shingles(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def drop_near_duplicates(blocks: Sequence[ContextBlock],
+                         threshold: float = CONTEXT_DUPLICATE_THRESHOLD) -> List[ContextBlock]:
+    """
+    Descarta los bloques casi idénticos (o contenidos) en otro más relevante,
+    p. ej. el mismo párrafo en dos versiones de un documento.
+    """
+    kept: List[ContextBlock] = []
+    kept_shingles: List[set] = []
+    for block in blocks:
+        shingles = _shingles(block.content)
+        duplicate = False
+        for other in kept_shingles:
+            if not shingles or not other:
+                continue
+            common = len(shingles & other)
+            jaccard = common / len(shingles | other)
+            containment = common / len(shingles)
+            if jaccard >= threshold or containment >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(block)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def fit_budget(blocks: Sequence[ContextBlock], token_budget: int) -> List[ContextBlock]:
+    """
+    Toma los bloques por orden de relevancia mientras quepan en el
+    presupuesto. El más relevante se recorta si no cabe entero, para que el
+    prompt nunca quede sin contexto.
+    """
+    packed: List[ContextBlock] = []
+    remaining = token_budget
+    for block in blocks:
+        if block.tokens <= remaining:
+            packed.append(block)
+            remaining -= block.tokens
+        elif not packed and remaining > 0:
+            block.content = block.content[:remaining * CHARS_PER_TOKEN]
+            packed.append(block)
+            remaining = 0
+    return packed
+
+
+def pack_context(chunks: Sequence, token_budget: Optional[int] = None,
+                 duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD) -> List[ContextBlock]:
+    """
+    Prepara los chunks recuperados para el prompt: une los contiguos, quita
+    solapamientos y duplicados y ajusta el total al presupuesto de tokens.
+    """
+    if token_budget is None:
+        token_budget = CONTEXT_TOKEN_BUDGET
+    original_tokens = sum(estimate_tokens(_chunk_fields(c)[3]) for c in chunks)
+    blocks = drop_near_duplicates(merge_adjacent(chunks), duplicate_threshold)
+    packed = fit_budget(blocks, token_budget)
+    packed_tokens = sum(block.tokens for block in packed)
+    if len(packed) < len(blocks):
+        logger.warning(
+            f"⚠️ {len(blocks) - len(packed)} de {len(blocks)} bloques de contexto no caben "
+            f"en el presupuesto de {token_budget} tokens (CONTEXT_TOKEN_BUDGET) y se descartan")
+    if packed_tokens < original_tokens:
+        logger.info(
+            f"📦 Contexto empaquetado: {len(chunks)} chunks → {len(packed)} bloques, "
+            f"~{original_tokens} → ~{packed_tokens} tokens")
+    return packed
@@ -0,0 +1,228 @@
+# dedup.py
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+# ===========================
+# Configuración
+# ===========================
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") not in ("0", "false", "no")
+# Máximo de bits distintos (de 64) para considerar dos chunks casi duplicados
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "6"))
+# Los chunks cortos dan huellas poco fiables y ahorran poco: no se deduplican
+DEDUP_MIN_CHARS = int(os.getenv("DEDUP_MIN_CHARS", "200"))
+# Huellas retenidas como máximo; al superarlo se olvidan los archivos más antiguos
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "100000"))
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+
+CHUNK_DEDUP = REGISTRY.counter(
+    "copiloto_chunk_dedup_total", "Chunks por resultado de la deduplicación", ["result"])
+DEDUP_CHARS_SKIPPED = REGISTRY.counter(
+    "copiloto_dedup_chars_skipped_total", "Caracteres que no se embebieron por ser duplicados")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Cada bit de la huella se acumula en un campo de 24 bits de un entero grande:
+# sumar un hash son 8 consultas a tabla (una por byte) en lugar de 64 pasos
+_FIELD_BITS = 24
+_FIELD_MASK = (1 << _FIELD_BITS) - 1
+_SPREAD = [
+    [sum(((byte >> bit) & 1) << ((8 * position + bit) * _FIELD_BITS) for bit in range(8))
+     for byte in range(256)]
+    for position in range(FINGERPRINT_BITS // 8)
+]
+
+
+def _features(text: str) -> List[str]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return words
+    return [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+
+def simhash(text: str) -> int:
+    """
+    Huella SimHash de 64 bits sobre shingles de 3 palabras: textos casi
+    iguales difieren en pocos bits.
+    """
+    features = _features(text)[:_FIELD_MASK]
+    if not features:
+        return 0
+    totals = 0
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(),
+                           "little")
+        for position, table in enumerate(_SPREAD):
+            totals += table[(h >> (8 * position)) & 0xff]
+    half = len(features) / 2
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        if ((totals >> (bit * _FIELD_BITS)) & _FIELD_MASK) > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+ChunkRef = Tuple[str, int]
+
+
+class NearDuplicateIndex:
+    """
+    Índice de huellas SimHash con LSH por bandas: la huella se parte en
+    max_distance + 1 bandas y, por el principio del palomar, dos huellas a
+    esa distancia o menos coinciden en al menos una banda. Solo se compara
+    con los chunks que comparten alguna.
+
+    Vive en memoria del proceso: se pierde al reiniciar y el CLI, la API y la
+    app no comparten huellas, así que solo deduplica contra lo indexado por
+    el mismo proceso. Retiene como mucho max_entries huellas; al pasarse se
+    olvidan archivos enteros, del más antiguo al más reciente.
+    """
+
+    def __init__(self, max_distance: int = DEDUP_MAX_DISTANCE, min_chars: int = DEDUP_MIN_CHARS,
+                 max_entries: int = DEDUP_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.min_chars = min_chars
+        self.max_entries = max_entries
+        bands = max_distance + 1
+        self._widths = [FINGERPRINT_BITS // bands + (1 if i < FINGERPRINT_BITS % bands else 0)
+                        for i in range(bands)]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self._fingerprints: List[int] = []
+        self._refs: List[Optional[ChunkRef]] = []
+        # Orden de inserción = antigüedad de cada archivo
+        self._by_file: Dict[str, List[int]] = {}
+        self._live = 0
+        self._lock = threading.Lock()
+        self.seen = 0
+        self.duplicates = 0
+        self.chars_skipped = 0
+
+    def _bands(self, fingerprint: int):
+        shift = 0
+        for i, width in enumerate(self._widths):
+            yield i, (fingerprint >> shift) & ((1 << width) - 1)
+            shift += width
+
+    def _find_locked(self, fingerprint: int, filehash: str, chunk_id: int) -> Optional[ChunkRef]:
+        checked = set()
+        best = None
+        for i, band in self._bands(fingerprint):
+            for entry in self._tables[i].get(band, ()):
+                if entry in checked:
+                    continue
+                checked.add(entry)
+                ref = self._refs[entry]
+                # Un chunk solo puede apuntar a uno anterior de su propio archivo
+                if ref is None or (ref[0] == filehash and ref[1] >= chunk_id):
+                    continue
+                distance = hamming(fingerprint, self._fingerprints[entry])
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, ref)
+        return best[1] if best else None
+
+    def check(self, text: str, filehash: str, chunk_id: int) -> Optional[ChunkRef]:
+        """
+        Devuelve el chunk canónico (filehash, chunk_id) del que 'text' es casi
+        duplicado o None; en ese caso lo registra como canónico.
+        """
+        if len(text) < self.min_chars:
+            CHUNK_DEDUP.inc(result="short")
+            return None
+        fingerprint = simhash(text)
+        with self._lock:
+            self.seen += 1
+            canonical = self._find_locked(fingerprint, filehash, chunk_id)
+            if canonical is not None:
+                self.duplicates += 1
+                self.chars_skipped += len(text)
+            else:
+                entry = len(self._fingerprints)
+                self._fingerprints.append(fingerprint)
+                self._refs.append((filehash, chunk_id))
+                self._by_file.setdefault(filehash, []).append(entry)
+                for i, band in self._bands(fingerprint):
+                    self._tables[i].setdefault(band, []).append(entry)
+                self._live += 1
+                if self._live > self.max_entries:
+                    self._evict_locked(filehash)
+        if canonical is None:
+            CHUNK_DEDUP.inc(result="unique")
+        else:
+            CHUNK_DEDUP.inc(result="duplicate")
+            DEDUP_CHARS_SKIPPED.inc(len(text))
+        return canonical
+
+    def _forget_locked(self, filehash: str):
+        for entry in self._by_file.pop(filehash, []):
+            self._refs[entry] = None
+            self._live -= 1
+
+    def _evict_locked(self, current: str):
+        """Olvida los archivos más antiguos (nunca el que se está indexando) y compacta."""
+        target = int(self.max_entries * 0.9)
+        for filehash in list(self._by_file):
+            if self._live <= target:
+                break
+            if filehash != current:
+                self._forget_locked(filehash)
+        self._compact_locked()
+
+    def _compact_locked(self):
+        """Reconstruye las tablas sin las entradas olvidadas."""
+        fingerprints, refs = self._fingerprints, self._refs
+        self._tables = [{} for _ in self._widths]
+        self._fingerprints, self._refs = [], []
+        self._by_file = {filehash: [] for filehash in self._by_file}
+        for fingerprint, ref in zip(fingerprints, refs):
+            if ref is None:
+                continue
+            entry = len(self._fingerprints)
+            self._fingerprints.append(fingerprint)
+            self._refs.append(ref)
+            self._by_file[ref[0]].append(entry)
+            for i, band in self._bands(fingerprint):
+                self._tables[i].setdefault(band, []).append(entry)
+
+    def forget(self, filehash: str):
+        """Olvida los chunks de un archivo (p. ej. si su indexación falló)."""
+        with self._lock:
+            self._forget_locked(filehash)
+            # Las entradas olvidadas se liberan cuando llegan a ser la mitad
+            if len(self._fingerprints) > 2 * self._live + 1024:
+                self._compact_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "seen": self.seen,
+                "entries": self._live,
+                "duplicates": self.duplicates,
+                "chars_skipped": self.chars_skipped,
+                "duplicate_rate": (self.duplicates / self.seen) if self.seen else 0.0,
+            }
+
+
+_shared: Optional[NearDuplicateIndex] = None
+_shared_lock = threading.Lock()
+
+
+def get_dedup_index() -> Optional[NearDuplicateIndex]:
+    """Índice de huellas del proceso (acompaña al índice vectorial compartido,
+    pero solo conoce lo indexado desde este proceso)."""
+    global _shared
+    if not DEDUP_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = NearDuplicateIndex()
+        return _shared
@@ -0,0 +1,96 @@
+# embedding_backend.py
+import logging
+import os
+from typing import List
+
+from embedding_cache import EMBEDDING_STORAGE_DTYPE, STORAGE_DTYPES
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Hilos intra-op de torch (0 = lo que decida torch, normalmente un hilo por núcleo)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# "none" o "int8" (cuantización dinámica de las capas Linear, solo CPU)
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "none").lower()
+
+QUANTIZE_MODES = ("none", "int8")
+
+
+class SentenceTransformerBackend:
+    """
+    Modelo de sentence-transformers en CPU con la interfaz de LangChain
+    (embed_documents / embed_query) y control explícito del tamaño de lote,
+    los hilos de torch, la cuantización int8 y la precisión de salida.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL,
+                 batch_size: int = EMBEDDING_BATCH_SIZE,
+                 num_threads: int = EMBEDDING_THREADS,
+                 quantize: str = EMBEDDING_QUANTIZE,
+                 storage_dtype: str = EMBEDDING_STORAGE_DTYPE):
+        if quantize not in QUANTIZE_MODES:
+            raise ValueError(f"EMBEDDING_QUANTIZE no válido: {quantize!r} "
+                             f"(opciones: {', '.join(QUANTIZE_MODES)})")
+        if storage_dtype not in STORAGE_DTYPES:
+            raise ValueError(f"EMBEDDING_STORAGE_DTYPE no válido: {storage_dtype!r} "
+                             f"(opciones: {', '.join(STORAGE_DTYPES)})")
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.quantize = quantize
+        self.storage_dtype = storage_dtype
+        self._torch = torch
+
+        # torch.set_num_threads afecta a todo el proceso
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        self.num_threads = torch.get_num_threads()
+
+        model = SentenceTransformer(model_name, device="cpu")
+        if quantize == "int8":
+            # Pesos de las capas Linear a int8; las activaciones se cuantizan al vuelo
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.eval()
+        self.model = model
+        logger.info(
+            f"🧠 Embeddings {self.name}: lote {batch_size}, {self.num_threads} hilos")
+
+    @property
+    def name(self) -> str:
+        """
+        Identificador de la configuración para la caché de embeddings. La
+        configuración por defecto conserva el nombre del modelo, así siguen
+        valiendo los vectores ya cacheados.
+        """
+        suffixes = []
+        if self.quantize != "none":
+            suffixes.append(self.quantize)
+        if self.storage_dtype != "float32":
+            suffixes.append(self.storage_dtype)
+        return "+".join([self.model_name, *suffixes])
+
+    def _encode(self, texts: List[str]):
+        with self._torch.inference_mode():
+            vectors = self.model.encode(texts, batch_size=self.batch_size,
+                                        convert_to_numpy=True, show_progress_bar=False)
+        if self.storage_dtype == "float16":
+            # Se redondea aquí para que un vector recién calculado y el mismo
+            # leído de la caché (guardado en float16) sean idénticos
+            vectors = vectors.astype("float16").astype("float32")
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
@@ -0,0 +1,212 @@
+# embedding_cache.py
+import hashlib
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from metrics import EMBEDDING_CACHE, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(
+    os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+# Precisión con la que se guardan los vectores: "float32" o "float16" (mitad de espacio)
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32").lower()
+
+STORAGE_DTYPES = ("float32", "float16")
+
+# SQLite limita el número de parámetros por consulta
+_SQL_BATCH = 500
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: List[float], dtype: str = "float32") -> bytes:
+    if dtype == "float16":
+        return struct.pack(f"<{len(vector)}e", *vector)
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(blob: bytes, dtype: str = "float32") -> List[float]:
+    if dtype == "float16":
+        return list(struct.unpack(f"<{len(blob) // 2}e", blob))
+    return array("f", blob).tolist()
+
+
+class EmbeddingCache:
+    """
+    Almacén SQLite de vectores (float32 o float16) indexado por hash de
+    modelo + texto. Acotado a max_entries: al superarlo se eliminan los menos
+    usados recientemente. El nombre del modelo debe distinguir la precisión
+    (ver SentenceTransformerBackend.name) para no mezclar formatos.
+    """
+
+    def __init__(self, path: str, max_entries: int, dtype: str = "float32"):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Precisión de caché no válida: {dtype!r}")
+        self.path = path
+        self.max_entries = max_entries
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = unpack_vector(blob, self.dtype)
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows])
+            self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, pack_vector(vector, self.dtype), now)
+                 for key, vector in items.items()])
+            self._conn.commit()
+            self._evict_locked()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _evict_locked(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (excess,))
+        self._conn.commit()
+        logger.info(f"🧹 Caché de embeddings: {excess} entradas eliminadas")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings:
+    """
+    Envuelve un modelo de embeddings (interfaz embed_documents / embed_query de
+    LangChain) y sólo le envía los textos que no están en la caché.
+    """
+
+    def __init__(self, embeddings, model_name: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model_name, t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # Textos repetidos dentro del mismo lote se calculan una sola vez
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            with stage_timer("embedding"):
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+
+        with self._stats_lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        EMBEDDING_CACHE.inc(len(texts) - len(missing), result="hit")
+        EMBEDDING_CACHE.inc(len(missing), result="miss")
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model_name, text)
+        found = self.cache.get_many([key])
+        if key in found:
+            with self._stats_lock:
+                self.hits += 1
+            EMBEDDING_CACHE.inc(result="hit")
+            return found[key]
+        with stage_timer("embedding"):
+            vector = self.embeddings.embed_query(text)
+        self.cache.put_many({key: vector})
+        with self._stats_lock:
+            self.misses += 1
+        EMBEDDING_CACHE.inc(result="miss")
+        return vector
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+def stats_delta(before: dict, after: dict) -> dict:
+    """
+    Diferencia entre dos instantáneas de CachedEmbeddings.stats(): lo que
+    ocurrió entre ambas (p. ej. al indexar un archivo), no el acumulado del
+    proceso.
+    """
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses,
+            "hit_rate": (hits / total) if total else 0.0}
+
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Devuelve la caché de embeddings compartida por todo el proceso."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache(
+                EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_STORAGE_DTYPE)
+        return _default_cache
@@ -0,0 +1,71 @@
+# embedding_service.py
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from embedding_backend import EMBEDDING_MODEL, SentenceTransformerBackend
+from embedding_cache import CachedEmbeddings, get_embedding_cache
+
+logger = logging.getLogger(__name__)
+
+_shared: Optional[CachedEmbeddings] = None
+_shared_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+
+
+class _LockedEmbeddings:
+    """Serializa las llamadas al modelo compartido entre sesiones (hilos de Streamlit)."""
+
+    def __init__(self, embeddings):
+        self._embeddings = embeddings
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            return self._embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            return self._embeddings.embed_query(text)
+
+
+def get_shared_embeddings() -> CachedEmbeddings:
+    """
+    Devuelve el servicio de embeddings único del proceso. El modelo se carga
+    una sola vez y lo comparten todas las sesiones de Streamlit.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            start = time.time()
+            logger.info(f"🧠 Cargando modelo de embeddings {EMBEDDING_MODEL}...")
+            model = SentenceTransformerBackend(EMBEDDING_MODEL)
+            _shared = CachedEmbeddings(
+                _LockedEmbeddings(model),
+                model_name=model.name,
+                cache=get_embedding_cache()
+            )
+            logger.info(
+                f"✅ Modelo de embeddings listo en {time.time() - start:.2f}s")
+        return _shared
+
+
+def _warm_up():
+    try:
+        embeddings = get_shared_embeddings()
+        # Una pasada real inicializa los kernels de torch
+        embeddings.embeddings.embed_query("warm up")
+    except Exception as e:
+        logger.error(f"❌ Error precargando embeddings: {e}")
+
+
+def warm_up_async():
+    """Precarga el modelo en segundo plano; llamarla varias veces no tiene efecto."""
+    global _warmup_thread
+    with _shared_lock:
+        if _warmup_thread is not None or _shared is not None:
+            return
+        _warmup_thread = threading.Thread(
+            target=_warm_up, name="embeddings-warmup", daemon=True)
+        _warmup_thread.start()
@@ -0,0 +1,513 @@
+# extraction.py
+import atexit
+import importlib.util
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from PyPDF2 import PdfReader
+
+from metrics import REGISTRY
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or (os.cpu_count() or 1)
+PDF_EXTRACT_BATCH_PAGES = int(os.getenv("PDF_EXTRACT_BATCH_PAGES", "8"))
+PDF_EXTRACT_MIN_PAGES_PARALLEL = int(
+    os.getenv("PDF_EXTRACT_MIN_PAGES_PARALLEL", "16"))
+# Con aislamiento todo PDF, también los cortos, se extrae en los procesos
+# del pool y nunca en el proceso de la app
+PDF_EXTRACT_ISOLATED = os.getenv("PDF_EXTRACT_ISOLATED", "1") not in ("0", "false", "no")
+# Segundos máximos por página y por documento (0 = sin límite); el del documento
+# cuenta solo el tiempo esperando a la extracción, no el del consumidor
+PDF_PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "30"))
+PDF_DOCUMENT_TIMEOUT = float(os.getenv("PDF_DOCUMENT_TIMEOUT", "600"))
+# Memoria virtual máxima de cada worker en MB (0 = sin límite)
+PDF_WORKER_MEMORY_MB = int(os.getenv("PDF_WORKER_MEMORY_MB", "2048"))
+# "auto" usa pypdfium2 si está instalado; "pypdf2" o "pypdfium2" lo fuerzan
+PDF_EXTRACT_BACKEND = os.getenv("PDF_EXTRACT_BACKEND", "auto").lower()
+
+# Margen sobre PDF_PAGE_TIMEOUT antes de dar por colgado a un worker (la alarma
+# del worker no interrumpe código nativo)
+WORKER_GRACE_SECONDS = 5.0
+
+ProgressCallback = Callable[[int, int], None]
+
+PAGES_SKIPPED = REGISTRY.counter(
+    "copiloto_pdf_pages_skipped_total", "Páginas de PDF que no se pudieron extraer", ["reason"])
+WORKER_RESTARTS = REGISTRY.counter(
+    "copiloto_pdf_worker_restarts_total", "Reinicios del pool de extracción", ["reason"])
+
+# Un pool por tamaño pedido (max_workers); casi siempre solo el de PDF_EXTRACT_WORKERS
+_executors: Dict[int, ProcessPoolExecutor] = {}
+_executor_lock = threading.Lock()
+
+# Páginas abiertas por cada proceso worker (se reutilizan entre lotes del mismo PDF)
+_worker_pages = None
+
+
+class PageTimeout(Exception):
+    """Una página superó PDF_PAGE_TIMEOUT dentro del worker."""
+
+
+class ExtractionReport:
+    """
+    Resultado de una extracción aparte del texto: backend usado, total de
+    páginas y páginas omitidas (número de página desde 1, motivo).
+    """
+
+    def __init__(self):
+        self.backend = ""
+        self.total_pages = 0
+        self.skipped: List[Tuple[int, str]] = []
+
+    def skip(self, index: int, reason: str):
+        self.skipped.append((index + 1, reason))
+        PAGES_SKIPPED.inc(reason=reason)
+        # Al vencer el plazo se omite todo el resto: basta con el resumen final
+        if reason != "deadline":
+            logger.warning(f"⚠️ Página {index + 1} omitida en la extracción ({reason})")
+
+    def log_summary(self):
+        if self.skipped:
+            logger.warning(
+                f"⚠️ {len(self.skipped)} de {self.total_pages} páginas omitidas: "
+                f"{self.skipped_pages}")
+
+    @property
+    def skipped_pages(self) -> List[int]:
+        return [page for page, _ in self.skipped]
+
+
+# ===========================
+# Backends de extracción
+# ===========================
+
+class _PyPDF2Pages:
+    name = "pypdf2"
+
+    def __init__(self, path: str):
+        self._fh = open(path, "rb")
+        self._reader = PdfReader(self._fh)
+
+    def __len__(self) -> int:
+        return len(self._reader.pages)
+
+    def text(self, index: int) -> str:
+        return self._reader.pages[index].extract_text() or ""
+
+    def close(self):
+        self._fh.close()
+
+
+class _PdfiumPages:
+    """pypdfium2 (PDFium en C): bastante más rápido que PyPDF2 cuando está instalado."""
+    name = "pypdfium2"
+
+    def __init__(self, path: str):
+        import pypdfium2
+        self._pdf = pypdfium2.PdfDocument(path)
+
+    def __len__(self) -> int:
+        return len(self._pdf)
+
+    def text(self, index: int) -> str:
+        page = self._pdf[index]
+        try:
+            textpage = page.get_textpage()
+            try:
+                return textpage.get_text_range().replace("\r\n", "\n")
+            finally:
+                textpage.close()
+        finally:
+            page.close()
+
+    def close(self):
+        self._pdf.close()
+
+
+def _open_pages(path: str):
+    use_pdfium = PDF_EXTRACT_BACKEND == "pypdfium2" or (
+        PDF_EXTRACT_BACKEND == "auto" and importlib.util.find_spec("pypdfium2") is not None)
+    if use_pdfium:
+        try:
+            return _PdfiumPages(path)
+        except Exception as e:
+            logger.warning(f"⚠️ pypdfium2 no pudo abrir el PDF ({e}); usando PyPDF2")
+    return _PyPDF2Pages(path)
+
+
+# ===========================
+# Lado del worker
+# ===========================
+
+def _init_worker(memory_mb: int):
+    """Limita la memoria virtual del worker: al superarla salta MemoryError."""
+    if not memory_mb or resource is None:
+        return
+    limit = memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+@contextmanager
+def _page_alarm(seconds: float):
+    """Lanza PageTimeout si el bloque dura más de 'seconds' (solo hilo principal)."""
+    if not seconds or not hasattr(signal, "setitimer") \
+            or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def _on_alarm(signum, frame):
+        raise PageTimeout(f"más de {seconds:g}s")
+
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_guarded(extract: Callable[[int], str], index: int,
+                     page_timeout: float) -> Tuple[str, Optional[str]]:
+    """(texto, None) o ("", motivo) si la página falla, tarda o agota la memoria."""
+    try:
+        with _page_alarm(page_timeout):
+            return extract(index), None
+    except PageTimeout:
+        return "", "timeout"
+    except MemoryError:
+        return "", "memory"
+    except Exception as e:
+        logger.debug(f"Error extrayendo la página {index + 1}: {e}")
+        return "", "error"
+
+
+def _get_worker_pages(path: str, job_id: str):
+    global _worker_pages
+    if _worker_pages is None or _worker_pages[0] != job_id:
+        if _worker_pages is not None:
+            _worker_pages[1].close()
+        _worker_pages = (job_id, _open_pages(path))
+    return _worker_pages[1]
+
+
+def _count_pages(path: str, job_id: str) -> Tuple[int, str]:
+    pages = _get_worker_pages(path, job_id)
+    return len(pages), pages.name
+
+
+def _extract_page_range(path: str, job_id: str, start: int, stop: int,
+                        page_timeout: float = 0.0) -> List[Tuple[str, Optional[str]]]:
+    pages = _get_worker_pages(path, job_id)
+    return [_extract_guarded(pages.text, i, page_timeout) for i in range(start, stop)]
+
+
+# ===========================
+# Pool de procesos
+# ===========================
+
+def _get_executor(max_workers: int = PDF_EXTRACT_WORKERS) -> ProcessPoolExecutor:
+    """
+    Devuelve el pool de extracción de max_workers procesos, creándolo la
+    primera vez; las llamadas con el mismo tamaño lo comparten.
+    """
+    with _executor_lock:
+        executor = _executors.get(max_workers)
+        if executor is None:
+            # 'spawn' evita hacer fork de un proceso con hilos (Streamlit, torch)
+            executor = _executors[max_workers] = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(PDF_WORKER_MEMORY_MB,)
+            )
+            logger.info(
+                f"🧵 Pool de extracción iniciado con {max_workers} procesos")
+        return executor
+
+
+def shutdown_executor():
+    with _executor_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _kill_executor(executor: ProcessPoolExecutor, reason: str):
+    """
+    Mata los workers de un pool con alguna tarea colgada; el siguiente uso crea
+    otro. Las tareas de otros documentos en ese pool fallan con
+    BrokenProcessPool y se reintentan.
+    """
+    with _executor_lock:
+        size = next((n for n, e in _executors.items() if e is executor), None)
+        if size is None:
+            return  # otro documento ya lo reinició
+        del _executors[size]
+    # ProcessPoolExecutor no expone sus procesos: shutdown no para una tarea en curso
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.kill()
+    WORKER_RESTARTS.inc(reason=reason)
+    logger.warning(f"♻️ Pool de extracción reiniciado ({reason})")
+
+
+atexit.register(shutdown_executor)
+
+
+# ===========================
+# API pública
+# ===========================
+
+def page_batches(total_pages: int, batch_size: int) -> List[range]:
+    """Divide las páginas en rangos contiguos de como máximo batch_size."""
+    batch_size = max(1, batch_size)
+    return [range(start, min(start + batch_size, total_pages))
+            for start in range(0, total_pages, batch_size)]
+
+
+def join_pages(pages: List[str]) -> str:
+    """Une el texto de las páginas en orden (las páginas vacías se omiten)."""
+    return "".join(p + "\n" for p in pages if p)
+
+
+class _Deadline:
+    """
+    Plazo del documento (PDF_DOCUMENT_TIMEOUT) que solo corre mientras se
+    extrae: las páginas se consumen en streaming y el tiempo que el
+    consumidor dedica a trocear, embeber e indexar entre una página y la
+    siguiente no cuenta.
+    """
+
+    def __init__(self, seconds: float):
+        self.expires = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        return None if self.expires is None else max(0.0, self.expires - time.monotonic())
+
+    @contextmanager
+    def paused(self):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            if self.expires is not None:
+                self.expires += time.monotonic() - start
+
+
+def _iter_serial(reader: PdfReader, start: int,
+                 progress_callback: Optional[ProgressCallback],
+                 report: ExtractionReport, deadline: _Deadline) -> Iterator[str]:
+    total_pages = len(reader.pages)
+
+    def extract(index: int) -> str:
+        return reader.pages[index].extract_text() or ""
+
+    for i in range(start, total_pages):
+        if deadline.remaining() == 0:
+            text, reason = "", "deadline"
+        else:
+            text, reason = _extract_guarded(extract, i, PDF_PAGE_TIMEOUT)
+        if reason:
+            report.skip(i, reason)
+        if progress_callback:
+            progress_callback(i + 1, total_pages)
+        with deadline.paused():
+            yield text
+
+
+def _submit(max_workers: int, fn: Callable, *args) -> Tuple[ProcessPoolExecutor, Future]:
+    executor = _get_executor(max_workers)
+    try:
+        return executor, executor.submit(fn, *args)
+    except (BrokenProcessPool, RuntimeError):
+        # Un worker murió entre tareas (o el pool se está cerrando): pool nuevo
+        _kill_executor(executor, "crash")
+        executor = _get_executor(max_workers)
+        return executor, executor.submit(fn, *args)
+
+
+def _wait(executor: ProcessPoolExecutor, future: Future, pages: int,
+          deadline: _Deadline):
+    """
+    Espera una tarea como mucho PDF_PAGE_TIMEOUT por página (más un margen) o
+    hasta el plazo del documento. Devuelve (resultado, None) o (None, motivo);
+    si la tarea se cuelga, el pool se reinicia para liberar el worker.
+    """
+    timeout = PDF_PAGE_TIMEOUT * pages + WORKER_GRACE_SECONDS if PDF_PAGE_TIMEOUT else None
+    reason = "timeout"
+    remaining = deadline.remaining()
+    if remaining is not None and (timeout is None or remaining < timeout):
+        timeout, reason = remaining, "deadline"
+    try:
+        return future.result(timeout=timeout), None
+    except FuturesTimeout:
+        _kill_executor(executor, reason)
+        return None, reason
+    except BrokenProcessPool:
+        _kill_executor(executor, "crash")
+        return None, "crash"
+
+
+def _collect_batch(submitted: Tuple[ProcessPoolExecutor, Future], max_workers: int,
+                   path: str, job_id: str, batch: range,
+                   deadline: _Deadline) -> List[Tuple[str, Optional[str]]]:
+    results, failure = _wait(*submitted, len(batch), deadline)
+    if failure is None:
+        return results
+    if failure == "deadline":
+        return [("", "deadline")] * len(batch)
+    # El lote se perdió entero (worker colgado o caído, quizá por culpa de otro
+    # documento): se reintenta página a página para omitir solo la culpable
+    results = []
+    for index in batch:
+        if deadline.remaining() == 0:
+            results.append(("", "deadline"))
+            continue
+        page, failure = _wait(*_submit(max_workers, _extract_page_range, path, job_id,
+                                       index, index + 1, PDF_PAGE_TIMEOUT), 1, deadline)
+        results.append(page[0] if failure is None else ("", failure))
+    return results
+
+
+def _iter_supervised(path: str, job_id: str, total_pages: int, max_workers: int,
+                     progress_callback: Optional[ProgressCallback],
+                     report: ExtractionReport, deadline: _Deadline) -> Iterator[str]:
+    batch_size = min(PDF_EXTRACT_BATCH_PAGES,
+                     max(1, total_pages // max_workers))
+    batches = page_batches(total_pages, batch_size)
+
+    # Ventana acotada de lotes en vuelo: las páginas se entregan en orden y no
+    # se acumulan resultados de todo el documento
+    window = max_workers * 2
+    submitted = {}
+    next_submit = 0
+    try:
+        for i, batch in enumerate(batches):
+            while (next_submit < len(batches) and next_submit < i + window
+                   and deadline.remaining() != 0):
+                b = batches[next_submit]
+                submitted[next_submit] = _submit(
+                    max_workers, _extract_page_range, path, job_id, b.start, b.stop,
+                    PDF_PAGE_TIMEOUT)
+                next_submit += 1
+            if i in submitted:
+                results = _collect_batch(submitted.pop(i), max_workers, path, job_id, batch,
+                                         deadline)
+            else:
+                results = [("", "deadline")] * len(batch)
+            for index, (text, reason) in zip(batch, results):
+                if reason:
+                    report.skip(index, reason)
+                with deadline.paused():
+                    yield text
+            if progress_callback:
+                progress_callback(batch.stop, total_pages)
+    finally:
+        for _, future in submitted.values():
+            future.cancel()
+
+
+def _spool_to_tempfile(source: Union[bytes, BinaryIO]) -> str:
+    """Copia el PDF a un temporal para que los workers lo abran desde disco."""
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        if isinstance(source, bytes):
+            tmp.write(source)
+        else:
+            source.seek(0)
+            shutil.copyfileobj(source, tmp, 1024 * 1024)
+        return tmp.name
+
+
+def iter_pages(source: Union[bytes, str, BinaryIO],
+               max_workers: Optional[int] = None,
+               progress_callback: Optional[ProgressCallback] = None,
+               report: Optional[ExtractionReport] = None,
+               isolated: Optional[bool] = None) -> Iterator[str]:
+    """
+    Genera el texto de cada página de un PDF (bytes, ruta o archivo abierto) en
+    orden, sin retener el documento completo. Las páginas se extraen por lotes
+    en un pool de procesos vigilado: una página que falla, supera
+    PDF_PAGE_TIMEOUT o agota la memoria del worker se entrega vacía y queda
+    anotada en 'report', igual que las que faltan al vencer
+    PDF_DOCUMENT_TIMEOUT. Sin aislamiento los documentos cortos se extraen en
+    este proceso. max_workers es el tamaño del pool (por defecto
+    PDF_EXTRACT_WORKERS; los documentos con el mismo tamaño comparten pool) y
+    también cuántos lotes hay en vuelo. progress_callback(paginas_hechas,
+    total) se invoca a medida que avanzan.
+    """
+    max_workers = max_workers or PDF_EXTRACT_WORKERS
+    isolated = PDF_EXTRACT_ISOLATED if isolated is None else isolated
+    report = report if report is not None else ExtractionReport()
+    deadline = _Deadline(PDF_DOCUMENT_TIMEOUT)
+
+    if not isolated:
+        if isinstance(source, bytes):
+            stream = io.BytesIO(source)
+        else:
+            if not isinstance(source, str):
+                source.seek(0)
+            stream = source
+        reader = PdfReader(stream)
+        if max_workers <= 1 or len(reader.pages) < PDF_EXTRACT_MIN_PAGES_PARALLEL:
+            report.backend, report.total_pages = _PyPDF2Pages.name, len(reader.pages)
+            yield from _iter_serial(reader, 0, progress_callback, report, deadline)
+            report.log_summary()
+            return
+
+    tmp_path = None
+    try:
+        if not isinstance(source, str):
+            tmp_path = _spool_to_tempfile(source)
+        path = tmp_path or source
+        job_id = uuid.uuid4().hex
+        opened, failure = _wait(*_submit(max_workers, _count_pages, path, job_id), 1, deadline)
+        if failure is not None:
+            raise TimeoutError(f"No se pudo abrir el PDF en el worker de extracción ({failure})")
+        report.total_pages, report.backend = opened
+        yield from _iter_supervised(path, job_id, report.total_pages, max_workers,
+                                    progress_callback, report, deadline)
+        report.log_summary()
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def extract_pages(source: Union[bytes, str, BinaryIO],
+                  max_workers: Optional[int] = None,
+                  progress_callback: Optional[ProgressCallback] = None,
+                  report: Optional[ExtractionReport] = None,
+                  isolated: Optional[bool] = None) -> List[str]:
+    """Extrae todas las páginas de un PDF y las devuelve en una lista."""
+    return list(iter_pages(source, max_workers, progress_callback, report, isolated))
@@ -0,0 +1,207 @@
+# extraction_cache.py
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from typing import Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+EXTRACTION_CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR", os.path.join(".cache", "extraction"))
+EXTRACTION_CACHE_MAX_MB = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "512"))
+
+
+class ExtractionCache:
+    """
+    Caché en disco del texto extraído de cada PDF, direccionada por el MD5 del archivo.
+    Cada entrada es un JSON Lines comprimido: una cabecera con el tipo de documento
+    y después una línea por página, de modo que se puede escribir y leer en
+    streaming. Cuando el tamaño total supera max_bytes se eliminan las entradas
+    usadas hace más tiempo (LRU por mtime). La cabecera guarda además la
+    versión del texto (p. ej. la configuración de limpieza que se le aplicó):
+    una entrada de otra versión cuenta como ausente y se sobrescribe.
+    """
+
+    SUFFIX = ".jsonl.gz"
+    # Formato anterior (un único JSON); sólo se tiene en cuenta para desalojarlo
+    LEGACY_SUFFIX = ".json.gz"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, filehash: str) -> str:
+        return os.path.join(self.directory, filehash + self.SUFFIX)
+
+    def _tmp_path(self, filehash: str) -> str:
+        return os.path.join(self.directory, f".{filehash}.{uuid.uuid4().hex[:8]}.tmp")
+
+    def open_pages(self, filehash: str,
+                   version: str = "") -> Optional[Tuple[str, Iterator[str]]]:
+        """
+        Devuelve (tipo de documento, iterador de páginas) sin cargar la entrada
+        entera, o None si no está en caché.
+        """
+        path = self._path(filehash)
+        try:
+            fh = gzip.open(path, "rt", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        try:
+            header = json.loads(fh.readline())
+            doc_type = header["doc_type"]
+            if header.get("version", "") != version:
+                fh.close()
+                return None
+            # Marcar como usado recientemente
+            os.utime(path, None)
+        except FileNotFoundError:
+            fh.close()
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            fh.close()
+            logger.warning(
+                f"⚠️ Entrada de caché corrupta {filehash[:8]}: {e}")
+            self.discard(filehash)
+            return None
+        return doc_type, self._iter_lines(fh)
+
+    @staticmethod
+    def _iter_lines(fh) -> Iterator[str]:
+        with fh:
+            for line in fh:
+                yield json.loads(line)
+
+    def get(self, filehash: str, version: str = "") -> Optional[dict]:
+        opened = self.open_pages(filehash, version)
+        if opened is None:
+            return None
+        doc_type, pages = opened
+        try:
+            return {"pages": list(pages), "doc_type": doc_type}
+        except (OSError, ValueError) as e:
+            logger.warning(
+                f"⚠️ Entrada de caché corrupta {filehash[:8]}: {e}")
+            self.discard(filehash)
+            return None
+
+    def writer(self, filehash: str, version: str = "") -> "CacheWriter":
+        return CacheWriter(self, filehash, version)
+
+    def put(self, filehash: str, pages: Iterable[str], doc_type: str, version: str = ""):
+        writer = self.writer(filehash, version)
+        try:
+            for page in pages:
+                writer.write(page)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit(doc_type)
+
+    def discard(self, filehash: str):
+        try:
+            os.remove(self._path(filehash))
+        except OSError:
+            pass
+
+    def size_bytes(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith((self.SUFFIX, self.LEGACY_SUFFIX)):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, _, size in entries)
+            for _, name, size in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    total -= size
+                    logger.info(f"🧹 Caché de extracción: eliminado {name}")
+                except OSError:
+                    pass
+
+
+class CacheWriter:
+    """
+    Escribe una entrada de la caché página a página. El tipo de documento se
+    conoce al final, así que las páginas van a un temporal y commit() compone
+    la entrada (cabecera + páginas) y la publica de forma atómica.
+    """
+
+    def __init__(self, cache: ExtractionCache, filehash: str, version: str = ""):
+        self.cache = cache
+        self.filehash = filehash
+        self.version = version
+        self._pages_path = cache._tmp_path(filehash)
+        self._fh = open(self._pages_path, "w", encoding="utf-8")
+
+    def write(self, page: str):
+        self._fh.write(json.dumps(page, ensure_ascii=False))
+        self._fh.write("\n")
+
+    def commit(self, doc_type: str):
+        self._fh.close()
+        tmp_path = self.cache._tmp_path(self.filehash)
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as out, \
+                    open(self._pages_path, "r", encoding="utf-8") as pages:
+                header = {"doc_type": doc_type}
+                if self.version:
+                    header["version"] = self.version
+                out.write(json.dumps(header, ensure_ascii=False) + "\n")
+                shutil.copyfileobj(pages, out, 1024 * 1024)
+            os.replace(tmp_path, self.cache._path(self.filehash))
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar en caché {self.filehash[:8]}: {e}")
+            _remove_quietly(tmp_path)
+            return
+        finally:
+            _remove_quietly(self._pages_path)
+        self.cache._evict()
+
+    def abort(self):
+        self._fh.close()
+        _remove_quietly(self._pages_path)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_default_cache: Optional[ExtractionCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Devuelve la caché de extracción compartida por todo el proceso."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ExtractionCache(
+                EXTRACTION_CACHE_DIR, int(EXTRACTION_CACHE_MAX_MB * 1024 * 1024))
+        return _default_cache
@@ -0,0 +1,499 @@
+# flat_index.py
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (un solo escritor)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+# Segmentos acumulados antes de compactarlos en uno solo
+FLAT_INDEX_MAX_SEGMENTS = int(os.getenv("FLAT_INDEX_MAX_SEGMENTS", "32"))
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+
+@contextmanager
+def _directory_lock(directory: str):
+    """Bloqueo exclusivo entre procesos (flock) sobre el directorio del índice."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _read_manifest(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {"generation": 0, "segments": []}
+
+
+def _write_manifest(directory: str, manifest: dict):
+    tmp = os.path.join(directory, f"{MANIFEST_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh)
+    os.replace(tmp, os.path.join(directory, MANIFEST_FILE))
+
+
+def _manifest_stamp(directory: str) -> Optional[tuple]:
+    """Huella barata del manifest para saber si otro proceso lo ha cambiado."""
+    try:
+        st = os.stat(os.path.join(directory, MANIFEST_FILE))
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def _segment_paths(directory: str, name: str):
+    return os.path.join(directory, name + ".npy"), os.path.join(directory, name + ".jsonl")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def matches_filter(metadata: dict, where: Optional[dict]) -> bool:
+    """
+    Evalúa el subconjunto de filtros de Chroma que usa la app: igualdad,
+    $eq, $ne, $in, $nin y $and / $or.
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+                if op not in ("$eq", "$ne", "$in", "$nin"):
+                    raise ValueError(f"Operador de filtro no soportado: {op}")
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class FlatIndex:
+    """
+    Índice vectorial en memoria con la interfaz de Chroma que usa la app
+    (add_documents, similarity_search_by_vector, get, delete). Los vectores
+    normalizados viven en una matriz contigua y el top-k sale de un único
+    producto matriz-vector más argpartition: para los pocos miles de chunks
+    de una sesión es más rápido que un HNSW y no hay nada que crear ni
+    destruir.
+
+    Con 'directory' se guarda en disco como segmentos de solo añadir (una
+    matriz .npy, abierta con memmap, y sus registros) listados en un
+    manifest. save() escribe solo lo cambiado desde el último guardado y
+    refresh() carga lo que hayan añadido otros procesos (p. ej. el CLI de
+    ingesta). Ambos toman un flock del directorio, así que varios procesos
+    pueden escribir a la vez sin pisarse; como los ids son direccionados por
+    contenido, dos escrituras del mismo id guardan lo mismo. En Windows no
+    hay flock y debe haber un solo proceso escritor.
+    """
+
+    def __init__(self, embedding_function, directory: Optional[str] = None):
+        self.embedding_function = embedding_function
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._rows: Dict[str, int] = {}
+        # Código entero del filehash de cada fila: el filtro por sesión es un np.isin
+        self._file_codes = np.zeros(0, dtype=np.int32)
+        self._codes: Dict[str, int] = {}
+        # Cambios aún no guardados y segmentos ya aplicados
+        self._dirty: Dict[str, None] = {}
+        self._deleted: Dict[str, None] = {}
+        self._generation = 0
+        self._segments_seen: set = set()
+        self._manifest_stamp = None
+        if directory and os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+            self.load(directory)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    # ---------------------------
+    # Escritura
+    # ---------------------------
+
+    def _file_code(self, filehash) -> int:
+        return self._codes.setdefault(filehash, len(self._codes))
+
+    def _reserve(self, rows: int, dim: int):
+        """Garantiza capacidad para 'rows' filas más, duplicando la matriz."""
+        needed = self._size + rows
+        if self._vectors is None:
+            capacity = max(needed, 1024)
+            self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+            self._file_codes = np.zeros(capacity, dtype=np.int32)
+            return
+        if self._vectors.shape[1] != dim:
+            raise ValueError(
+                f"Dimensión {dim} distinta de la del índice ({self._vectors.shape[1]})")
+        # Una matriz abierta con memmap es de solo lectura: se copia al escribir
+        if needed > self._vectors.shape[0] or not self._vectors.flags.writeable:
+            capacity = max(needed, self._vectors.shape[0] * 2)
+            vectors = np.zeros((capacity, dim), dtype=np.float32)
+            vectors[:self._size] = self._vectors[:self._size]
+            codes = np.zeros(capacity, dtype=np.int32)
+            codes[:self._size] = self._file_codes[:self._size]
+            self._vectors, self._file_codes = vectors, codes
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                       metadatas: List[dict], ids: List[str]) -> List[str]:
+        if not texts:
+            return []
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._upsert(texts, vectors, metadatas, ids)
+            for doc_id in ids:
+                self._deleted.pop(doc_id, None)
+                self._dirty[doc_id] = None
+        return list(ids)
+
+    def _upsert(self, texts: List[str], vectors: np.ndarray, metadatas: List[dict],
+                ids: List[str]):
+        self._reserve(len(texts), vectors.shape[1])
+        for text, vector, metadata, doc_id in zip(texts, vectors, metadatas, ids):
+            row = self._rows.get(doc_id)
+            if row is None:
+                row = self._size
+                self._size += 1
+                self._rows[doc_id] = row
+                self._ids.append(doc_id)
+                self._texts.append(text)
+                self._metadatas.append(metadata)
+            else:
+                self._texts[row] = text
+                self._metadatas[row] = metadata
+            self._vectors[row] = vector
+            self._file_codes[row] = self._file_code(metadata.get("filehash"))
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None,
+                      **kwargs) -> List[str]:
+        texts = [d.page_content for d in documents]
+        metadatas = [dict(d.metadata or {}) for d in documents]
+        if ids is None:
+            ids = [f"{m.get('filehash', 'doc')}-{m.get('chunk_id', i)}"
+                   for i, m in enumerate(metadatas)]
+        embeddings = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas, list(ids))
+
+    def _delete_rows(self, rows: Iterable[int], track: bool = True) -> int:
+        drop = set(rows)
+        if not drop:
+            return 0
+        if track:
+            for row in drop:
+                self._dirty.pop(self._ids[row], None)
+                self._deleted[self._ids[row]] = None
+        keep = np.array([r for r in range(self._size) if r not in drop], dtype=np.int64)
+        self._vectors = np.ascontiguousarray(self._vectors[keep])
+        self._file_codes = np.ascontiguousarray(self._file_codes[keep])
+        self._ids = [self._ids[r] for r in keep]
+        self._texts = [self._texts[r] for r in keep]
+        self._metadatas = [self._metadatas[r] for r in keep]
+        self._size = len(keep)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        return len(drop)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[dict] = None) -> int:
+        with self._lock:
+            rows = [self._rows[i] for i in (ids or []) if i in self._rows]
+            if where:
+                rows.extend(r for r in range(self._size)
+                            if matches_filter(self._metadatas[r], where))
+            return self._delete_rows(rows)
+
+    def delete_file(self, filehash: str) -> int:
+        """Elimina todos los chunks de un archivo. Devuelve cuántos había."""
+        with self._lock:
+            code = self._codes.get(filehash)
+            if code is None:
+                return 0
+            rows = np.flatnonzero(self._file_codes[:self._size] == code)
+            return self._delete_rows(rows.tolist())
+
+    # ---------------------------
+    # Lectura
+    # ---------------------------
+
+    def _candidate_rows(self, where: Optional[dict]) -> Optional[np.ndarray]:
+        """Filas que cumplen el filtro (None = todas)."""
+        if not where:
+            return None
+        condition = where.get("filehash") if len(where) == 1 else None
+        if isinstance(condition, dict) and set(condition) == {"$in"}:
+            codes = [self._codes[h] for h in condition["$in"] if h in self._codes]
+            return np.flatnonzero(np.isin(self._file_codes[:self._size], codes))
+        if isinstance(condition, str):
+            code = self._codes.get(condition, -1)
+            return np.flatnonzero(self._file_codes[:self._size] == code)
+        return np.array([r for r in range(self._size)
+                         if matches_filter(self._metadatas[r], where)], dtype=np.int64)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None) -> List[tuple]:
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        with self._lock:
+            if self._size == 0:
+                return []
+            rows = self._candidate_rows(filter)
+            matrix = self._vectors[:self._size] if rows is None else self._vectors[rows]
+            if matrix.shape[0] == 0:
+                return []
+            scores = matrix @ query
+            k = min(k, scores.shape[0])
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            result = []
+            for i in top:
+                row = int(i) if rows is None else int(rows[i])
+                result.append((Document(page_content=self._texts[row],
+                                        metadata=dict(self._metadatas[row])),
+                               float(scores[i])))
+            return result
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[dict] = None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(
+            embedding, k, filter)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                          **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(
+            self.embedding_function.embed_query(query), k, filter)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None,
+            limit: Optional[int] = None, include: Optional[List[str]] = None) -> dict:
+        """Como Collection.get de Chroma: ids y, según include, metadatos, textos y vectores."""
+        include = ["metadatas", "documents"] if include is None else include
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[i] for i in ids if i in self._rows]
+            else:
+                candidates = self._candidate_rows(where)
+                rows = list(range(self._size)) if candidates is None else candidates.tolist()
+            if ids is not None and where:
+                rows = [r for r in rows if matches_filter(self._metadatas[r], where)]
+            if limit is not None:
+                rows = rows[:limit]
+            result = {"ids": [self._ids[r] for r in rows]}
+            if "metadatas" in include:
+                result["metadatas"] = [dict(self._metadatas[r]) for r in rows]
+            if "documents" in include:
+                result["documents"] = [self._texts[r] for r in rows]
+            if "embeddings" in include:
+                result["embeddings"] = [self._vectors[r].tolist() for r in rows]
+            return result
+
+    # ---------------------------
+    # Persistencia
+    # ---------------------------
+
+    def _write_segment(self, directory: str, ids: List[str], deleted: Iterable[str]) -> str:
+        """Escribe un segmento con las filas de 'ids' y las bajas de 'deleted'."""
+        name = uuid.uuid4().hex
+        vectors_path, records_path = _segment_paths(directory, name)
+        rows = [self._rows[doc_id] for doc_id in ids]
+        dim = self._vectors.shape[1] if self._vectors is not None else 0
+        vectors = (self._vectors[rows] if rows
+                   else np.zeros((0, dim), dtype=np.float32))
+        with open(vectors_path, "wb") as fh:
+            np.save(fh, np.ascontiguousarray(vectors))
+        with open(records_path, "w", encoding="utf-8") as fh:
+            for row in rows:
+                fh.write(json.dumps({"id": self._ids[row], "text": self._texts[row],
+                                     "metadata": self._metadatas[row]},
+                                    ensure_ascii=False) + "\n")
+            for doc_id in deleted:
+                fh.write(json.dumps({"id": doc_id, "deleted": True}) + "\n")
+        return name
+
+    def _apply_segment(self, directory: str, name: str):
+        """Aplica un segmento ajeno; los cambios locales sin guardar prevalecen."""
+        vectors_path, records_path = _segment_paths(directory, name)
+        vectors = np.load(vectors_path, mmap_mode="r")
+        upserts, deletions = [], []
+        with open(records_path, encoding="utf-8") as fh:
+            for line in fh:
+                record = json.loads(line)
+                (deletions if record.get("deleted") else upserts).append(record)
+        if len(upserts) != vectors.shape[0]:
+            raise ValueError(f"Segmento {name} en {directory} inconsistente: "
+                             f"{len(upserts)} registros y {vectors.shape[0]} vectores")
+        pending = self._dirty.keys() | self._deleted.keys()
+        if self._size == 0 and not deletions and not pending:
+            # Índice vacío: la matriz se mapea en memoria tal cual (solo lectura)
+            self._vectors = vectors if upserts else None
+            self._size = len(upserts)
+            self._ids = [r["id"] for r in upserts]
+            self._texts = [r["text"] for r in upserts]
+            self._metadatas = [r["metadata"] for r in upserts]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._codes = {}
+            self._file_codes = np.array(
+                [self._file_code(m.get("filehash")) for m in self._metadatas], dtype=np.int32)
+            return
+        self._delete_rows([self._rows[r["id"]] for r in deletions
+                           if r["id"] in self._rows and r["id"] not in pending], track=False)
+        keep = [i for i, r in enumerate(upserts) if r["id"] not in pending]
+        if keep:
+            self._upsert([upserts[i]["text"] for i in keep], np.asarray(vectors[keep]),
+                         [upserts[i]["metadata"] for i in keep], [upserts[i]["id"] for i in keep])
+
+    def _reset(self):
+        self._vectors = None
+        self._size = 0
+        self._ids, self._texts, self._metadatas = [], [], []
+        self._rows = {}
+        self._codes = {}
+        self._file_codes = np.zeros(0, dtype=np.int32)
+        self._segments_seen = set()
+
+    def _sync_locked(self, directory: str) -> int:
+        """
+        Pone el índice al día con el manifest (con el flock tomado). Si otro
+        proceso compactó, se recarga entero y se reaplican los cambios locales
+        pendientes. Devuelve cuántos segmentos se aplicaron.
+        """
+        manifest = _read_manifest(directory)
+        if manifest["generation"] != self._generation:
+            dirty = [self._rows[doc_id] for doc_id in self._dirty]
+            pending = (
+                [self._texts[r] for r in dirty],
+                np.array(self._vectors[dirty]) if dirty else None,
+                [self._metadatas[r] for r in dirty],
+                [self._ids[r] for r in dirty],
+            )
+            deleted = list(self._deleted)
+            self._dirty, self._deleted = {}, {}
+            self._reset()
+            for name in manifest["segments"]:
+                self._apply_segment(directory, name)
+            if dirty:
+                self._upsert(*pending)
+            self._delete_rows([self._rows[i] for i in deleted if i in self._rows], track=False)
+            self._dirty = dict.fromkeys(pending[3])
+            self._deleted = dict.fromkeys(deleted)
+            applied = len(manifest["segments"])
+        else:
+            new = [n for n in manifest["segments"] if n not in self._segments_seen]
+            for name in new:
+                self._apply_segment(directory, name)
+            applied = len(new)
+        self._generation = manifest["generation"]
+        self._segments_seen = set(manifest["segments"])
+        self._manifest_stamp = _manifest_stamp(directory)
+        return applied
+
+    def refresh(self) -> int:
+        """
+        Carga los segmentos que otros procesos hayan guardado desde la última
+        vez. Si el manifest no ha cambiado no se toma ni el bloqueo.
+        """
+        if not self.directory or _manifest_stamp(self.directory) == self._manifest_stamp:
+            return 0
+        with self._lock, _directory_lock(self.directory):
+            applied = self._sync_locked(self.directory)
+        if applied:
+            logger.info(f"🔄 Índice plano actualizado desde {self.directory}: "
+                        f"{applied} segmentos, {self._size} chunks")
+        return applied
+
+    def save(self, directory: Optional[str] = None):
+        """
+        Guarda en el directorio del índice solo lo cambiado desde el último
+        guardado, como un segmento nuevo. Antes se incorporan los segmentos de
+        otros procesos y, pasados FLAT_INDEX_MAX_SEGMENTS, todo se compacta en
+        uno. Con otro 'directory' se escribe una copia completa.
+        """
+        directory = directory or self.directory
+        if not directory:
+            raise ValueError("FlatIndex sin directorio donde guardar")
+        with self._lock, _directory_lock(directory):
+            if directory != self.directory:
+                self._compact_locked(directory, _read_manifest(directory))
+                return
+            self._sync_locked(directory)
+            if not self._dirty and not self._deleted:
+                return
+            manifest = _read_manifest(directory)
+            manifest["segments"].append(
+                self._write_segment(directory, list(self._dirty), list(self._deleted)))
+            if len(manifest["segments"]) > FLAT_INDEX_MAX_SEGMENTS:
+                self._compact_locked(directory, manifest)
+            else:
+                _write_manifest(directory, manifest)
+                self._segments_seen.add(manifest["segments"][-1])
+                self._manifest_stamp = _manifest_stamp(directory)
+            self._dirty, self._deleted = {}, {}
+
+    def _compact_locked(self, directory: str, manifest: dict):
+        """Sustituye los segmentos por uno con todas las filas (nueva generación)."""
+        name = self._write_segment(directory, list(self._ids), [])
+        old = manifest["segments"]
+        generation = manifest["generation"] + 1
+        _write_manifest(directory, {"generation": generation, "segments": [name]})
+        for old_name in old:
+            for path in _segment_paths(directory, old_name):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        if directory == self.directory:
+            self._generation = generation
+            self._segments_seen = {name}
+            self._manifest_stamp = _manifest_stamp(directory)
+        logger.info(f"🗜️ Índice plano compactado en {directory}: {self._size} chunks")
+
+    def load(self, directory: str):
+        """Abre un índice guardado; el segmento base se mapea en memoria (solo lectura)."""
+        with self._lock, _directory_lock(directory):
+            self._dirty, self._deleted = {}, {}
+            self._generation = None  # fuerza la recarga completa
+            self._sync_locked(directory)
+        logger.info(f"🗄️ Índice plano cargado de {directory}: {self._size} chunks")
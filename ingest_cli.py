@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Ingesta por lotes de un directorio de PDFs en el índice compartido que usa la app.
+
+    python ingest_cli.py /ruta/a/pdfs [--workers 8] [--recursive]
+
+La extracción, detección de tipo y chunking corren en procesos worker; los
+embeddings se calculan en el proceso principal por lotes. Los archivos cuyo
+hash ya está indexado se omiten, así que se puede relanzar tras una interrupción.
+
+Con el backend Chroma (por defecto) la app y la API deben estar paradas: Chroma
+no admite dos procesos escribiendo el mismo directorio y el CLI se niega a
+arrancar si lo detecta. Con VECTOR_BACKEND=flat pueden seguir funcionando.
+"""
+import argparse
+import glob
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from embedding_service import get_shared_embeddings
+from pipeline import file_md5, prepare_file
+from vector_index import (INDEX_BATCH_SIZE, VECTOR_BACKEND, IndexInUseError,
+                          claim_index_directory, get_shared_index, index_chunks,
+                          is_file_indexed)
+
+logger = logging.getLogger("ingest_cli")
+
+
+def find_pdfs(directory: str, recursive: bool):
+    pattern = os.path.join(directory, "**", "*.pdf") if recursive else os.path.join(directory, "*.pdf")
+    return sorted(glob.glob(pattern, recursive=recursive))
+
+
+def index_prepared(vs, prepared: dict, batch_size: int) -> int:
+    file_chunks, _ = index_chunks(
+        vs, prepared["filehash"], prepared["filename"], prepared["doc_type"],
+        prepared["texts"], batch_size=batch_size,
+        complete=lambda: not prepared.get("skipped_pages"))
+    file_chunks.close()
+    return len(prepared["texts"])
+
+
+def run(directory: str, workers: int, recursive: bool, batch_size: int) -> int:
+    paths = find_pdfs(directory, recursive)
+    logger.info(f"📂 {len(paths)} PDFs encontrados en {directory}")
+    if not paths:
+        return 0
+
+    if VECTOR_BACKEND != "flat":
+        # Chroma admite un solo proceso escritor: la app y la API deben estar paradas
+        try:
+            claim_index_directory(exclusive=True)
+        except IndexInUseError as e:
+            logger.error(f"❌ {e}")
+            return 1
+    embeddings = get_shared_embeddings()
+    vs = get_shared_index(embeddings)
+
+    pending = []
+    skipped = 0
+    for path in paths:
+        filehash = file_md5(path)
+        if is_file_indexed(vs, filehash):
+            skipped += 1
+            continue
+        pending.append((path, filehash))
+    logger.info(f"⏭️ {skipped} ya indexados, {len(pending)} por procesar")
+
+    start = time.time()
+    done = failed = chunks = 0
+    # Se limita el trabajo en vuelo para no acumular resultados en memoria
+    max_in_flight = workers * 2
+    queue = list(reversed(pending))
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        in_flight = {}
+        while queue or in_flight:
+            while queue and len(in_flight) < max_in_flight:
+                path, filehash = queue.pop()
+                in_flight[executor.submit(prepare_file, path, filehash)] = path
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = in_flight.pop(future)
+                try:
+                    prepared = future.result()
+                    chunks += index_prepared(vs, prepared, batch_size)
+                    done += 1
+                    logger.info(
+                        f"✅ [{done + failed}/{len(pending)}] {prepared['filename']} "
+                        f"({prepared['doc_type']}, {len(prepared['texts'])} chunks)")
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"❌ No se pudo procesar {path}: {e}")
+
+    elapsed = time.time() - start
+    logger.info(
+        f"🎉 Ingesta terminada: {done} archivos, {chunks} chunks, {failed} errores "
+        f"en {elapsed:.1f}s")
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directorio con los PDFs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Procesos para extracción y chunking")
+    parser.add_argument("--recursive", action="store_true",
+                        help="Buscar PDFs también en subdirectorios")
+    parser.add_argument("--batch-size", type=int, default=INDEX_BATCH_SIZE,
+                        help="Chunks por lote de embeddings/indexado")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    if not os.path.isdir(args.directory):
+        parser.error(f"No existe el directorio: {args.directory}")
+    return run(args.directory, args.workers, args.recursive, args.batch_size)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+# llm_client.py
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import record_ollama_generation
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3:8b")
+# Tiempo que Ollama mantiene el modelo cargado tras la última petición
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+# Máximo entre dos fragmentos de la respuesta (o hasta la respuesta completa)
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+# Ventana de contexto del modelo (se envía en cada petición, también en la precarga)
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+
+DEFAULT_OPTIONS = {
+    "temperature": 0.1,
+    "num_predict": 512,
+    "top_k": 10,
+    "top_p": 0.9,
+    "repeat_penalty": 1.1,
+    "num_ctx": OLLAMA_NUM_CTX,
+}
+
+
+class LLMError(Exception):
+    pass
+
+
+class GenerationStats:
+    """Contadores que Ollama devuelve en la última línea de /api/generate."""
+
+    __slots__ = ("prompt_eval_count", "eval_count", "prompt_eval_duration",
+                 "eval_duration", "load_duration", "total_duration", "context")
+
+    def __init__(self, response: dict):
+        self.prompt_eval_count = response.get("prompt_eval_count") or 0
+        self.eval_count = response.get("eval_count") or 0
+        self.prompt_eval_duration = (response.get("prompt_eval_duration") or 0) / 1e9
+        self.eval_duration = (response.get("eval_duration") or 0) / 1e9
+        self.load_duration = (response.get("load_duration") or 0) / 1e9
+        self.total_duration = (response.get("total_duration") or 0) / 1e9
+        # Tokens de la conversación (prompt + respuesta) para continuarla
+        self.context = response.get("context")
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.eval_count / self.eval_duration if self.eval_duration > 0 else 0.0
+
+
+class OllamaClient:
+    """
+    Cliente HTTP de Ollama compartido por todo el proceso: una sesión de
+    requests con pool de conexiones (sin handshake TCP por pregunta), timeouts,
+    reintentos con backoff ante errores de conexión o 5xx y keep_alive para
+    que el modelo siga cargado entre preguntas.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, model: str = OLLAMA_MODEL,
+                 options: Optional[dict] = None, keep_alive: str = OLLAMA_KEEP_ALIVE,
+                 connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+                 read_timeout: float = OLLAMA_READ_TIMEOUT,
+                 max_retries: int = OLLAMA_MAX_RETRIES, pool_size: int = OLLAMA_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.options = dict(DEFAULT_OPTIONS if options is None else options)
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # No se reintenta tras un timeout de lectura: la generación ya estaba en curso
+        retry = Retry(total=max_retries, connect=max_retries, read=0,
+                      status=max_retries, backoff_factor=0.5,
+                      status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset({"GET", "POST"}))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._preload_thread: Optional[threading.Thread] = None
+        self._preload_lock = threading.Lock()
+
+    def _payload(self, prompt: str, stream: bool, options: Optional[dict],
+                 context: Optional[list] = None) -> dict:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {**self.options, **(options or {})},
+        }
+        if context:
+            payload["context"] = context
+        return payload
+
+    def _post(self, payload: dict, stream: bool) -> requests.Response:
+        try:
+            response = self.session.post(f"{self.base_url}/api/generate", json=payload,
+                                         stream=stream, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise LLMError(f"No se pudo contactar con Ollama en {self.base_url}: {e}") from e
+        if response.status_code != 200:
+            detail = response.text[:500]
+            response.close()
+            raise LLMError(f"Ollama respondió {response.status_code}: {detail}")
+        return response
+
+    def generate(self, prompt: str, options: Optional[dict] = None,
+                 operation: str = "generate", context: Optional[list] = None) -> tuple:
+        """Generación completa sin streaming. Devuelve (texto, GenerationStats)."""
+        with self._post(self._payload(prompt, False, options, context), stream=False) as response:
+            data = response.json()
+        if "error" in data:
+            raise LLMError(data["error"])
+        record_ollama_generation(data, operation)
+        return data.get("response", ""), GenerationStats(data)
+
+    def invoke(self, prompt: str, options: Optional[dict] = None,
+               operation: str = "generate") -> str:
+        return self.generate(prompt, options, operation)[0]
+
+    def stream(self, prompt: str, options: Optional[dict] = None, operation: str = "generate",
+               on_done: Optional[Callable[[GenerationStats], None]] = None,
+               context: Optional[list] = None) -> Iterator[str]:
+        """
+        Devuelve los fragmentos de texto a medida que llegan. Al terminar se
+        registran las métricas y, si se indica, on_done recibe las estadísticas.
+        Con 'context' (el de una respuesta anterior) el prompt continúa esa
+        conversación.
+        """
+        final = None
+        with self._post(self._payload(prompt, True, options, context), stream=True) as response:
+            # Se lee hasta el final del cuerpo para que la conexión vuelva al pool
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    raise LLMError(data["error"])
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    final = data
+        if final is not None:
+            record_ollama_generation(final, operation)
+            if on_done is not None:
+                on_done(GenerationStats(final))
+
+    def preload(self) -> float:
+        """
+        Carga el modelo en Ollama (petición sin prompt) para que la primera
+        pregunta no pague la carga. Devuelve los segundos que tardó. Se envían
+        las mismas opciones que en las preguntas: con otro num_ctx Ollama
+        volvería a cargar el modelo en la primera.
+        """
+        start = time.time()
+        payload = {"model": self.model, "keep_alive": self.keep_alive, "stream": False,
+                   "options": self.options}
+        with self._post(payload, stream=False) as response:
+            response.json()
+        return time.time() - start
+
+    def preload_async(self):
+        """Precarga en segundo plano; llamarla varias veces no tiene efecto."""
+        with self._preload_lock:
+            if self._preload_thread is not None:
+                return
+            self._preload_thread = threading.Thread(
+                target=self._preload_logged, name="ollama-preload", daemon=True)
+            self._preload_thread.start()
+
+    def _preload_logged(self):
+        logger.info(f"🦙 Precargando {self.model} en Ollama...")
+        try:
+            logger.info(f"✅ {self.model} cargado en {self.preload():.2f}s")
+        except LLMError as e:
+            logger.error(f"❌ Error precargando el modelo: {e}")
+
+    def close(self):
+        self.session.close()
+
+
+_shared: Optional[OllamaClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_llm_client() -> OllamaClient:
+    """Devuelve el cliente de Ollama único del proceso (sobrevive a los reruns)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = OllamaClient()
+        return _shared
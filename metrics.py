@@ -0,0 +1,345 @@
+# metrics.py
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+# Puerto del endpoint /metrics (0 = desactivado)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Archivo donde volcar las métricas periódicamente (vacío = desactivado)
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "15"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monótono con etiquetas."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos, como los de Prometheus."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # etiquetas -> [conteos por bucket, suma, total]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[n]) for n in self.labelnames))
+        return series[2] if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "copiloto_stage_seconds",
+    "Tiempo por etapa (exclusivo de sus subetapas)", ["stage"])
+STAGE_TOTAL = REGISTRY.counter(
+    "copiloto_stage_total", "Ejecuciones por etapa y resultado", ["stage", "status"])
+LLM_TOKENS = REGISTRY.counter(
+    "copiloto_llm_tokens_total", "Tokens procesados por Ollama", ["operation", "kind"])
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "copiloto_llm_tokens_per_second", "Velocidad de generación de Ollama",
+    ["operation"], buckets=TOKENS_PER_SECOND_BUCKETS)
+LLM_PROMPT_EVAL_SECONDS = REGISTRY.histogram(
+    "copiloto_llm_prompt_eval_seconds", "Tiempo de prefill del prompt en Ollama", ["operation"])
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "copiloto_llm_time_to_first_token_seconds", "Tiempo hasta el primer token en streaming")
+EMBEDDING_CACHE = REGISTRY.counter(
+    "copiloto_embedding_cache_total", "Consultas a la caché de embeddings", ["result"])
+
+
+# ===========================
+# Cronometraje de etapas
+# ===========================
+# Cada hilo lleva una pila de etapas activas: el tiempo de una subetapa se
+# descuenta de la etapa que la contiene, así una etapa que consume un
+# iterador de otra (chunking ← extracción) no cuenta dos veces el mismo tiempo.
+
+_local = threading.local()
+
+
+class _Frame:
+    __slots__ = ("start", "child")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.child = 0.0
+
+
+def _enter() -> _Frame:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    frame = _Frame()
+    stack.append(frame)
+    return frame
+
+
+def _exit(frame: _Frame) -> float:
+    stack = _local.stack
+    elapsed = time.perf_counter() - frame.start
+    # Normalmente es la cima; si un generador se cerró fuera de orden se busca
+    if stack and stack[-1] is frame:
+        stack.pop()
+    elif frame in stack:
+        stack.remove(frame)
+    if stack:
+        stack[-1].child += elapsed
+    return elapsed - frame.child
+
+
+def observe_stage(stage: str, seconds: float, status: str = "ok"):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    STAGE_TOTAL.inc(stage=stage, status=status)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Cronometra un bloque como una observación de la etapa."""
+    frame = _enter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        observe_stage(stage, _exit(frame), status)
+
+
+def timed_iter(iterable: Iterable, stage: str) -> Iterator:
+    """
+    Envuelve un iterador y acumula el tiempo que tarda en producir cada
+    elemento; al agotarse (o cerrarse) registra una sola observación con el
+    total, p. ej. el tiempo de extracción de un documento entero.
+    """
+    iterator = iter(iterable)
+    total = 0.0
+    status = "ok"
+    try:
+        while True:
+            frame = _enter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                total += _exit(frame)
+                break
+            except BaseException:
+                total += _exit(frame)
+                status = "error"
+                raise
+            total += _exit(frame)
+            yield item
+    finally:
+        observe_stage(stage, total, status)
+
+
+# ===========================
+# Ollama
+# ===========================
+
+def record_ollama_generation(info: dict, operation: str):
+    """
+    Registra los contadores que Ollama devuelve al final de una generación
+    (eval_count, prompt_eval_count y duraciones en nanosegundos).
+    """
+    if not info:
+        return
+    eval_count = info.get("eval_count") or 0
+    prompt_count = info.get("prompt_eval_count") or 0
+    LLM_TOKENS.inc(prompt_count, operation=operation, kind="prompt")
+    LLM_TOKENS.inc(eval_count, operation=operation, kind="completion")
+    eval_seconds = (info.get("eval_duration") or 0) / 1e9
+    if eval_count and eval_seconds > 0:
+        LLM_TOKENS_PER_SECOND.observe(eval_count / eval_seconds, operation=operation)
+    if info.get("prompt_eval_duration"):
+        LLM_PROMPT_EVAL_SECONDS.observe(info["prompt_eval_duration"] / 1e9, operation=operation)
+
+
+# ===========================
+# Exportación
+# ===========================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        data = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def write_metrics_file(path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+
+
+def _file_writer_loop(path: str, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics_file(path)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudieron volcar las métricas en {path}: {e}")
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(port: int = METRICS_PORT, path: str = METRICS_FILE,
+                    interval: float = METRICS_FILE_INTERVAL) -> Optional[ThreadingHTTPServer]:
+    """
+    Arranca (una vez por proceso) el endpoint /metrics y/o el volcado periódico
+    a archivo según la configuración. Devuelve el servidor HTTP si se creó.
+    """
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return None
+        _exporters_started = True
+    server = None
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http",
+                             daemon=True).start()
+            logger.info(f"📈 Métricas en http://0.0.0.0:{port}/metrics")
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo abrir el puerto de métricas {port}: {e}")
+            server = None
+    if path:
+        threading.Thread(target=_file_writer_loop, args=(path, interval),
+                         name="metrics-file", daemon=True).start()
+        logger.info(f"📈 Métricas volcadas en {path} cada {interval:.0f}s")
+    return server
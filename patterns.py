@@ -1,5 +1,8 @@
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
 
 def get_document_patterns():
     return {
@@ -59,20 +62,164 @@ def get_document_patterns():
     }
 
 
+# Patrones de la forma \b(palabra|frase|...)\b: se fusionan en un único autómata
+_KEYWORD_PATTERN = re.compile(r'^\\b\(([\w ]+(?:\|[\w ]+)*)\)\\b$')
+_FLAGS = re.IGNORECASE | re.MULTILINE
+
+
+def _trie_regex(words) -> str:
+    """Construye una alternancia en forma de trie (mucho más rápida que a|b|c...)."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node) -> str:
+        branches = [re.escape(ch) + build(child)
+                    for ch, child in sorted(node.items()) if ch != '']
+        if not branches:
+            return ''
+        inner = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + inner + ')?' if '' in node else inner
+
+    return build(trie)
+
+
+class _CompiledPatterns:
+    """
+    Versión precompilada de get_document_patterns(). Los patrones de palabras
+    clave se recorren en una sola pasada; el resto (guiones) se evalúa aparte.
+    Los conteos son idénticos a aplicar re.findall patrón por patrón.
+    """
+
+    def __init__(self, patterns: dict):
+        self.doc_types = list(patterns)
+        self.pattern_types = []
+        self.sources = []
+        self.separate = []
+        keyword_patterns = {}
+
+        for doc_type, pattern_list in patterns.items():
+            for pattern in pattern_list:
+                index = len(self.pattern_types)
+                self.pattern_types.append(doc_type)
+                self.sources.append(pattern)
+                m = _KEYWORD_PATTERN.match(pattern)
+                if m:
+                    for alt in m.group(1).split('|'):
+                        keyword_patterns.setdefault(alt.lower(), set()).add(index)
+                else:
+                    self.separate.append((index, re.compile(pattern, _FLAGS)))
+
+        # Una frase que contiene otra palabra clave en su interior rompería la
+        # equivalencia con findall; esos patrones se evalúan por separado.
+        first_words = {k.split(' ')[0] for k in keyword_patterns}
+        unsafe = set()
+        for keyword, indexes in keyword_patterns.items():
+            if any(w in first_words for w in keyword.split(' ')[1:]):
+                unsafe |= indexes
+        for index in sorted(unsafe):
+            self.separate.append((index, re.compile(self.sources[index], _FLAGS)))
+
+        # Cada palabra clave acredita a los patrones con una alternativa que
+        # coincide en la misma posición (ella misma o un prefijo de palabras)
+        self.credits = {}
+        for keyword in keyword_patterns:
+            credited = set()
+            for other, indexes in keyword_patterns.items():
+                if keyword == other or keyword.startswith(other + ' '):
+                    credited |= indexes
+            self.credits[keyword] = [
+                self.pattern_types[i] for i in sorted(credited - unsafe)]
+        self.keywords = {k: v for k, v in self.credits.items()
+                         if v and not keyword_patterns[k] & unsafe}
+        self.keyword_regex = re.compile(
+            r'\b(?:' + _trie_regex(self.keywords) + r')\b', _FLAGS)
+        self._fallback = [(k, re.compile(re.escape(k), re.IGNORECASE))
+                          for k in self.keywords]
+
+    def _credit_for(self, matched: str):
+        credited = self.keywords.get(matched.lower())
+        if credited is None:
+            # Plegado de mayúsculas que lower() no reproduce (p. ej. 'K' Kelvin)
+            for keyword, rx in self._fallback:
+                if rx.fullmatch(matched):
+                    return self.keywords[keyword]
+            return []
+        return credited
+
+    def score(self, text: str, scores: dict):
+        for matched in self.keyword_regex.findall(text):
+            for doc_type in self._credit_for(matched):
+                scores[doc_type] += 1
+        for index, rx in self.separate:
+            scores[self.pattern_types[index]] += len(rx.findall(text))
+
+
+_compiled: _CompiledPatterns = None
+
+
+def _get_compiled_patterns() -> _CompiledPatterns:
+    global _compiled
+    if _compiled is None:
+        _compiled = _CompiledPatterns(get_document_patterns())
+    return _compiled
+
+
+class DocumentTypeClassifier:
+    """
+    Clasificador incremental: se le pasan páginas con feed() a medida que se
+    extraen y is_decisive() indica cuándo la ventaja del tipo líder es tal que
+    leer más texto no cambiaría el resultado.
+    """
+
+    def __init__(self, min_chars: int = 20000, min_score: int = 50, min_ratio: float = 2.0):
+        self.min_chars = min_chars
+        self.min_score = min_score
+        self.min_ratio = min_ratio
+        self.chars_seen = 0
+        self._patterns = _get_compiled_patterns()
+        self.scores = {doc_type: 0 for doc_type in self._patterns.doc_types}
+
+    def feed(self, text: str):
+        if text:
+            self._patterns.score(text, self.scores)
+            self.chars_seen += len(text)
+
+    def is_decisive(self) -> bool:
+        if self.chars_seen < self.min_chars:
+            return False
+        ranked = sorted(self.scores.values(), reverse=True)
+        best = ranked[0]
+        second = ranked[1] if len(ranked) > 1 else 0
+        return best >= self.min_score and best >= self.min_ratio * max(second, 1)
+
+    def result(self) -> str:
+        if self.scores:
+            best_type = max(self.scores, key=self.scores.get)
+            if self.scores[best_type] > 0:
+                return best_type
+        return 'documento_generico'
+
+
 def detect_document_type(text: str, filename: str) -> str:
-    patterns = get_document_patterns()
-    flags = re.IGNORECASE | re.MULTILINE
-    scores = {}
-
-    for doc_type, pattern_list in patterns.items():
-        score = 0
-        for pattern in pattern_list:
-            score += len(re.findall(pattern, text, flags=flags))
-        scores[doc_type] = score
-
-    if scores:
-        best_type = max(scores, key=scores.get)
-        if scores[best_type] > 0:
-            return best_type
-
-    return 'documento_generico'
+    classifier = DocumentTypeClassifier()
+    classifier.feed(text)
+    return classifier.result()
+
+
+def detect_document_type_from_pages(pages, filename: str, early_exit: bool = True) -> str:
+    """
+    Clasifica página a página; con early_exit deja de leer en cuanto el
+    resultado es decisivo, sin recorrer el resto de un documento largo.
+    """
+    classifier = DocumentTypeClassifier()
+    for i, page in enumerate(pages, 1):
+        classifier.feed(page + "\n" if page else page)
+        if early_exit and classifier.is_decisive():
+            logger.info(
+                f"🏁 Tipo decidido tras {i} páginas ({classifier.chars_seen} caracteres)")
+            break
+    return classifier.result()
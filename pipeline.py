@@ -0,0 +1,270 @@
+# pipeline.py
+import hashlib
+import itertools
+import logging
+import os
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from boilerplate import BOILERPLATE_ENABLED, BoilerplateStripper, config_version
+from chunk_registry import FileChunks
+from extraction import ExtractionReport, ProgressCallback, iter_pages
+from extraction_cache import CacheWriter, get_extraction_cache
+from metrics import stage_timer, timed_iter
+from patterns import DocumentTypeClassifier
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+# Texto máximo que se lee (y se retiene) para decidir el tipo de documento
+CLASSIFY_MAX_CHARS = int(os.getenv("CLASSIFY_MAX_CHARS", "200000"))
+# El splitter en streaming trocea cuando acumula este múltiplo del tamaño de chunk
+STREAM_SPLIT_FACTOR = int(os.getenv("STREAM_SPLIT_FACTOR", "4"))
+
+# ===========================
+# Etapas reutilizables de ingesta: extracción → tipo → chunks → (embed + índice)
+# Las usan la app de Streamlit, el CLI de ingesta por lotes y la API. Todo
+# funciona en streaming: ni los bytes, ni el texto completo, ni la lista de
+# chunks tienen que estar en memoria a la vez.
+# ===========================
+
+
+def fileobj_md5(fh: BinaryIO, block_size: int = 1024 * 1024) -> str:
+    """MD5 de un archivo abierto leído por bloques; deja el cursor al inicio."""
+    md5 = hashlib.md5()
+    fh.seek(0)
+    for block in iter(lambda: fh.read(block_size), b""):
+        md5.update(block)
+    fh.seek(0)
+    return md5.hexdigest()
+
+
+def file_md5(path: str, block_size: int = 1024 * 1024) -> str:
+    """MD5 de un archivo leído por bloques (mismo hash que usa la app)."""
+    with open(path, "rb") as fh:
+        return fileobj_md5(fh, block_size)
+
+
+def classify_leading_pages(pages: Iterator[str], filename: str,
+                           max_chars: int = CLASSIFY_MAX_CHARS) -> Tuple[str, Iterator[str]]:
+    """
+    Decide el tipo de documento con las primeras páginas (hasta que el
+    clasificador es decisivo o se leen max_chars) y devuelve (tipo, páginas),
+    donde el iterador devuelto vuelve a empezar por las páginas ya leídas.
+    """
+    classifier = DocumentTypeClassifier()
+    leading = []
+    with stage_timer("classification"):
+        for page in pages:
+            leading.append(page)
+            classifier.feed(page + "\n" if page else page)
+            if classifier.is_decisive() or classifier.chars_seen >= max_chars:
+                break
+    logger.info(
+        f"🔍 Tipo de {filename} decidido con {len(leading)} páginas "
+        f"({classifier.chars_seen} caracteres)")
+    return classifier.result(), itertools.chain(leading, pages)
+
+
+class DocumentStream:
+    """
+    Documento en curso de ingesta: tipo ya decidido y páginas aún por leer.
+    Al recorrer pages() (o chunks()) se acumula sólo la cabecera del texto
+    para el resumen, se cuentan páginas y caracteres y, si el texto viene del
+    PDF, se va guardando en la caché de extracción (se publica al terminar).
+    on_head(cabecera, tipo) se invoca una vez en cuanto hay head_chars caracteres (o
+    al terminar, si el documento es más corto), sin esperar al resto.
+    Si las páginas pasaron por un BoilerplateStripper, boilerplate_chars dice
+    cuántos caracteres de cabeceras y pies se eliminaron; skipped_pages, qué
+    páginas no se pudieron extraer (entonces el texto no se guarda en caché,
+    para reintentarlo en la siguiente subida).
+    """
+
+    def __init__(self, filename: str, filehash: str, doc_type: str,
+                 pages: Iterator[str], from_cache: bool, head_chars: int = 2000,
+                 cache_writer: Optional[CacheWriter] = None,
+                 on_head: Optional[Callable[[str, str], None]] = None,
+                 boilerplate: Optional[BoilerplateStripper] = None,
+                 extraction: Optional[ExtractionReport] = None):
+        self.filename = filename
+        self.filehash = filehash
+        self.doc_type = doc_type
+        self.from_cache = from_cache
+        self.head_chars = head_chars
+        self.head = ""
+        self.page_count = 0
+        self.char_count = 0
+        self._pages = pages
+        self._cache_writer = cache_writer
+        self._on_head = on_head
+        self._boilerplate = boilerplate
+        self.extraction = extraction
+
+    @property
+    def boilerplate_chars(self) -> int:
+        return self._boilerplate.chars_removed if self._boilerplate is not None else 0
+
+    @property
+    def skipped_pages(self) -> List[int]:
+        return self.extraction.skipped_pages if self.extraction is not None else []
+
+    def _emit_head(self):
+        on_head, self._on_head = self._on_head, None
+        if on_head is not None:
+            on_head(self.head, self.doc_type)
+
+    def pages(self) -> Iterator[str]:
+        completed = False
+        try:
+            for page in self._pages:
+                self.page_count += 1
+                if self._cache_writer is not None:
+                    self._cache_writer.write(page)
+                if page:
+                    self.char_count += len(page) + 1
+                    if len(self.head) < self.head_chars:
+                        self.head = (self.head + page + "\n")[:self.head_chars]
+                        if len(self.head) >= self.head_chars:
+                            self._emit_head()
+                yield page
+            completed = True
+            self._emit_head()
+        finally:
+            if completed and self._cache_writer is not None and not self.skipped_pages:
+                self._cache_writer.commit(self.doc_type)
+                self._cache_writer = None
+            self.close()
+
+    def chunks(self) -> Iterator[str]:
+        return timed_iter(iter_adaptive_chunks(self.pages(), self.doc_type), "chunking")
+
+    def close(self):
+        """Descarta la entrada de caché a medio escribir si no se llegó al final."""
+        if self._cache_writer is not None:
+            self._cache_writer.abort()
+            self._cache_writer = None
+
+
+def open_document(source: Union[bytes, str, BinaryIO], filehash: str, filename: str,
+                  progress_callback: Optional[ProgressCallback] = None,
+                  max_workers: Optional[int] = None,
+                  head_chars: int = 2000,
+                  on_head: Optional[Callable[[str, str], None]] = None,
+                  isolated: Optional[bool] = None) -> DocumentStream:
+    """
+    Abre un PDF para ingesta en streaming. Si el hash está en la caché de
+    extracción las páginas se leen de ella; si no, se extraen de forma
+    incremental, se les quitan las cabeceras y pies repetidos y se van
+    guardando (ya limpias) en la caché, con la configuración de limpieza como
+    versión. 'isolated' se pasa a iter_pages.
+    """
+    cache = get_extraction_cache()
+    cached = cache.open_pages(filehash, config_version())
+    if cached is not None:
+        logger.info(f"♻️ Texto recuperado de caché para {filename}")
+        doc_type, pages = cached
+        return DocumentStream(filename, filehash, doc_type,
+                              timed_iter(pages, "extraction_cache"), True, head_chars,
+                              on_head=on_head)
+
+    logger.info(f"📖 Extrayendo texto de {filename}...")
+    report = ExtractionReport()
+    pages = timed_iter(
+        iter_pages(source, max_workers=max_workers, progress_callback=progress_callback,
+                   report=report, isolated=isolated),
+        "extraction")
+    stripper = None
+    if BOILERPLATE_ENABLED:
+        stripper = BoilerplateStripper()
+        pages = timed_iter(stripper.strip(pages, filename), "boilerplate")
+    doc_type, pages = classify_leading_pages(pages, filename)
+    return DocumentStream(filename, filehash, doc_type, pages, False, head_chars,
+                          cache_writer=cache.writer(filehash, config_version()),
+                          on_head=on_head,
+                          boilerplate=stripper, extraction=report)
+
+
+_SEPARATORS = ["\n\n", "\n", ".", "!", "?", " ", ""]
+
+# (chunk_size, chunk_overlap) por tipo de documento
+_SPLITTER_CONFIG = {
+    'guion_pelicula': (2000, 300),
+    'articulo_academico': (1500, 200),
+    'curriculum_vitae': (800, 100),
+    'brochure_educativo': (800, 100),
+    'brochure_servicios': (800, 100),
+}
+_DEFAULT_SPLITTER_CONFIG = (1200, 200)
+
+
+def chunking_version() -> str:
+    """Configuración de troceado: con otra, los mismos archivos dan otros chunks."""
+    return (f"chunks={sorted(_SPLITTER_CONFIG.items())}:{_DEFAULT_SPLITTER_CONFIG}:"
+            f"{_SEPARATORS}:{STREAM_SPLIT_FACTOR}")
+
+
+def get_adaptive_splitter(doc_type: str) -> RecursiveCharacterTextSplitter:
+    chunk_size, chunk_overlap = _SPLITTER_CONFIG.get(doc_type, _DEFAULT_SPLITTER_CONFIG)
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=_SEPARATORS
+    )
+
+
+def split_adaptive(text: str, doc_type: str) -> List[str]:
+    return get_adaptive_splitter(doc_type).split_text(text)
+
+
+def iter_adaptive_chunks(pages: Iterable[str], doc_type: str) -> Iterator[str]:
+    """
+    Trocea las páginas a medida que llegan. El texto se acumula hasta unas
+    pocas veces el tamaño de chunk; se emiten todos los chunks menos el último,
+    que se conserva como arranque del siguiente tramo para que los cortes entre
+    páginas se decidan con el texto que sigue.
+    """
+    splitter = get_adaptive_splitter(doc_type)
+    chunk_size, _ = _SPLITTER_CONFIG.get(doc_type, _DEFAULT_SPLITTER_CONFIG)
+    flush_at = chunk_size * STREAM_SPLIT_FACTOR
+    buffer = ""
+    for page in pages:
+        if not page:
+            continue
+        buffer += page + "\n"
+        if len(buffer) < flush_at:
+            continue
+        chunks = splitter.split_text(buffer)
+        if len(chunks) < 2:
+            continue
+        yield from chunks[:-1]
+        tail = chunks[-1]
+        position = buffer.rfind(tail)
+        buffer = buffer[position:] if position >= 0 else tail + "\n"
+    if buffer:
+        yield from splitter.split_text(buffer)
+
+
+def create_adaptive_chunks(text: str, doc_type: str, filename: str, filehash: str) -> FileChunks:
+    return FileChunks.from_texts(filehash, filename, doc_type, split_adaptive(text, doc_type))
+
+
+def prepare_file(path: str, filehash: Optional[str] = None) -> dict:
+    """
+    Etapa de CPU de la ingesta para un archivo en disco (se ejecuta en un proceso
+    worker): hash, extracción, tipo de documento y chunking.
+    """
+    filename = os.path.basename(path)
+    filehash = filehash or file_md5(path)
+    # Dentro de un worker la extracción va en serie y en el propio proceso: el
+    # paralelismo es por archivo y un pool anidado impediría cerrar el del CLI
+    document = open_document(path, filehash, filename, max_workers=1, isolated=False)
+    texts = list(document.chunks())
+    return {
+        "path": path,
+        "filename": filename,
+        "filehash": filehash,
+        "doc_type": document.doc_type,
+        "texts": texts,
+        "skipped_pages": document.skipped_pages,
+    }
@@ -1,6 +1,8 @@
 # prompts.py
 from textwrap import dedent
-from typing import List
+from typing import List, Optional
+
+from context_packing import pack_context
 
 
 def build_summary_prompt(text: str, doc_type: str) -> str:
@@ -35,14 +37,11 @@ def build_summary_prompt(text: str, doc_type: str) -> str:
     return dedent(head).strip() + "\n\n" + dedent(tail).strip()
 
 
-def build_chat_prompt(user_query: str, relevant_chunks: List) -> str:
-    """
-    Construye el prompt del chat a partir de la consulta del usuario
-    y una lista de 'relevant_chunks' (Document de LangChain).
-    """
-    head = f"""
-    Eres un asistente experto que responde preguntas sobre documentos PDF. 
-    Usa SOLO la información en el CONTEXTO proporcionado.
+# Instrucciones fijas del chat: siempre son el comienzo exacto del prompt para
+# que Ollama pueda reutilizar el KV de ese prefijo común entre preguntas
+CHAT_PREFIX = dedent("""
+    Eres un asistente experto que responde preguntas sobre documentos PDF.
+    Usa SOLO la información en el CONTEXTO proporcionado en cada pregunta.
 
     Instrucciones específicas:
     - Responde en español de manera clara y estructurada. Si en el documento hay palabras en inglés, debes responder todo en español y traducir las palabras.
@@ -52,25 +51,38 @@ def build_chat_prompt(user_query: str, relevant_chunks: List) -> str:
     - Mantén el contexto y la coherencia en tu respuesta.
     - Sé breve, y no seas redundante.
 
-    Pregunta del usuario: {user_query}
+    A continuación recibirás los chunks relevantes y la pregunta del usuario.
+    """).strip()
 
-    Contexto (chunks relevantes encontrados):
-    """.strip()
 
+def build_chat_turn(user_query: str, relevant_chunks: List,
+                    token_budget: Optional[int] = None) -> str:
+    """
+    Parte variable del prompt del chat: el contexto recuperado y, al final,
+    la pregunta. Los chunks se empaquetan antes (ver context_packing) para
+    que el contexto no pase de token_budget tokens (por defecto
+    CONTEXT_TOKEN_BUDGET).
+    """
     blocks = []
-    for i, chunk in enumerate(relevant_chunks, 1):
-        md = getattr(chunk, "metadata", {}) or {}
-        source = md.get("source", "N/A")
-        cid = md.get("chunk_id", i)
-        content = getattr(chunk, "page_content", "")
+    for i, block in enumerate(pack_context(relevant_chunks, token_budget), 1):
         blocks.append(
-            f"--- CHUNK {i} [Fuente: {source} - Chunk {cid}] ---\n{content}")
+            f"--- CHUNK {i} [Fuente: {block.source} - {block.label}] ---\n{block.content}")
 
-    tail = """
-    --- INSTRUCCIONES FINALES ---
-    Basándote en el contexto anterior, responde la pregunta del usuario de manera clara, estructurada y simple.
+    return (
+        "Contexto (chunks relevantes encontrados):\n\n"
+        + "\n\n".join(blocks)
+        + "\n\n--- PREGUNTA ---\n"
+        + f"Pregunta del usuario: {user_query}\n\n"
+        + "Basándote en el contexto anterior, responde la pregunta del usuario "
+          "de manera clara, estructurada y simple.\n\nRespuesta:"
+    )
 
-    Respuesta:
-    """.strip()
 
-    return head + "\n\n" + "\n\n".join(blocks) + "\n\n" + tail
+def build_chat_prompt(user_query: str, relevant_chunks: List,
+                      token_budget: Optional[int] = None) -> str:
+    """
+    Construye el prompt completo del chat a partir de la consulta del
+    usuario y una lista de 'relevant_chunks' (Document de LangChain):
+    instrucciones fijas, contexto y pregunta, en ese orden.
+    """
+    return CHAT_PREFIX + "\n\n" + build_chat_turn(user_query, relevant_chunks, token_budget)
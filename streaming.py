@@ -0,0 +1,61 @@
+# streaming.py
+import logging
+import time
+from typing import Iterable, Iterator, Optional
+
+from metrics import LLM_TIME_TO_FIRST_TOKEN
+
+logger = logging.getLogger(__name__)
+
+
+class StreamStats:
+    """Métricas de una respuesta generada en streaming."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.end: Optional[float] = None
+        self.tokens = 0
+        self.chars = 0
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.start
+
+    @property
+    def total_time(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def tokens_per_second(self) -> float:
+        if self.first_token_at is None or self.tokens < 2:
+            return 0.0
+        generation_time = (self.end or time.perf_counter()) - self.first_token_at
+        # El primer token incluye el prefill; la velocidad se mide desde él
+        return (self.tokens - 1) / generation_time if generation_time > 0 else 0.0
+
+
+def timed_stream(chunks: Iterable[str], stats: StreamStats) -> Iterator[str]:
+    """
+    Reenvía los fragmentos de texto del LLM tal cual llegan y va registrando
+    el tiempo al primer token y los tokens por segundo en stats.
+    """
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if stats.first_token_at is None:
+                stats.first_token_at = time.perf_counter()
+                LLM_TIME_TO_FIRST_TOKEN.observe(stats.time_to_first_token)
+                logger.info(
+                    f"⚡ Primer token en {stats.time_to_first_token:.2f}s")
+            stats.tokens += 1
+            stats.chars += len(chunk)
+            yield chunk
+    finally:
+        stats.end = time.perf_counter()
+        logger.info(
+            f"✅ Respuesta en streaming: {stats.tokens} tokens en {stats.total_time:.2f}s "
+            f"({stats.tokens_per_second:.1f} tok/s)")
@@ -0,0 +1,66 @@
+# summary_worker.py
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+# Máximo de resúmenes generándose a la vez contra Ollama (compartido por todas las sesiones)
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "2"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=SUMMARY_CONCURRENCY, thread_name_prefix="summary")
+        return _executor
+
+
+def _timed(fn: Callable[..., str], filename: str, *args) -> str:
+    start = time.time()
+    logger.info(f"🤖 Generando resumen de {filename} en segundo plano...")
+    summary = fn(*args)
+    logger.info(
+        f"✅ Resumen de {filename} generado en {time.time() - start:.2f}s")
+    return summary
+
+
+def submit_summary(fn: Callable[..., str], filename: str, *args) -> Future:
+    """Encola la generación de un resumen y devuelve su Future."""
+    return _get_executor().submit(_timed, fn, filename, *args)
+
+
+def collect_finished(summaries: List[dict], futures: Dict[str, Future]) -> int:
+    """
+    Copia en 'summaries' los resultados de los futures ya terminados y los
+    retira de 'futures'. Devuelve cuántos resúmenes siguen pendientes.
+    """
+    by_hash = {item["filehash"]: item for item in summaries}
+    for filehash, future in list(futures.items()):
+        if not future.done():
+            continue
+        futures.pop(filehash)
+        item = by_hash.get(filehash)
+        if item is None:
+            continue
+        if future.cancelled():
+            item["summary"] = "Resumen cancelado."
+        elif future.exception() is not None:
+            e = future.exception()
+            logger.error(f"❌ Error generando resumen: {e}")
+            item["summary"] = f"Error al procesar el resumen: {str(e)}"
+        else:
+            item["summary"] = future.result()
+        item["pending"] = False
+    return len(futures)
@@ -0,0 +1,48 @@
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from answer_cache import SemanticAnswerCache
+
+
+class TestSemanticAnswerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SemanticAnswerCache(threshold=0.95, max_entries=2)
+        self.files = {"h1", "h2"}
+
+    def test_exact_and_near_duplicate_hit(self):
+        self.cache.store([1.0, 0.0, 0.0], self.files, "Cuesta $2,500", ["ctx"])
+        hit = self.cache.lookup([1.0, 0.0, 0.0], self.files)
+        self.assertEqual(hit["answer"], "Cuesta $2,500")
+        self.assertEqual(hit["context"], ["ctx"])
+        near = self.cache.lookup([0.99, 0.05, 0.0], self.files)
+        self.assertIsNotNone(near)
+
+    def test_below_threshold_misses(self):
+        self.cache.store([1.0, 0.0], self.files, "a", [])
+        self.assertIsNone(self.cache.lookup([0.5, 0.5], self.files))
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_different_file_set_misses(self):
+        self.cache.store([1.0, 0.0], self.files, "a", [])
+        self.assertIsNone(self.cache.lookup([1.0, 0.0], {"h1"}))
+
+    def test_lru_eviction(self):
+        self.cache.store([1.0, 0.0, 0.0], self.files, "a", [])
+        self.cache.store([0.0, 1.0, 0.0], self.files, "b", [])
+        self.cache.lookup([1.0, 0.0, 0.0], self.files)
+        self.cache.store([0.0, 0.0, 1.0], self.files, "c", [])
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNotNone(self.cache.lookup([1.0, 0.0, 0.0], self.files))
+        self.assertIsNone(self.cache.lookup([0.0, 1.0, 0.0], self.files))
+
+    def test_invalidate(self):
+        self.cache.store([1.0, 0.0], self.files, "a", [])
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.lookup([1.0, 0.0], self.files))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from api_server import APIServer, CopilotService
+
+
+class FakeDoc:
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+class FakeIndex:
+    def __init__(self):
+        self.calls = []
+        self.chunks = {
+            "h1-0": ("DIPLOMADO EN INTELIGENCIA ARTIFICIAL. Objetivos del curso de seis meses",
+                     {"filehash": "h1", "chunk_id": 0, "doc_type": "brochure_educativo"}),
+            "h1-1": ("Objetivos del curso de seis meses: aprender fundamentos de IA",
+                     {"filehash": "h1", "chunk_id": 1, "doc_type": "brochure_educativo"}),
+        }
+
+    def get(self, ids=None, include=None):
+        found = [i for i in ids if i in self.chunks]
+        return {"ids": found,
+                "documents": [self.chunks[i][0] for i in found],
+                "metadatas": [self.chunks[i][1] for i in found]}
+
+    def similarity_search_by_vector(self, vector, k=5, filter=None):
+        self.calls.append({"k": k, "filter": filter})
+        return [FakeDoc("El diplomado cuesta $2,500",
+                        {"source": "d.pdf", "filehash": "h1", "chunk_id": 0})]
+
+
+class FakeLLM:
+    """Doble de Ollama: devuelve una respuesta fija y guarda los prompts."""
+
+    def __init__(self):
+        self.prompts = []
+        self.operations = []
+
+    def invoke(self, prompt, operation="generate"):
+        self.prompts.append(prompt)
+        self.operations.append(operation)
+        return "Respuesta simulada"
+
+
+class TestAPIServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.index = FakeIndex()
+        self.llm = FakeLLM()
+        ingested = []
+
+        def ingest(file_bytes, filename):
+            ingested.append(filename)
+            return {"filehash": "h1", "doc_type": "brochure_educativo", "chunks": 1}
+
+        self.ingested = ingested
+        service = CopilotService(FakeEmbeddings(), self.index, self.llm, ingest_fn=ingest)
+        self.server = APIServer(service, summary_source=lambda filehash: None, workers=4)
+        self.port = await self.server.start("127.0.0.1", 0)
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def request(self, method, path, body=b"", headers=None, text=False):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        lines = [f"{method} {path} HTTP/1.1", "Host: test", "Connection: close",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+        raw = await reader.read()
+        writer.close()
+        head, _, payload = raw.partition(b"\r\n\r\n")
+        status = int(head.split(b" ")[1])
+        return status, payload.decode("utf-8") if text else json.loads(payload)
+
+    async def test_health(self):
+        self.assertEqual(await self.request("GET", "/health"), (200, {"status": "ok"}))
+
+    async def test_metrics_endpoint_reports_stages(self):
+        body = json.dumps({"question": "¿Cuánto cuesta?", "filehashes": ["h1"]}).encode()
+        await self.request("POST", "/query", body)
+        status, text = await self.request("GET", "/metrics", text=True)
+        self.assertEqual(status, 200)
+        self.assertIn("# TYPE copiloto_stage_seconds histogram", text)
+        self.assertIn('copiloto_stage_seconds_count{stage="retrieval"}', text)
+        self.assertIn('copiloto_stage_total{stage="llm_chat",status="ok"}', text)
+
+    async def test_query_uses_chat_prompt_and_filter(self):
+        body = json.dumps({"question": "¿Cuánto cuesta?", "filehashes": ["h1"]}).encode()
+        status, data = await self.request("POST", "/query", body)
+        self.assertEqual(status, 200)
+        self.assertEqual(data["answer"], "Respuesta simulada")
+        self.assertEqual(data["context"][0]["source"], "d.pdf")
+        self.assertIn("¿Cuánto cuesta?", self.llm.prompts[0])
+        self.assertIn("El diplomado cuesta $2,500", self.llm.prompts[0])
+        self.assertEqual(self.index.calls[0]["filter"], {"filehash": {"$in": ["h1"]}})
+        self.assertEqual(self.llm.operations, ["chat"])
+
+    async def test_query_validates_k_and_filehashes(self):
+        for payload in ({"k": "cinco"}, {"k": 0}, {"k": 2.5}, {"k": True},
+                        {"filehashes": "h1"}, {"filehashes": [1, 2]}):
+            body = json.dumps(dict({"filehashes": ["h1"]}, **payload, question="hola")).encode()
+            self.assertEqual((await self.request("POST", "/query", body))[0], 400, payload)
+        body = json.dumps({"question": "hola", "filehashes": ["h1"], "k": 3}).encode()
+        self.assertEqual((await self.request("POST", "/query", body))[0], 200)
+        self.assertEqual(self.index.calls[-1]["k"], 3)
+
+    async def test_query_requires_documents_or_explicit_whole_index(self):
+        for payload in ({}, {"filehashes": []}, {"filehashes": None}, {"filehashes": [""]},
+                        {"all_documents": "sí"}):
+            body = json.dumps(dict(payload, question="hola")).encode()
+            self.assertEqual((await self.request("POST", "/query", body))[0], 400, payload)
+        self.assertEqual(self.index.calls, [])
+        body = json.dumps({"question": "hola", "all_documents": True}).encode()
+        self.assertEqual((await self.request("POST", "/query", body))[0], 200)
+        self.assertIsNone(self.index.calls[-1]["filter"])
+
+    async def test_bad_types_and_headers_are_client_errors(self):
+        for payload in ({"question": 42, "filehashes": ["h1"]},
+                        {"question": ["hola"], "filehashes": ["h1"]}):
+            status, _ = await self.request("POST", "/query", json.dumps(payload).encode())
+            self.assertEqual(status, 400, payload)
+        for payload in ({"text": 42}, {"text": ""}, {"text": "Diplomado", "doc_type": 3}):
+            status, _ = await self.request("POST", "/summary", json.dumps(payload).encode())
+            self.assertEqual(status, 400, payload)
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"POST /query HTTP/1.1\r\nHost: test\r\nContent-Length: diez\r\n\r\n")
+        await writer.drain()
+        raw = await reader.read()
+        writer.close()
+        self.assertEqual(int(raw.split(b" ")[1]), 400)
+        self.assertEqual(self.llm.prompts, [])
+
+    async def test_summary_from_text(self):
+        body = json.dumps({"text": "Diplomado en IA", "doc_type": "brochure_educativo"}).encode()
+        status, data = await self.request("POST", "/summary", body)
+        self.assertEqual(status, 200)
+        self.assertEqual(data["summary"], "Respuesta simulada")
+        self.assertIn("Diplomado en IA", self.llm.prompts[0])
+        self.assertEqual(self.llm.operations, ["summary"])
+
+    async def test_summary_falls_back_to_indexed_chunks(self):
+        status, data = await self.request("POST", "/summary", json.dumps({"filehash": "h1"}).encode())
+        self.assertEqual(status, 200)
+        self.assertEqual(data["doc_type"], "brochure_educativo")
+        # El solapamiento entre chunks no se repite
+        self.assertEqual(self.llm.prompts[0].count("Objetivos del curso"), 1)
+        self.assertIn("aprender fundamentos de IA", self.llm.prompts[0])
+        status, _ = await self.request("POST", "/summary", json.dumps({"filehash": "nada"}).encode())
+        self.assertEqual(status, 404)
+
+    async def test_ingest(self):
+        status, data = await self.request(
+            "POST", "/ingest", b"%PDF-1.4 ...", {"X-Filename": "d.pdf"})
+        self.assertEqual(status, 200)
+        self.assertEqual(data["filehash"], "h1")
+        self.assertEqual(self.ingested, ["d.pdf"])
+
+    async def test_ingest_not_configured(self):
+        service = CopilotService(FakeEmbeddings(), self.index, self.llm)
+        server = APIServer(service, workers=1)
+        port = await server.start("127.0.0.1", 0)
+        try:
+            self.port, original = port, self.port
+            status, _ = await self.request("POST", "/ingest", b"%PDF-1.4 ...")
+            self.port = original
+        finally:
+            await server.close()
+        self.assertEqual(status, 501)
+
+    async def test_errors(self):
+        self.assertEqual((await self.request("POST", "/query", b"{}"))[0], 400)
+        self.assertEqual((await self.request("POST", "/query", b"no json"))[0], 400)
+        self.assertEqual((await self.request("GET", "/query"))[0], 405)
+        self.assertEqual((await self.request("POST", "/otra", b"{}"))[0], 404)
+
+    async def test_concurrent_queries(self):
+        body = json.dumps({"question": "hola", "filehashes": ["h1"]}).encode()
+        results = await asyncio.gather(*[self.request("POST", "/query", body) for _ in range(20)])
+        self.assertTrue(all(status == 200 for status, _ in results))
+        self.assertEqual(len(self.llm.prompts), 20)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
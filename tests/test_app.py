@@ -1,6 +1,9 @@
-from patterns import detect_document_type, get_document_patterns
+from patterns import (DocumentTypeClassifier, detect_document_type,
+                      detect_document_type_from_pages, get_document_patterns)
 from prompts import build_summary_prompt, build_chat_prompt
 import unittest
+import random
+import re
 import tempfile
 import os
 import sys
@@ -71,6 +74,40 @@ class TestPatterns(unittest.TestCase):
         doc_type = detect_document_type(text, "generico.txt")
         self.assertEqual(doc_type, 'documento_generico')
 
+    def _legacy_scores(self, text):
+        flags = re.IGNORECASE | re.MULTILINE
+        return {
+            doc_type: sum(len(re.findall(p, text, flags=flags)) for p in pattern_list)
+            for doc_type, pattern_list in get_document_patterns().items()
+        }
+
+    def test_classifier_scores_match_findall(self):
+        words = [w for pattern_list in get_document_patterns().values()
+                 for p in pattern_list for w in re.findall(r'[\w ]+', p)]
+        words += ['Curriculum Vitae', 'RESUMEN EJECUTIVO', 'INT.', '(nota)',
+                  'DÍA', '\n', '. ', 'servicioss', 'Plan de estudios']
+        rng = random.Random(42)
+        for _ in range(300):
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(0, 60)))
+            classifier = DocumentTypeClassifier()
+            classifier.feed(text)
+            self.assertEqual(classifier.scores, self._legacy_scores(text), text)
+
+    def test_classifier_early_exit(self):
+        page = "Abstract. Introduction, methodology, results and discussion. References.\n" * 60
+        pages = [page] * 50
+        classifier = DocumentTypeClassifier()
+        consumed = 0
+        for p in pages:
+            classifier.feed(p)
+            consumed += 1
+            if classifier.is_decisive():
+                break
+        self.assertLess(consumed, len(pages))
+        self.assertEqual(classifier.result(), 'articulo_academico')
+        self.assertEqual(
+            detect_document_type_from_pages(pages, "paper.pdf"), 'articulo_academico')
+
 
 class TestPrompts(unittest.TestCase):
 
@@ -0,0 +1,140 @@
+import importlib.util
+import json
+import os
+import re
+import sys
+import unittest
+import urllib.request
+from test_config import setup_test_environment
+
+setup_test_environment()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from bench_suite import compare_results
+from stub_ollama import StubOllama, decode_context
+from synthetic_pdf import make_pdf, synthetic_pages
+
+HAS_REQUESTS = importlib.util.find_spec("requests") is not None
+
+
+class TestSyntheticPDF(unittest.TestCase):
+
+    def test_pages_and_xref(self):
+        pages = synthetic_pages(4, "curriculum_vitae", chars_per_page=1500)
+        self.assertEqual(len(pages), 4)
+        pdf = make_pdf(pages + ["Paréntesis (sueltos) y \\ barras"])
+        self.assertTrue(pdf.startswith(b"%PDF-1.4"))
+        # Cada entrada de la tabla xref apunta al inicio de su objeto
+        xref_start = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+        entries = re.findall(rb"(\d{10}) 00000 n", pdf[xref_start:])
+        for number, offset in enumerate(entries, 1):
+            self.assertTrue(pdf[int(offset):].startswith(b"%d 0 obj" % number))
+        self.assertIn(b"/Count 5", pdf)
+
+
+class TestCompareResults(unittest.TestCase):
+
+    def test_detects_only_significant_regressions(self):
+        baseline = {"a": {"seconds": 1.0}, "b": {"seconds": 1.0},
+                    "c": {"seconds": 0.001}, "d": {"skipped": "x"}}
+        current = {"a": {"seconds": 1.5}, "b": {"seconds": 1.1},
+                   "c": {"seconds": 0.003}, "d": {"seconds": 9.0}, "e": {"seconds": 1.0}}
+        regressions = compare_results(current, baseline, tolerance=0.2)
+        self.assertEqual([r["stage"] for r in regressions], ["a"])
+        self.assertAlmostEqual(regressions[0]["ratio"], 1.5)
+
+
+class TestStubOllama(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubOllama(tokens=5)
+        self.base_url = self.stub.start()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def _post(self, payload: dict):
+        request = urllib.request.Request(
+            self.base_url + "/api/generate", data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"})
+        return urllib.request.urlopen(request, timeout=5)
+
+    def test_non_streaming(self):
+        with self._post({"model": "m", "prompt": "x" * 400, "stream": False}) as resp:
+            data = json.loads(resp.read())
+        self.assertTrue(data["done"])
+        self.assertEqual(data["eval_count"], 5)
+        self.assertEqual(data["prompt_eval_count"], 100)
+
+    def test_streaming(self):
+        with self._post({"model": "m", "prompt": "hola", "options": {"num_predict": 3}}) as resp:
+            lines = [json.loads(line) for line in resp.read().splitlines() if line]
+        self.assertEqual("".join(l["response"] for l in lines), "token0 token1 token2 ")
+        self.assertTrue(lines[-1]["done"])
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_prefill_skips_cached_prefix(self):
+        prefix = "instrucciones fijas " * 20
+        with self._post({"model": "m", "prompt": prefix + "pregunta 1", "stream": False}) as resp:
+            first = json.loads(resp.read())
+        with self._post({"model": "m", "prompt": prefix + "pregunta 2", "stream": False}) as resp:
+            second = json.loads(resp.read())
+        self.assertEqual(first["prompt_eval_count"], len(prefix + "pregunta 1") // 4)
+        self.assertLessEqual(second["prompt_eval_count"], 1)
+
+    def test_context_continues_conversation(self):
+        with self._post({"model": "m", "prompt": "hola", "stream": False}) as resp:
+            context = json.loads(resp.read())["context"]
+        self.assertEqual(decode_context(context), "hola" + "".join(f"token{i} " for i in range(5)))
+        self.stub.reset_cache()
+        with self._post({"model": "m", "prompt": "sigue", "context": context,
+                         "stream": False}) as resp:
+            data = json.loads(resp.read())
+        # Sin KV cargado hay que procesar la conversación anterior y el prompt
+        self.assertEqual(data["prompt_eval_count"], len(decode_context(context) + "sigue") // 4)
+
+
+
+@unittest.skipUnless(HAS_REQUESTS, "requests no está instalado")
+class TestChatSession(unittest.TestCase):
+
+    def setUp(self):
+        from chat_session import ChatSession
+        from llm_client import OllamaClient
+        self.stub = StubOllama(tokens=4)
+        self.client = OllamaClient(base_url=self.stub.start(), model="stub")
+        self.prefix = "INSTRUCCIONES " * 50
+        self.session = ChatSession(self.client, self.prefix)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_prefix_only_in_first_turn(self):
+        list(self.session.stream("Pregunta 1: " + "a" * 200))
+        list(self.session.stream("Pregunta 2: " + "b" * 200))
+        first, second = self.stub.requests
+        self.assertGreater(first["prompt_chars"], len(self.prefix))
+        self.assertEqual(first["context_tokens"], 0)
+        self.assertLess(second["prompt_chars"], len(self.prefix))
+        self.assertGreater(second["context_tokens"], 0)
+        # Solo se procesa el turno nuevo; el resto está en el KV
+        self.assertLessEqual(second["prompt_eval_count"], second["prompt_chars"] // 4 + 1)
+        self.assertEqual(self.session.turns, 2)
+
+    def test_starts_over_when_context_is_full(self):
+        self.session.max_context_tokens = 10
+        self.session.invoke("Pregunta 1")
+        self.assertIsNone(self.session.context)
+        self.session.invoke("Pregunta 2")
+        self.assertTrue(all(r["prompt_chars"] > len(self.prefix) for r in self.stub.requests))
+
+    def test_reset_forgets_conversation(self):
+        self.session.invoke("Pregunta 1")
+        self.session.reset()
+        self.session.invoke("Pregunta 2")
+        self.assertEqual(self.stub.requests[1]["context_tokens"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
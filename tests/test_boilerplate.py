@@ -0,0 +1,95 @@
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from boilerplate import BoilerplateStripper, normalize_line
+
+
+TOPICS = ["álgebra", "cálculo", "estadística", "física", "química", "biología",
+          "historia", "geografía", "filosofía", "música"]
+
+
+def make_pages(count: int, header: bool = True, footer: bool = True):
+    pages = []
+    for n in range(1, count + 1):
+        lines = []
+        if header:
+            lines.append("Universidad Ejemplo — Guía docente 2024")
+        lines.append(f"Contenido sobre {TOPICS[n % len(TOPICS)]}.")
+        lines.append("Párrafo con más texto que no se repite " + "x" * n)
+        if footer:
+            lines.append(f"Página {n} de {count}")
+        pages.append("\n".join(lines))
+    return pages
+
+
+class TestNormalizeLine(unittest.TestCase):
+
+    def test_numbers_case_and_spaces(self):
+        self.assertEqual(normalize_line("  Página 3   de 40 "), normalize_line("página 12 de 40"))
+        self.assertEqual(normalize_line("Página 3 de 40"), "página # de #")
+
+
+class TestBoilerplateStripper(unittest.TestCase):
+
+    def test_strips_headers_and_page_numbers(self):
+        pages = make_pages(8)
+        stripper = BoilerplateStripper(window=5)
+        stripped = list(stripper.strip(pages))
+        self.assertEqual(len(stripped), 8)
+        for n, page in enumerate(stripped, start=1):
+            self.assertNotIn("Guía docente", page)
+            self.assertNotIn("de 8", page)
+            self.assertIn(f"sobre {TOPICS[n % len(TOPICS)]}", page)
+        self.assertEqual(stripper.lines_removed, 16)
+        self.assertEqual(stripper.chars_removed,
+                         sum(len(p) for p in pages) - sum(len(p) for p in stripped))
+
+    def test_short_document_keeps_everything(self):
+        pages = make_pages(2)
+        stripper = BoilerplateStripper(window=5)
+        self.assertEqual(list(stripper.strip(pages)), pages)
+        self.assertEqual(stripper.chars_removed, 0)
+
+    def test_repeated_line_in_body_is_kept(self):
+        body = ["Introducción", "a", "b", "Frase repetida en medio", "c", "d", "Cierre"]
+        pages = ["\n".join([f"Bloque {n}"] + body[1:-1] + [f"Fin {n * 13}x"]) for n in range(6)]
+        stripper = BoilerplateStripper(window=6, edge_lines=2)
+        for page in stripper.strip(pages):
+            self.assertIn("Frase repetida en medio", page)
+
+    def test_pages_after_window_are_stripped_without_buffering(self):
+        stripper = BoilerplateStripper(window=3)
+        pages = iter(make_pages(6))
+        stripped = stripper.strip(pages)
+        for _ in range(4):
+            self.assertNotIn("Guía docente", next(stripped))
+        # Solo se han leído las 3 páginas de la ventana y la cuarta
+        self.assertEqual(len(list(pages)), 2)
+
+    def test_first_pages_are_not_held_for_the_whole_window(self):
+        stripper = BoilerplateStripper(window=12, min_pages=3)
+        pages = iter(make_pages(20))
+        stripped = stripper.strip(pages)
+        first = next(stripped)
+        # Basta con min_pages páginas para limpiar la primera
+        self.assertEqual(len(list(pages)), 17)
+        self.assertNotIn("Guía docente", first)
+        self.assertNotIn("de 20", first)
+
+    def test_window_smaller_than_min_pages_keeps_order(self):
+        pages = make_pages(5)
+        stripped = list(BoilerplateStripper(window=2, min_pages=3).strip(pages))
+        self.assertEqual(stripped, pages)
+
+    def test_empty_pages_pass_through(self):
+        pages = make_pages(4)
+        pages.insert(2, "")
+        stripped = list(BoilerplateStripper(window=10).strip(pages))
+        self.assertEqual(stripped[2], "")
+        self.assertEqual(len(stripped), 5)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,139 @@
+import gc
+import os
+import tempfile
+import time
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from chunk_registry import ChunkRegistry, FileChunks
+from chunk_store import ChunkFile, ChunkFileWriter, sweep_stale_files
+
+
+class TestChunkFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_roundtrip_with_unicode_and_empty(self):
+        texts = ["uno", "", "educación · 2,500 €", "x" * 5000]
+        store = ChunkFile.create(texts, self.tmpdir.name)
+        self.assertEqual([store.read(i) for i in range(len(store))], texts)
+        self.assertEqual(store.char_length(2), len(texts[2]))
+        store.close()
+        self.assertFalse(os.path.exists(store.path))
+
+    def test_empty_store(self):
+        store = ChunkFile.create([], self.tmpdir.name)
+        self.assertEqual(len(store), 0)
+        store.close()
+
+    def test_incremental_writer(self):
+        writer = ChunkFileWriter(self.tmpdir.name)
+        self.assertEqual(writer.append("primero"), 0)
+        self.assertEqual(writer.append("segundo"), 1)
+        store = writer.finish()
+        self.assertEqual(store.read(1), "segundo")
+        store.close()
+
+    def test_aborted_writer_removes_file(self):
+        writer = ChunkFileWriter(self.tmpdir.name)
+        writer.append("descartado")
+        writer.abort()
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_unreferenced_store_removes_file(self):
+        store = ChunkFile.create(["sesión abandonada"], self.tmpdir.name)
+        path = store.path
+        store.read(0)
+        del store
+        gc.collect()
+        self.assertFalse(os.path.exists(path))
+
+    def test_close_without_delete_keeps_file(self):
+        store = ChunkFile.create(["se conserva"], self.tmpdir.name)
+        path = store.path
+        store.close(delete=False)
+        del store
+        gc.collect()
+        self.assertTrue(os.path.exists(path))
+
+    def test_sweep_removes_orphaned_and_old_files(self):
+        store = ChunkFile.create(["vivo"], self.tmpdir.name)
+        dead_pid = 2 ** 22 + 12345  # por encima de pid_max: ningún proceso lo tiene
+        orphan = os.path.join(self.tmpdir.name, f"{dead_pid}-abc.chunks")
+        legacy_old = os.path.join(self.tmpdir.name, "0123abcd.chunks")
+        legacy_new = os.path.join(self.tmpdir.name, "4567abcd.chunks")
+        for path in (orphan, legacy_old, legacy_new):
+            open(path, "wb").close()
+        old = time.time() - 72 * 3600
+        os.utime(legacy_old, (old, old))
+
+        self.assertEqual(sweep_stale_files(self.tmpdir.name, max_age_hours=48), 2)
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)),
+                         sorted([os.path.basename(store.path), "4567abcd.chunks"]))
+        store.close()
+
+
+class TestChunkRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.registry = ChunkRegistry()
+        self.registry.add(FileChunks.from_texts(
+            "h1", "a.pdf", "brochure_educativo", ["uno", "dos"], self.tmpdir.name))
+        self.registry.add(FileChunks.from_texts(
+            "h2", "b.pdf", "documento_generico", ["tres"], self.tmpdir.name))
+
+    def tearDown(self):
+        self.registry.clear()
+        self.tmpdir.cleanup()
+
+    def test_len_and_bool(self):
+        self.assertEqual(len(self.registry), 3)
+        self.assertTrue(self.registry)
+        self.assertFalse(ChunkRegistry())
+
+    def test_ids_are_stable(self):
+        self.assertEqual(self.registry.get("h1").ids(), ["h1-0", "h1-1"])
+
+    def test_metadata_is_shared_per_file(self):
+        md = self.registry.get("h1").metadata(1)
+        self.assertEqual(md, {
+            'source': "a.pdf", 'filehash': "h1", 'doc_type': "brochure_educativo",
+            'chunk_id': 1, 'chunk_size': 3, 'total_chunks': 2
+        })
+
+    def test_remove_file_deletes_store(self):
+        path = self.registry.get("h1").store.path
+        removed = self.registry.remove_file("h1")
+        self.assertEqual(removed.source, "a.pdf")
+        self.assertNotIn("h1", self.registry)
+        self.assertEqual(len(self.registry), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(self.registry.remove_file("h1"))
+
+    def test_resolve_returns_lazy_view(self):
+        class Doc:
+            page_content = "texto copiado por el vectorstore"
+            metadata = {"filehash": "h1", "chunk_id": 1}
+
+        view = self.registry.resolve(Doc())
+        self.assertEqual(view.page_content, "dos")
+        self.assertEqual(view.metadata["source"], "a.pdf")
+
+        unknown = Doc()
+        unknown.metadata = {"filehash": "otro", "chunk_id": 0}
+        self.assertIs(self.registry.resolve(unknown), unknown)
+
+    def test_records_are_slotted(self):
+        with self.assertRaises(AttributeError):
+            self.registry.get("h2").extra = 1
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
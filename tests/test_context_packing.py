@@ -0,0 +1,105 @@
+import unittest
+from types import SimpleNamespace
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from context_packing import (drop_near_duplicates, estimate_tokens, merge_adjacent,
+                             pack_context, strip_overlap)
+from prompts import CHAT_PREFIX, build_chat_prompt, build_chat_turn
+
+
+def chunk(content, chunk_id=None, filehash="abc", source="doc.pdf"):
+    metadata = {"source": source, "filehash": filehash}
+    if chunk_id is not None:
+        metadata["chunk_id"] = chunk_id
+    return SimpleNamespace(page_content=content, metadata=metadata)
+
+
+SENTENCES = [f"La frase número {i} describe un requisito distinto del programa." for i in range(12)]
+
+
+class TestStripOverlap(unittest.TestCase):
+
+    def test_removes_shared_span(self):
+        previous = " ".join(SENTENCES[:4])
+        following = " ".join(SENTENCES[3:6])
+        self.assertEqual(strip_overlap(previous, following), " " + " ".join(SENTENCES[4:6]))
+
+    def test_keeps_text_without_overlap(self):
+        self.assertEqual(strip_overlap(SENTENCES[0], SENTENCES[5]), SENTENCES[5])
+
+
+class TestMergeAdjacent(unittest.TestCase):
+
+    def test_merges_consecutive_chunks_of_same_file(self):
+        chunks = [
+            chunk(" ".join(SENTENCES[3:6]), 1),
+            chunk(" ".join(SENTENCES[:4]), 0),
+            chunk("Otro archivo con texto propio y suficiente.", 1, filehash="zzz"),
+        ]
+        blocks = merge_adjacent(chunks)
+        self.assertEqual(len(blocks), 2)
+        self.assertEqual(blocks[0].chunk_ids, [0, 1])
+        self.assertEqual(blocks[0].content, " ".join(SENTENCES[:6]))
+        self.assertEqual(blocks[0].rank, 0)
+        self.assertEqual(blocks[0].label, "Chunks 0-1")
+
+    def test_non_adjacent_chunks_stay_apart(self):
+        blocks = merge_adjacent([chunk(SENTENCES[0], 0), chunk(SENTENCES[5], 5)])
+        self.assertEqual([b.chunk_ids for b in blocks], [[0], [5]])
+
+    def test_chunks_without_id_are_kept(self):
+        blocks = merge_adjacent([chunk("uno"), chunk("dos")])
+        self.assertEqual([b.content for b in blocks], ["uno", "dos"])
+
+
+class TestPackContext(unittest.TestCase):
+
+    def test_drops_near_duplicates_from_other_files(self):
+        text = " ".join(SENTENCES[:6])
+        blocks = merge_adjacent([chunk(text, 0), chunk(text + " Fin.", 3, filehash="copia")])
+        kept = drop_near_duplicates(blocks)
+        self.assertEqual(len(kept), 1)
+        self.assertEqual(kept[0].filehash, "abc")
+
+    def test_respects_token_budget_in_relevance_order(self):
+        chunks = [chunk(SENTENCES[i] * 3, i * 2, filehash=f"f{i}") for i in range(5)]
+        budget = estimate_tokens(SENTENCES[0] * 3) * 2
+        with self.assertLogs("context_packing", level="WARNING") as logs:
+            packed = pack_context(chunks, token_budget=budget)
+        self.assertEqual([b.filehash for b in packed], ["f0", "f1"])
+        self.assertLessEqual(sum(b.tokens for b in packed), budget)
+        self.assertIn("3 de 5 bloques", logs.output[0])
+
+    def test_default_budget_keeps_the_five_retrieved_chunks(self):
+        # Cinco chunks del tamaño más grande del splitter caben en la ventana
+        chunks = [chunk(f"{SENTENCES[i]} " * 32, i * 2, filehash=f"f{i}") for i in range(5)]
+        packed = pack_context(chunks)
+        self.assertEqual([b.filehash for b in packed], [f"f{i}" for i in range(5)])
+
+    def test_truncates_first_block_when_it_does_not_fit(self):
+        packed = pack_context([chunk("x" * 1000, 0)], token_budget=10)
+        self.assertEqual(len(packed), 1)
+        self.assertEqual(len(packed[0].content), 40)
+
+    def test_prompt_is_smaller_than_plain_concatenation(self):
+        chunks = [chunk(" ".join(SENTENCES[i * 3:i * 3 + 4]), i) for i in range(3)]
+        chunks.append(chunk(chunks[0].page_content, 0, filehash="copia"))
+        prompt = build_chat_prompt("¿Requisitos?", chunks, token_budget=2000)
+        self.assertEqual(prompt.count("--- CHUNK"), 1)
+        self.assertIn("Chunks 0-2", prompt)
+        for sentence in SENTENCES[:10]:
+            self.assertEqual(prompt.count(sentence), 1)
+
+    def test_prompt_starts_with_fixed_prefix_and_ends_with_question(self):
+        first = build_chat_prompt("¿Primera?", [chunk(SENTENCES[0], 0)])
+        second = build_chat_prompt("¿Segunda?", [chunk(SENTENCES[5], 5)])
+        self.assertTrue(first.startswith(CHAT_PREFIX))
+        self.assertTrue(second.startswith(CHAT_PREFIX))
+        self.assertGreater(first.index("¿Primera?"), first.index(SENTENCES[0]))
+        self.assertNotIn("¿Primera?", build_chat_turn("¿Segunda?", []))
+
+
+if __name__ == "__main__":
+    unittest.main()
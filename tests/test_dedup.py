@@ -0,0 +1,134 @@
+import importlib.util
+import random
+import tempfile
+import unittest
+from unittest import mock
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from dedup import NearDuplicateIndex, hamming, simhash
+
+HAS_DEPS = all(importlib.util.find_spec(m) is not None for m in ("numpy", "langchain"))
+
+WORDS = ("datos modelo curso horas créditos módulo contrato cliente servicio escena "
+         "personaje guion análisis método resultado tabla figura proyecto equipo").split()
+
+
+def paragraph(seed: int, words: int = 80) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+DISCLAIMER = ("Este documento es confidencial y está dirigido exclusivamente a su destinatario. "
+              "Si lo ha recibido por error, notifíquelo al remitente y elimínelo. Queda prohibida "
+              "su reproducción total o parcial sin autorización expresa de la institución.")
+
+
+class TestSimHash(unittest.TestCase):
+
+    def test_identical_and_near_identical_texts_are_close(self):
+        self.assertEqual(simhash(DISCLAIMER), simhash(DISCLAIMER))
+        variant = DISCLAIMER.replace("institución", "universidad")
+        self.assertLessEqual(hamming(simhash(DISCLAIMER), simhash(variant)), 12)
+
+    def test_different_texts_are_far(self):
+        self.assertGreater(hamming(simhash(paragraph(1)), simhash(paragraph(2))), 10)
+
+    def test_case_and_punctuation_do_not_matter(self):
+        self.assertEqual(simhash(DISCLAIMER), simhash(DISCLAIMER.upper().replace(",", "")))
+
+
+class TestNearDuplicateIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = NearDuplicateIndex(max_distance=6, min_chars=50)
+
+    def test_detects_duplicate_in_other_file(self):
+        self.assertIsNone(self.index.check(DISCLAIMER, "a", 0))
+        self.assertIsNone(self.index.check(paragraph(1), "a", 1))
+        self.assertEqual(self.index.check(DISCLAIMER, "b", 4), ("a", 0))
+        stats = self.index.stats()
+        self.assertEqual(stats["duplicates"], 1)
+        self.assertEqual(stats["chars_skipped"], len(DISCLAIMER))
+
+    def test_detects_near_duplicate_with_edited_word(self):
+        text = paragraph(3, 150)
+        words = text.split()
+        words[70] = "distinto"
+        self.index.check(text, "a", 0)
+        self.assertEqual(self.index.check(" ".join(words), "b", 0), ("a", 0))
+
+    def test_duplicate_within_file_points_to_earlier_chunk(self):
+        self.index.check(DISCLAIMER, "a", 0)
+        self.assertEqual(self.index.check(DISCLAIMER, "a", 7), ("a", 0))
+
+    def test_reindexing_a_file_does_not_match_itself(self):
+        self.index.check(DISCLAIMER, "a", 3)
+        self.assertIsNone(self.index.check(DISCLAIMER, "a", 3))
+
+    def test_forget_removes_file(self):
+        self.index.check(DISCLAIMER, "a", 0)
+        self.index.forget("a")
+        self.assertIsNone(self.index.check(DISCLAIMER, "b", 0))
+
+    def test_short_chunks_are_not_deduplicated(self):
+        self.index.check("Contacto", "a", 0)
+        self.assertIsNone(self.index.check("Contacto", "b", 0))
+
+    def test_distinct_chunks_are_unique(self):
+        for i in range(200):
+            self.assertIsNone(self.index.check(paragraph(i), "a", i))
+        self.assertEqual(self.index.stats()["duplicates"], 0)
+
+    def test_max_entries_forgets_oldest_files(self):
+        index = NearDuplicateIndex(max_distance=6, min_chars=50, max_entries=10)
+        for f in range(4):
+            for i in range(4):
+                index.check(paragraph(100 * f + i), f"f{f}", i)
+        self.assertLessEqual(index.stats()["entries"], 10)
+        # El archivo más antiguo se olvidó; el último sigue detectándose
+        self.assertIsNone(index.check(paragraph(0), "otro", 0))
+        self.assertEqual(index.check(paragraph(302), "otro2", 0), ("f3", 2))
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(t)), float(t.count("e")) + 1.0, 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@unittest.skipUnless(HAS_DEPS, "numpy o langchain no están instalados")
+class TestIndexChunksDedup(unittest.TestCase):
+
+    def test_cross_file_duplicate_reuses_indexed_vector(self):
+        import vector_index
+        from flat_index import FlatIndex
+        embeddings = CountingEmbeddings()
+        index = FlatIndex(embeddings)
+        other = paragraph(9)
+        dedup = NearDuplicateIndex(max_distance=6, min_chars=50)
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(vector_index, "get_dedup_index", lambda: dedup):
+            vector_index.index_chunks(index, "a", "a.pdf", "t", [DISCLAIMER, other],
+                                      directory=tmp)[0].close()
+            vector_index.index_chunks(index, "b", "b.pdf", "t", [paragraph(5), DISCLAIMER],
+                                      directory=tmp)[0].close()
+        # El duplicado no pasó por el modelo y se indexó con el vector del canónico
+        self.assertEqual(embeddings.texts.count(DISCLAIMER), 1)
+        found = index.get(ids=["a-0", "b-1"], include=["metadatas", "embeddings"])
+        for x, y in zip(*found["embeddings"]):
+            self.assertAlmostEqual(x, y, places=5)
+        self.assertEqual(found["metadatas"][1]["duplicate_of"], "a-0")
+        self.assertTrue(found["metadatas"][1]["last_chunk"])
+        self.assertTrue(vector_index.is_file_indexed(index, "b"))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
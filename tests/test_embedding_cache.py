@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from embedding_cache import (CachedEmbeddings, EmbeddingCache, embedding_key, pack_vector,
+                             stats_delta, unpack_vector)
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 0.5, -1.0] for t in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 0.5, -1.0]
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = EmbeddingCache(
+            os.path.join(self.tmpdir.name, "emb.sqlite"), max_entries=100)
+        self.base = FakeEmbeddings()
+        self.emb = CachedEmbeddings(self.base, "modelo", self.cache)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_only_misses_reach_the_model(self):
+        first = self.emb.embed_documents(["uno", "dos", "uno"])
+        self.assertEqual(self.base.calls, [["uno", "dos"]])
+        second = self.emb.embed_documents(["dos", "tres"])
+        self.assertEqual(self.base.calls[-1], ["tres"])
+        self.assertEqual(first[1], second[0])
+        self.assertEqual(self.emb.stats()["misses"], 3)
+        self.assertEqual(self.emb.stats()["hits"], 2)
+
+    def test_stats_delta_covers_only_one_file(self):
+        self.emb.embed_documents(["uno", "dos"])
+        before = self.emb.stats()
+        self.emb.embed_documents(["uno", "tres", "cuatro", "dos"])
+        self.assertEqual(stats_delta(before, self.emb.stats()),
+                         {"hits": 2, "misses": 2, "hit_rate": 0.5})
+        self.assertEqual(stats_delta(before, before)["hit_rate"], 0.0)
+
+    def test_key_depends_on_model(self):
+        self.assertNotEqual(embedding_key("a", "texto"), embedding_key("b", "texto"))
+
+    def test_query_is_cached(self):
+        v1 = self.emb.embed_query("pregunta")
+        v2 = self.emb.embed_query("pregunta")
+        self.assertEqual(v1, v2)
+        self.assertEqual(len(self.base.calls), 1)
+
+    def test_bounded_size_evicts_least_recent(self):
+        self.cache.max_entries = 3
+        self.emb.embed_documents(["a", "b", "c"])
+        self.emb.embed_documents(["a"])
+        self.emb.embed_documents(["d"])
+        self.assertEqual(len(self.cache), 3)
+        self.assertIn(embedding_key("modelo", "a"),
+                      self.cache.get_many([embedding_key("modelo", "a")]))
+
+
+    def test_float16_storage_halves_blob_size(self):
+        path = os.path.join(self.tmpdir.name, "emb16.sqlite")
+        cache16 = EmbeddingCache(path, max_entries=100, dtype="float16")
+        try:
+            vector = [0.5, -1.25, 3.0, 0.1]
+            cache16.put_many({"k": vector})
+            stored = cache16.get_many(["k"])["k"]
+            self.assertEqual(stored[:3], [0.5, -1.25, 3.0])
+            self.assertAlmostEqual(stored[3], 0.1, places=3)
+            self.assertEqual(len(pack_vector(vector, "float16")),
+                             len(pack_vector(vector, "float32")) // 2)
+        finally:
+            cache16.close()
+
+    def test_vector_packing_round_trip(self):
+        vector = [1.0, -2.5, 0.25]
+        for dtype in ("float32", "float16"):
+            self.assertEqual(unpack_vector(pack_vector(vector, dtype), dtype), vector)
+
+    def test_invalid_dtype(self):
+        with self.assertRaises(ValueError):
+            EmbeddingCache(os.path.join(self.tmpdir.name, "x.sqlite"), 10, dtype="int8")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
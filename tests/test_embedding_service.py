@@ -0,0 +1,79 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+import embedding_service
+from embedding_cache import EmbeddingCache
+
+
+class FakeBackend:
+    """Sustituye al modelo real: cuenta cargas y llamadas."""
+
+    instances = []
+
+    def __init__(self, model_name):
+        self.name = model_name
+        self.queries = []
+        FakeBackend.instances.append(self)
+
+    def embed_documents(self, texts):
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 1.0]
+
+
+class TestSharedEmbeddings(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = EmbeddingCache(os.path.join(self.tmpdir.name, "emb.sqlite"),
+                                    max_entries=100)
+        FakeBackend.instances = []
+        patches = [
+            patch.object(embedding_service, "SentenceTransformerBackend", FakeBackend),
+            patch.object(embedding_service, "get_embedding_cache", lambda: self.cache),
+            patch.object(embedding_service, "_shared", None),
+            patch.object(embedding_service, "_warmup_thread", None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_model_is_loaded_once_for_concurrent_sessions(self):
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(embedding_service.get_shared_embeddings()))
+            for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(FakeBackend.instances), 1)
+        self.assertEqual(len({id(r) for r in results}), 1)
+        self.assertIs(embedding_service.get_shared_embeddings(), results[0])
+
+    def test_warm_up_runs_once_and_is_reused(self):
+        for _ in range(3):
+            embedding_service.warm_up_async()
+        embedding_service._warmup_thread.join(timeout=10)
+        # Las sesiones que llegan después reciben el modelo ya precargado
+        embedding_service.warm_up_async()
+        shared = embedding_service.get_shared_embeddings()
+        self.assertEqual(len(FakeBackend.instances), 1)
+        self.assertEqual(FakeBackend.instances[0].queries, ["warm up"])
+        self.assertEqual(shared.embed_query("pregunta"), [8.0, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
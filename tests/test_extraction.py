@@ -0,0 +1,113 @@
+import importlib.util
+import os
+import sys
+import unittest
+from unittest import mock
+from test_config import setup_test_environment
+
+setup_test_environment()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from synthetic_pdf import make_pdf, synthetic_pages
+
+HAS_PYPDF2 = importlib.util.find_spec("PyPDF2") is not None
+
+
+@unittest.skipUnless(HAS_PYPDF2, "PyPDF2 no está instalado")
+class TestGuardedExtraction(unittest.TestCase):
+
+    def test_page_timeout(self):
+        from extraction import _extract_guarded
+
+        def spin(index):
+            while True:
+                pass
+
+        self.assertEqual(_extract_guarded(spin, 0, 0.05), ("", "timeout"))
+
+    def test_memory_and_errors_are_reported(self):
+        from extraction import _extract_guarded
+
+        def boom(index):
+            raise ValueError("xref rota")
+
+        def huge(index):
+            raise MemoryError()
+
+        self.assertEqual(_extract_guarded(boom, 3, 1), ("", "error"))
+        self.assertEqual(_extract_guarded(huge, 3, 1), ("", "memory"))
+        self.assertEqual(_extract_guarded(str, 3, 1), ("3", None))
+
+    def test_report_numbers_pages_from_one(self):
+        from extraction import ExtractionReport
+        report = ExtractionReport()
+        report.skip(0, "timeout")
+        report.skip(4, "error")
+        self.assertEqual(report.skipped_pages, [1, 5])
+
+
+@unittest.skipUnless(HAS_PYPDF2, "PyPDF2 no está instalado")
+class TestIterPages(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pages = synthetic_pages(20, "curriculum_vitae", chars_per_page=800)
+        cls.pdf = make_pdf(cls.pages)
+
+    def test_isolated_matches_in_process(self):
+        from extraction import ExtractionReport, extract_pages
+        report = ExtractionReport()
+        isolated = extract_pages(self.pdf, max_workers=2, report=report, isolated=True)
+        self.assertEqual(isolated, extract_pages(self.pdf, max_workers=1, isolated=False))
+        self.assertEqual(report.total_pages, 20)
+        self.assertEqual(report.skipped, [])
+
+    def test_max_workers_sets_pool_size(self):
+        import extraction
+        from extraction import extract_pages
+        extract_pages(self.pdf, max_workers=2, isolated=True)
+        extract_pages(self.pdf, max_workers=3, isolated=True)
+        pools = dict(extraction._executors)
+        self.assertEqual({size: pool._max_workers for size, pool in pools.items()},
+                         {2: 2, 3: 3})
+        # Otro documento con el mismo tamaño reutiliza el pool
+        extract_pages(self.pdf, max_workers=2, isolated=True)
+        self.assertIs(extraction._executors[2], pools[2])
+
+    def test_slow_consumer_does_not_spend_the_deadline(self):
+        import time
+        import extraction
+        from extraction import ExtractionReport, iter_pages
+        expected = extraction.extract_pages(self.pdf, max_workers=2, isolated=True)
+        # Pool (lotes de 1 página, pocos en vuelo) y extracción en serie
+        for max_workers, isolated in ((2, True), (1, False)):
+            report = ExtractionReport()
+            with mock.patch.object(extraction, "PDF_DOCUMENT_TIMEOUT", 0.5), \
+                    mock.patch.object(extraction, "PDF_EXTRACT_BATCH_PAGES", 1):
+                pages = []
+                # 20 páginas x 0.05 s de trocear/embeber: el doble del plazo
+                for page in iter_pages(self.pdf, max_workers=max_workers, report=report,
+                                       isolated=isolated):
+                    pages.append(page)
+                    time.sleep(0.05)
+            self.assertEqual(report.skipped, [])
+            self.assertEqual(pages, expected)
+
+    def test_document_deadline_skips_remaining_pages(self):
+        import extraction
+        from extraction import ExtractionReport, extract_pages
+        report = ExtractionReport()
+        with mock.patch.object(extraction, "PDF_DOCUMENT_TIMEOUT", 1e-9):
+            pages = extract_pages(self.pdf, max_workers=1, report=report, isolated=False)
+        self.assertEqual(pages, [""] * 20)
+        self.assertEqual(report.skipped_pages, list(range(1, 21)))
+        self.assertEqual({reason for _, reason in report.skipped}, {"deadline"})
+
+    @classmethod
+    def tearDownClass(cls):
+        from extraction import shutdown_executor
+        shutdown_executor()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
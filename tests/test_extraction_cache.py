@@ -0,0 +1,89 @@
+import os
+import tempfile
+import time
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from extraction_cache import ExtractionCache
+
+
+class TestExtractionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ExtractionCache(self.tmpdir.name, max_bytes=10 * 1024 * 1024)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_miss_returns_none(self):
+        self.assertIsNone(self.cache.get("no-existe"))
+
+    def test_put_and_get_roundtrip(self):
+        pages = ["Página uno", "", "Página tres con acentos: educación"]
+        self.cache.put("abc123", pages, "brochure_educativo")
+        entry = self.cache.get("abc123")
+        self.assertEqual(entry["pages"], pages)
+        self.assertEqual(entry["doc_type"], "brochure_educativo")
+
+    def test_other_version_is_a_miss(self):
+        self.cache.put("abc123", ["limpio con v1"], "documento_generico", version="v1")
+        self.assertIsNone(self.cache.get("abc123", version="v2"))
+        self.assertIsNone(self.cache.get("abc123"))
+        self.cache.put("abc123", ["limpio con v2"], "documento_generico", version="v2")
+        self.assertEqual(self.cache.get("abc123", version="v2")["pages"], ["limpio con v2"])
+
+    def test_persists_across_instances(self):
+        self.cache.put("abc123", ["texto"], "documento_generico")
+        other = ExtractionCache(self.tmpdir.name, max_bytes=10 * 1024 * 1024)
+        self.assertEqual(other.get("abc123")["pages"], ["texto"])
+
+    def test_lru_eviction(self):
+        pages = [os.urandom(2000).hex()]
+        self.cache.put("viejo", pages, "documento_generico")
+        self.cache.put("usado", pages, "documento_generico")
+        entry_size = self.cache.size_bytes() // 2
+        past = time.time() - 100
+        os.utime(self.cache._path("viejo"), (past, past))
+        os.utime(self.cache._path("usado"), (past - 10, past - 10))
+        # Leer "usado" lo marca como reciente
+        self.cache.get("usado")
+
+        self.cache.max_bytes = int(entry_size * 2.5)
+        self.cache.put("nuevo", pages, "documento_generico")
+
+        self.assertIsNone(self.cache.get("viejo"))
+        self.assertIsNotNone(self.cache.get("usado"))
+        self.assertIsNotNone(self.cache.get("nuevo"))
+
+    def test_streaming_writer_and_reader(self):
+        writer = self.cache.writer("stream")
+        for page in ["uno\ncon salto", "", "tres"]:
+            writer.write(page)
+        # Hasta el commit la entrada no es visible
+        self.assertIsNone(self.cache.get("stream"))
+        writer.commit("articulo_academico")
+
+        doc_type, pages = self.cache.open_pages("stream")
+        self.assertEqual(doc_type, "articulo_academico")
+        self.assertEqual(next(pages), "uno\ncon salto")
+        self.assertEqual(list(pages), ["", "tres"])
+
+    def test_aborted_writer_leaves_no_files(self):
+        writer = self.cache.writer("abortado")
+        writer.write("página")
+        writer.abort()
+        self.assertIsNone(self.cache.get("abortado"))
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_corrupt_entry_is_discarded(self):
+        with open(self.cache._path("roto"), "wb") as fh:
+            fh.write(b"no es gzip")
+        self.assertIsNone(self.cache.get("roto"))
+        self.assertFalse(os.path.exists(self.cache._path("roto")))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
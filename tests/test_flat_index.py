@@ -0,0 +1,161 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+HAS_DEPS = all(importlib.util.find_spec(m) is not None for m in ("numpy", "langchain"))
+
+
+class FakeEmbeddings:
+    """Vector determinista por palabra clave: basta para comprobar el ranking."""
+
+    WORDS = ["python", "datos", "guion", "escena", "salario", "contrato"]
+
+    def _vector(self, text):
+        lower = text.lower()
+        return [float(lower.count(w)) + 0.01 for w in self.WORDS]
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@unittest.skipUnless(HAS_DEPS, "numpy o langchain no están instalados")
+class TestFlatIndex(unittest.TestCase):
+
+    def setUp(self):
+        from flat_index import FlatIndex
+        from langchain.schema import Document
+        self.Document = Document
+        self.index = FlatIndex(FakeEmbeddings())
+        self._add("f1", ["python y datos", "escena del guion", "python python"])
+        self._add("f2", ["salario y contrato", "datos del contrato"])
+
+    def _add(self, filehash, texts):
+        docs = [self.Document(page_content=t, metadata={"filehash": filehash, "chunk_id": i})
+                for i, t in enumerate(texts)]
+        self.index.add_documents(docs, ids=[f"{filehash}-{i}" for i in range(len(texts))])
+
+    def test_top_k_by_cosine(self):
+        results = self.index.similarity_search("python", k=2)
+        self.assertEqual([d.page_content for d in results], ["python python", "python y datos"])
+
+    def test_filter_by_session_files(self):
+        results = self.index.similarity_search(
+            "datos", k=5, filter={"filehash": {"$in": ["f2"]}})
+        self.assertEqual({d.metadata["filehash"] for d in results}, {"f2"})
+        self.assertEqual(results[0].page_content, "datos del contrato")
+
+    def test_get_with_and_filter(self):
+        self.index.add_documents(
+            [self.Document(page_content="fin", metadata={"filehash": "f3", "last_chunk": True})],
+            ids=["f3-0"])
+        found = self.index.get(where={"$and": [{"filehash": "f3"}, {"last_chunk": True}]},
+                               limit=1, include=[])
+        self.assertEqual(found, {"ids": ["f3-0"]})
+        self.assertEqual(self.index.get(where={"filehash": "nada"}, include=[])["ids"], [])
+
+    def test_upsert_keeps_one_row_per_id(self):
+        self._add("f1", ["contrato nuevo"])
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index.get(ids=["f1-0"])["documents"], ["contrato nuevo"])
+
+    def test_delete_file(self):
+        self.assertEqual(self.index.delete_file("f1"), 3)
+        self.assertEqual(len(self.index), 2)
+        results = self.index.similarity_search("python", k=5)
+        self.assertTrue(all(d.metadata["filehash"] == "f2" for d in results))
+        self.assertEqual(self.index.delete_file("f1"), 0)
+
+    def test_save_and_load_with_memmap(self):
+        from flat_index import FlatIndex
+        with tempfile.TemporaryDirectory() as tmp:
+            self.index.save(tmp)
+            loaded = FlatIndex(FakeEmbeddings(), directory=tmp)
+            self.assertEqual(len(loaded), 5)
+            self.assertEqual(
+                [d.page_content for d in loaded.similarity_search("contrato", k=1)],
+                ["salario y contrato"])
+            # La matriz abierta con memmap se copia al escribir
+            loaded.add_documents([self.Document(page_content="escena", metadata={"filehash": "f4"})],
+                                 ids=["f4-0"])
+            self.assertEqual(len(loaded), 6)
+            self.assertTrue(os.path.exists(os.path.join(tmp, "manifest.json")))
+
+    def _segments(self, directory):
+        return sorted(f for f in os.listdir(directory) if f.endswith(".npy"))
+
+    def test_save_writes_only_new_rows(self):
+        import numpy as np
+        from flat_index import FlatIndex
+        with tempfile.TemporaryDirectory() as tmp:
+            index = FlatIndex(FakeEmbeddings(), directory=tmp)
+            index.add_documents([self.Document(page_content="python", metadata={"filehash": "a"})],
+                                ids=["a-0"])
+            index.save()
+            first = self._segments(tmp)
+            index.add_documents([self.Document(page_content="datos", metadata={"filehash": "b"})],
+                                ids=["b-0"])
+            index.save()
+            index.save()  # sin cambios no se escribe nada
+            new = sorted(set(self._segments(tmp)) - set(first))
+            self.assertEqual(len(new), 1)
+            self.assertEqual(np.load(os.path.join(tmp, new[0])).shape[0], 1)
+            index.delete_file("a")
+            index.save()
+            reloaded = FlatIndex(FakeEmbeddings(), directory=tmp)
+            self.assertEqual(reloaded.get(include=[])["ids"], ["b-0"])
+
+    def test_two_writers_keep_both_and_refresh(self):
+        from flat_index import FlatIndex
+        with tempfile.TemporaryDirectory() as tmp:
+            app = FlatIndex(FakeEmbeddings(), directory=tmp)
+            cli = FlatIndex(FakeEmbeddings(), directory=tmp)
+            app.add_documents([self.Document(page_content="guion", metadata={"filehash": "app"})],
+                              ids=["app-0"])
+            cli.add_documents([self.Document(page_content="contrato", metadata={"filehash": "cli"})],
+                              ids=["cli-0"])
+            app.save()
+            cli.save()
+            # El segundo en guardar incorpora lo del primero en vez de pisarlo
+            self.assertEqual(sorted(cli.get(include=[])["ids"]), ["app-0", "cli-0"])
+            self.assertEqual(app.get(ids=["cli-0"], include=[])["ids"], [])
+            self.assertEqual(app.refresh(), 1)
+            self.assertEqual(app.get(ids=["cli-0"])["documents"], ["contrato"])
+            self.assertEqual(app.refresh(), 0)
+            reloaded = FlatIndex(FakeEmbeddings(), directory=tmp)
+            self.assertEqual(sorted(reloaded.get(include=[])["ids"]), ["app-0", "cli-0"])
+
+    def test_compaction_after_max_segments(self):
+        import flat_index
+        from flat_index import FlatIndex
+        with tempfile.TemporaryDirectory() as tmp:
+            old_max = flat_index.FLAT_INDEX_MAX_SEGMENTS
+            flat_index.FLAT_INDEX_MAX_SEGMENTS = 3
+            try:
+                writer = FlatIndex(FakeEmbeddings(), directory=tmp)
+                reader = FlatIndex(FakeEmbeddings(), directory=tmp)
+                for i in range(5):
+                    writer.add_documents(
+                        [self.Document(page_content=f"datos {i}", metadata={"filehash": f"f{i}"})],
+                        ids=[f"f{i}-0"])
+                    writer.save()
+            finally:
+                flat_index.FLAT_INDEX_MAX_SEGMENTS = old_max
+            self.assertLessEqual(len(self._segments(tmp)), 3)
+            # Un lector de una generación anterior se recarga entero
+            reader.add_documents([self.Document(page_content="escena", metadata={"filehash": "r"})],
+                                 ids=["r-0"])
+            reader.refresh()
+            self.assertEqual(len(reader), 6)
+            reader.save()
+            self.assertEqual(len(FlatIndex(FakeEmbeddings(), directory=tmp)), 6)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
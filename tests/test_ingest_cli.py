@@ -0,0 +1,118 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "benchmarks"))
+
+from synthetic_pdf import make_pdf, synthetic_pages
+
+HAS_DEPS = all(importlib.util.find_spec(m) is not None
+               for m in ("numpy", "langchain", "PyPDF2"))
+
+# ingest_cli.run con la configuración por defecto, salvo embeddings falsos e
+# índice plano en memoria. Va en un subproceso: si un pool no se cierra, el
+# test falla por tiempo en lugar de colgar la suite.
+RUN_SCRIPT = textwrap.dedent("""
+    import sys
+    from unittest import mock
+    import ingest_cli
+    from flat_index import FlatIndex
+    from vector_index import is_file_indexed
+
+
+    class FakeEmbeddings:
+        def _vector(self, text):
+            return [float(len(text) % 7) + 1.0, float(text.count("a")) + 1.0, 1.0]
+
+        def embed_documents(self, texts):
+            return [self._vector(t) for t in texts]
+
+        def embed_query(self, text):
+            return self._vector(text)
+
+
+    if __name__ == "__main__":
+        index = FlatIndex(FakeEmbeddings())
+        with mock.patch.object(ingest_cli, "get_shared_embeddings", FakeEmbeddings), \\
+                mock.patch.object(ingest_cli, "get_shared_index", lambda e: index):
+            rc = ingest_cli.run(sys.argv[1], workers=2, recursive=False, batch_size=64)
+        hashes = {m["filehash"] for m in index.get(include=["metadatas"])["metadatas"]}
+        print("indexed", sum(is_file_indexed(index, h) for h in hashes))
+        sys.exit(rc)
+""")
+
+
+@unittest.skipUnless(HAS_DEPS, "numpy, langchain o PyPDF2 no están instalados")
+class TestIngestCLI(unittest.TestCase):
+
+    def test_run_indexes_directory_and_exits(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, doc_type in enumerate(["curriculum_vitae", "brochure_educativo",
+                                          "articulo_academico", "guion_pelicula"]):
+                pages = synthetic_pages(6, doc_type, seed=i, chars_per_page=1200)
+                with open(os.path.join(tmp, f"doc{i}.pdf"), "wb") as fh:
+                    fh.write(make_pdf(pages))
+            script = os.path.join(tmp, "run_ingest.py")
+            with open(script, "w", encoding="utf-8") as fh:
+                fh.write(RUN_SCRIPT)
+            env = dict(os.environ, PYTHONPATH=PROJECT_ROOT,
+                       EXTRACTION_CACHE_DIR=os.path.join(tmp, "cache"),
+                       CHUNK_STORE_DIR=os.path.join(tmp, "chunks"))
+
+            try:
+                proc = subprocess.run([sys.executable, script, tmp], env=env, cwd=tmp,
+                                      capture_output=True, text=True, timeout=120)
+            except subprocess.TimeoutExpired:
+                self.fail("ingest_cli.run no terminó")
+
+            self.assertEqual(proc.returncode, 0, proc.stderr[-2000:])
+            self.assertIn("indexed 4", proc.stdout)
+
+
+@unittest.skipUnless(HAS_DEPS and importlib.util.find_spec("fcntl") is not None,
+                     "dependencias o fcntl no disponibles")
+class TestChromaSingleWriter(unittest.TestCase):
+
+    def test_cli_refuses_while_app_holds_the_index(self):
+        import fcntl
+        from unittest import mock
+        import ingest_cli
+        import vector_index
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "doc.pdf"), "wb") as fh:
+                fh.write(make_pdf(["texto"]))
+            chroma_dir = os.path.join(tmp, "chroma")
+            os.makedirs(chroma_dir)
+            # La app abre el índice: flock compartido (otra descripción de archivo)
+            app = open(os.path.join(chroma_dir, vector_index.CHROMA_CLAIM_FILE), "a")
+            fcntl.flock(app, fcntl.LOCK_SH)
+            load = mock.Mock(side_effect=AssertionError("no debe cargar el modelo"))
+            try:
+                with mock.patch.object(vector_index, "VECTOR_INDEX_DIR", chroma_dir), \
+                        mock.patch.object(vector_index, "_claim", None), \
+                        mock.patch.object(ingest_cli, "VECTOR_BACKEND", "chroma"), \
+                        mock.patch.object(ingest_cli, "get_shared_embeddings", load):
+                    self.assertEqual(ingest_cli.run(tmp, 1, False, 64), 1)
+                    # Parada la app, el CLI puede tomar el índice en exclusiva
+                    app.close()
+                    vector_index.claim_index_directory(exclusive=True)
+                    cli, vector_index._claim = vector_index._claim, None
+                    # ...y entonces es la app la que no puede abrirlo
+                    with self.assertRaises(vector_index.IndexInUseError):
+                        vector_index.claim_index_directory(exclusive=False)
+                    cli.close()
+            finally:
+                app.close()
+            load.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
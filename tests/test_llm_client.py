@@ -0,0 +1,62 @@
+import importlib.util
+import os
+import sys
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from stub_ollama import StubOllama
+
+HAS_REQUESTS = importlib.util.find_spec("requests") is not None
+
+
+@unittest.skipUnless(HAS_REQUESTS, "requests no está instalado")
+class TestOllamaClient(unittest.TestCase):
+
+    def setUp(self):
+        from llm_client import OllamaClient
+        self.stub = StubOllama(tokens=4)
+        self.client = OllamaClient(base_url=self.stub.start(), model="stub", keep_alive="5m")
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_invoke_returns_full_text(self):
+        self.assertEqual(self.client.invoke("hola"), "token0 token1 token2 token3 ")
+        self.assertFalse(self.stub.requests[0]["stream"])
+
+    def test_stream_yields_chunks_and_stats(self):
+        done = []
+        chunks = list(self.client.stream("x" * 400, on_done=done.append))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(done[0].eval_count, 4)
+        self.assertEqual(done[0].prompt_eval_count, 100)
+
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            list(self.client.stream("hola"))
+        self.client.invoke("hola")
+        # Todas las peticiones viajan por la misma conexión del pool
+        self.assertEqual(len(self.stub.connections), 1)
+
+    def test_preload_sends_keep_alive_without_prompt(self):
+        self.client.preload()
+        self.assertEqual(self.stub.requests[0]["prompt_chars"], 0)
+        self.assertEqual(self.stub.requests[0]["keep_alive"], "5m")
+        # Mismo num_ctx que las preguntas: Ollama no recarga el modelo en la primera
+        self.client.invoke("hola")
+        preload, first = self.stub.requests
+        self.assertEqual(preload["options"]["num_ctx"], first["options"]["num_ctx"])
+
+    def test_unreachable_server_raises_llm_error(self):
+        from llm_client import LLMError, OllamaClient
+        client = OllamaClient(base_url="http://127.0.0.1:9", max_retries=0, connect_timeout=0.5)
+        with self.assertRaises(LLMError):
+            client.invoke("hola")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,87 @@
+import time
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+import metrics
+from metrics import (LLM_TOKENS, STAGE_SECONDS, STAGE_TOTAL, Registry,
+                     record_ollama_generation, stage_timer, timed_iter)
+
+
+class TestPrometheusFormat(unittest.TestCase):
+
+    def test_counter_and_histogram_render(self):
+        registry = Registry()
+        requests = registry.counter("req_total", "Peticiones", ["route"])
+        latency = registry.histogram("lat_seconds", "Latencia", buckets=(0.1, 1.0))
+        requests.inc(route="/q")
+        requests.inc(2, route="/q")
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+
+        text = registry.render()
+        self.assertIn("# TYPE req_total counter", text)
+        self.assertIn('req_total{route="/q"} 3', text)
+        self.assertIn('lat_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('lat_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('lat_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("lat_seconds_count 3", text)
+        self.assertIn("lat_seconds_sum 5.55", text)
+
+    def test_registering_twice_returns_same_metric(self):
+        registry = Registry()
+        self.assertIs(registry.counter("a_total", "A"), registry.counter("a_total", "A"))
+
+
+class TestStageTiming(unittest.TestCase):
+
+    def _sum(self, stage):
+        series = STAGE_SECONDS._series.get((stage,))
+        return series[1] if series else 0.0
+
+    def test_nested_stage_time_is_exclusive(self):
+        outer_before, inner_before = self._sum("t_outer"), self._sum("t_inner")
+        with stage_timer("t_outer"):
+            time.sleep(0.02)
+            with stage_timer("t_inner"):
+                time.sleep(0.05)
+        outer = self._sum("t_outer") - outer_before
+        inner = self._sum("t_inner") - inner_before
+        self.assertGreaterEqual(inner, 0.045)
+        self.assertLess(outer, 0.045)
+
+    def test_timed_iter_records_one_observation_per_iterator(self):
+        def slow_pages():
+            for i in range(3):
+                time.sleep(0.01)
+                yield i
+
+        before = STAGE_SECONDS.count(stage="t_iter")
+        self.assertEqual(list(timed_iter(slow_pages(), "t_iter")), [0, 1, 2])
+        self.assertEqual(STAGE_SECONDS.count(stage="t_iter"), before + 1)
+        self.assertGreaterEqual(self._sum("t_iter"), 0.025)
+
+    def test_errors_are_counted(self):
+        before = STAGE_TOTAL.value(stage="t_error", status="error")
+        with self.assertRaises(ValueError):
+            with stage_timer("t_error"):
+                raise ValueError("fallo")
+        self.assertEqual(STAGE_TOTAL.value(stage="t_error", status="error"), before + 1)
+
+
+class TestOllamaMetrics(unittest.TestCase):
+
+    def test_records_tokens_and_rate(self):
+        before = LLM_TOKENS.value(operation="t_op", kind="completion")
+        record_ollama_generation({"eval_count": 50, "eval_duration": 2_000_000_000,
+                                  "prompt_eval_count": 300,
+                                  "prompt_eval_duration": 500_000_000}, "t_op")
+        self.assertEqual(LLM_TOKENS.value(operation="t_op", kind="completion"), before + 50)
+        self.assertEqual(LLM_TOKENS.value(operation="t_op", kind="prompt"), 300)
+        self.assertEqual(metrics.LLM_TOKENS_PER_SECOND.count(operation="t_op"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,232 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+HAS_LANGCHAIN = importlib.util.find_spec("langchain") is not None
+HAS_DEPS = HAS_LANGCHAIN and importlib.util.find_spec("numpy") is not None
+
+
+def numbered_pages(count: int, sentences: int = 30):
+    """Páginas con frases numeradas; cada página corta una frase a la mitad."""
+    pages = []
+    for p in range(count):
+        words = " ".join(f"Frase {p}-{s} con contenido variado." for s in range(sentences))
+        pages.append(f"final de la frase partida {p}. {words} Comienzo de la frase partida")
+    return pages
+
+
+class FakeEmbeddings:
+    def _vector(self, text):
+        return [float(len(text) % 11) + 1.0, float(text.count("a")) + 1.0, 1.0]
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@unittest.skipUnless(HAS_LANGCHAIN, "langchain no está instalado")
+class TestIterAdaptiveChunks(unittest.TestCase):
+
+    def test_streaming_matches_whole_document_split(self):
+        from pipeline import iter_adaptive_chunks, split_adaptive
+        for count, sentences in ((6, 30), (20, 3), (3, 100)):
+            pages = numbered_pages(count, sentences)
+            self.assertEqual(list(iter_adaptive_chunks(iter(pages), "curriculum_vitae")),
+                             split_adaptive("".join(p + "\n" for p in pages), "curriculum_vitae"))
+
+    def test_chunks_span_page_boundaries(self):
+        from pipeline import iter_adaptive_chunks
+        chunks = list(iter_adaptive_chunks(iter(numbered_pages(20, 3)), "curriculum_vitae"))
+        self.assertTrue(all(len(c) <= 800 for c in chunks))
+        # Páginas cortas: la frase partida se reúne en un chunk con su final
+        self.assertTrue(any("Comienzo de la frase partida\nfinal de la frase" in c
+                            for c in chunks))
+
+    def test_empty_pages_are_ignored(self):
+        from pipeline import iter_adaptive_chunks
+        self.assertEqual(list(iter_adaptive_chunks(["", "", ""], "curriculum_vitae")), [])
+        self.assertEqual(list(iter_adaptive_chunks(["", "Hola", ""], "curriculum_vitae")),
+                         ["Hola"])
+
+
+@unittest.skipUnless(HAS_LANGCHAIN, "langchain no está instalado")
+class TestDocumentStream(unittest.TestCase):
+
+    def setUp(self):
+        from extraction_cache import ExtractionCache
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ExtractionCache(self.tmpdir.name, 10 * 1024 * 1024)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _stream(self, pages, **kwargs):
+        from pipeline import DocumentStream
+        return DocumentStream("doc.pdf", "abc", "curriculum_vitae", iter(pages), False,
+                              cache_writer=self.cache.writer("abc"), **kwargs)
+
+    def test_full_iteration_commits_cache(self):
+        pages = numbered_pages(3)
+        document = self._stream(pages)
+        chunks = list(document.chunks())
+        self.assertTrue(chunks)
+        self.assertEqual(document.page_count, 3)
+        doc_type, cached = self.cache.open_pages("abc")
+        self.assertEqual(doc_type, "curriculum_vitae")
+        self.assertEqual(list(cached), pages)
+
+    def test_partial_iteration_aborts_cache(self):
+        document = self._stream(numbered_pages(5))
+        chunks = document.chunks()
+        next(chunks)
+        chunks.close()
+        self.assertIsNone(self.cache.open_pages("abc"))
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_on_head_fires_once_before_the_end(self):
+        calls = []
+        document = self._stream(
+            numbered_pages(10), head_chars=500,
+            on_head=lambda head, doc_type: calls.append((head, doc_type, document.page_count)))
+        list(document.chunks())
+        self.assertEqual(len(calls), 1)
+        head, doc_type, pages_read = calls[0]
+        self.assertEqual(len(head), 500)
+        self.assertEqual(doc_type, "curriculum_vitae")
+        self.assertEqual(pages_read, 1)
+        self.assertTrue(numbered_pages(1)[0].startswith(head[:400]))
+
+    def test_on_head_fires_at_end_for_short_documents(self):
+        calls = []
+        document = self._stream(["Documento corto."], head_chars=2000,
+                                on_head=lambda head, doc_type: calls.append(head))
+        list(document.pages())
+        self.assertEqual(calls, ["Documento corto.\n"])
+
+    def test_error_while_reading_aborts_cache(self):
+        def failing_pages():
+            yield "primera página"
+            raise OSError("PDF truncado")
+
+        from pipeline import DocumentStream
+        document = DocumentStream("doc.pdf", "abc", "curriculum_vitae", failing_pages(), False,
+                                  cache_writer=self.cache.writer("abc"))
+        with self.assertRaises(OSError):
+            list(document.pages())
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+
+@unittest.skipUnless(HAS_DEPS, "numpy o langchain no están instalados")
+class TestIndexChunks(unittest.TestCase):
+
+    def setUp(self):
+        from flat_index import FlatIndex
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index = FlatIndex(FakeEmbeddings())
+        self.texts = [f"chunk número {i} con texto propio " * 3 for i in range(10)]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _index(self, texts, batch_size=3, complete=None):
+        from vector_index import index_chunks
+        return index_chunks(self.index, "f1", "f1.pdf", "curriculum_vitae", texts,
+                            batch_size=batch_size, directory=self.tmpdir.name,
+                            complete=complete)
+
+    def test_only_last_chunk_is_marked(self):
+        from vector_index import is_file_indexed
+        file_chunks, embedded = self._index(iter(self.texts))
+        file_chunks.close()
+        self.assertTrue(embedded)
+        self.assertEqual(len(self.index), 10)
+        marked = self.index.get(where={"last_chunk": True})
+        self.assertEqual(marked["ids"], ["f1-9"])
+        self.assertEqual(marked["metadatas"][0]["total_chunks"], 10)
+        self.assertTrue(is_file_indexed(self.index, "f1"))
+
+    def test_resume_after_interrupted_indexing(self):
+        from vector_index import is_file_indexed
+
+        def interrupted():
+            yield from self.texts[:7]
+            raise RuntimeError("sesión cerrada")
+
+        with self.assertRaises(RuntimeError):
+            self._index(interrupted())
+        # Hay lotes indexados pero sin marcador: el archivo no cuenta como indexado
+        self.assertGreater(len(self.index), 0)
+        self.assertFalse(is_file_indexed(self.index, "f1"))
+
+        file_chunks, embedded = self._index(iter(self.texts))
+        file_chunks.close()
+        self.assertTrue(embedded)
+        self.assertEqual(len(self.index), 10)
+        self.assertTrue(is_file_indexed(self.index, "f1"))
+
+        # Ya completo: la siguiente vez no se embebe
+        file_chunks, embedded = self._index(iter(self.texts))
+        file_chunks.close()
+        self.assertFalse(embedded)
+        self.assertEqual(len(file_chunks), 10)
+
+    def test_incomplete_extraction_is_reindexed_next_time(self):
+        from vector_index import is_file_indexed
+        # Faltan páginas: otros chunk_id y menos chunks que el texto completo
+        partial = [f"parcial {i} " * 5 for i in range(12)]
+        file_chunks, embedded = self._index(iter(partial), complete=lambda: False)
+        file_chunks.close()
+        self.assertTrue(embedded)
+        self.assertEqual(self.index.get(where={"last_chunk": True})["ids"], [])
+        self.assertFalse(is_file_indexed(self.index, "f1"))
+
+        # La siguiente subida, ya completa, reindexa desde cero
+        file_chunks, embedded = self._index(iter(self.texts), complete=lambda: True)
+        self.assertTrue(embedded)
+        self.assertTrue(is_file_indexed(self.index, "f1"))
+        self.assertEqual(len(self.index), 10)
+        stored = self.index.get(ids=[f"f1-{i}" for i in range(10)])
+        self.assertEqual(stored["documents"], [file_chunks.store.read(i) for i in range(10)])
+        file_chunks.close()
+
+
+@unittest.skipUnless(HAS_DEPS, "numpy o langchain no están instalados")
+class TestIndexNamespace(unittest.TestCase):
+
+    class Model:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+    def test_depends_on_model_and_text_config(self):
+        import boilerplate
+        import pipeline
+        from vector_index import index_namespace
+        base = index_namespace(self.Model("all-MiniLM-L6-v2"))
+        self.assertEqual(base, index_namespace(self.Model("all-MiniLM-L6-v2")))
+        self.assertNotEqual(base, index_namespace(self.Model("all-MiniLM-L6-v2+int8")))
+        with mock.patch.object(boilerplate, "BOILERPLATE_WINDOW", 6):
+            self.assertNotEqual(base, index_namespace(self.Model("all-MiniLM-L6-v2")))
+        with mock.patch.object(pipeline, "STREAM_SPLIT_FACTOR", 8):
+            self.assertNotEqual(base, index_namespace(self.Model("all-MiniLM-L6-v2")))
+
+    def test_flat_index_lives_in_its_namespace(self):
+        import vector_index
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(vector_index, "VECTOR_BACKEND", "flat"), \
+                mock.patch.object(vector_index, "FLAT_INDEX_DIR", tmp), \
+                mock.patch.object(vector_index, "_index", None):
+            model = self.Model("modelo")
+            index = vector_index.get_shared_index(model)
+            self.assertEqual(index.directory,
+                             os.path.join(tmp, vector_index.index_namespace(model)))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,34 @@
+import unittest
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from streaming import StreamStats, timed_stream
+
+
+class TestTimedStream(unittest.TestCase):
+
+    def test_passes_chunks_through_in_order(self):
+        stats = StreamStats()
+        out = list(timed_stream(iter(["Hola", "", " mundo", "!"]), stats))
+        self.assertEqual(out, ["Hola", " mundo", "!"])
+        self.assertEqual(stats.tokens, 3)
+        self.assertEqual(stats.chars, len("Hola mundo!"))
+
+    def test_records_timings(self):
+        stats = StreamStats()
+        self.assertIsNone(stats.time_to_first_token)
+        list(timed_stream(iter(["a", "b", "c"]), stats))
+        self.assertIsNotNone(stats.time_to_first_token)
+        self.assertGreaterEqual(stats.time_to_first_token, 0)
+        self.assertIsNotNone(stats.end)
+        self.assertGreaterEqual(stats.tokens_per_second, 0)
+
+    def test_empty_stream(self):
+        stats = StreamStats()
+        self.assertEqual(list(timed_stream(iter([]), stats)), [])
+        self.assertEqual(stats.tokens_per_second, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
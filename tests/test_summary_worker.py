@@ -0,0 +1,47 @@
+import threading
+import unittest
+from concurrent.futures import Future
+from test_config import setup_test_environment
+
+setup_test_environment()
+
+from summary_worker import collect_finished, submit_summary
+
+
+class TestSummaryWorker(unittest.TestCase):
+
+    def test_submit_runs_in_background(self):
+        release = threading.Event()
+
+        def slow_summary(text, doc_type, filename):
+            release.wait(5)
+            return f"Resumen de {filename}"
+
+        future = submit_summary(slow_summary, "a.pdf", "texto", "documento_generico", "a.pdf")
+        self.assertFalse(future.done())
+        release.set()
+        self.assertEqual(future.result(timeout=5), "Resumen de a.pdf")
+
+    def test_collect_finished(self):
+        done, failed, pending = Future(), Future(), Future()
+        done.set_result("Listo")
+        failed.set_exception(RuntimeError("ollama caído"))
+        summaries = [
+            {"filehash": "h1", "summary": None, "pending": True},
+            {"filehash": "h2", "summary": None, "pending": True},
+            {"filehash": "h3", "summary": None, "pending": True},
+        ]
+        futures = {"h1": done, "h2": failed, "h3": pending}
+
+        remaining = collect_finished(summaries, futures)
+
+        self.assertEqual(remaining, 1)
+        self.assertEqual(list(futures), ["h3"])
+        self.assertEqual(summaries[0]["summary"], "Listo")
+        self.assertFalse(summaries[0]["pending"])
+        self.assertIn("ollama caído", summaries[1]["summary"])
+        self.assertTrue(summaries[2]["pending"])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
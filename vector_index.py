@@ -0,0 +1,297 @@
+# vector_index.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin comprobación de otros procesos
+    fcntl = None
+
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+
+from boilerplate import config_version
+from chunk_registry import FileChunks
+from chunk_store import CHUNK_STORE_DIR, ChunkFileWriter
+from dedup import get_dedup_index
+from embedding_backend import EMBEDDING_MODEL
+from flat_index import FlatIndex
+from metrics import stage_timer
+from pipeline import chunking_version
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Configuración
+# ===========================
+VECTOR_INDEX_DIR = os.getenv("CHROMA_PERSIST_DIR", "") or os.path.join(".cache", "chroma")
+SHARED_COLLECTION_NAME = os.getenv("SHARED_COLLECTION_NAME", "copiloto-shared")
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "256"))
+# "chroma" (SQLite + HNSW) o "flat" (matriz NumPy en memoria, ver flat_index)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+FLAT_INDEX_DIR = os.getenv("FLAT_INDEX_DIR", "") or os.path.join(".cache", "flat_index")
+
+VectorStore = Union[Chroma, FlatIndex]
+
+_index: Optional[VectorStore] = None
+_index_lock = threading.Lock()
+_file_locks: Dict[str, threading.Lock] = {}
+_file_locks_guard = threading.Lock()
+# Archivo con el flock que anuncia qué proceso usa el directorio de Chroma
+_claim = None
+
+CHROMA_CLAIM_FILE = ".in-use.lock"
+
+
+class IndexInUseError(RuntimeError):
+    """Otro proceso usa el directorio de Chroma de forma incompatible."""
+
+
+def claim_index_directory(exclusive: bool, directory: Optional[str] = None):
+    """
+    Chroma (PersistentClient) no admite varios procesos escribiendo el mismo
+    directorio: uno no ve los segmentos HNSW del otro y puede corromperlo.
+    La app y la API toman un flock compartido al abrir el índice y el CLI de
+    ingesta uno exclusivo, así que el CLI se niega a correr mientras alguna
+    está arrancada (y al revés). Se mantiene mientras viva el proceso. Con
+    VECTOR_BACKEND=flat no hace falta: el índice plano admite varios
+    escritores.
+    """
+    global _claim
+    directory = directory or VECTOR_INDEX_DIR
+    if _claim is not None or fcntl is None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    fh = open(os.path.join(directory, CHROMA_CLAIM_FILE), "a")
+    try:
+        fcntl.flock(fh, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        fh.close()
+        if exclusive:
+            raise IndexInUseError(
+                f"El índice Chroma de {directory} está abierto por la app o la API: "
+                f"páralas antes de la ingesta por lotes o usa VECTOR_BACKEND=flat")
+        raise IndexInUseError(
+            f"El índice Chroma de {directory} está en uso por una ingesta por lotes: "
+            f"espera a que termine o usa VECTOR_BACKEND=flat")
+    _claim = fh
+
+
+def index_namespace(embeddings) -> str:
+    """
+    Identifica el contenido del índice: modelo de embeddings (con su
+    cuantización y precisión, ver SentenceTransformerBackend.name), limpieza
+    de cabeceras y troceado. Un archivo marcado como indexado con otra
+    configuración tendría otros vectores y otros chunk_id, así que cada
+    configuración usa su propia colección (o directorio) y, al cambiarla, los
+    archivos se vuelven a indexar al subirlos.
+    """
+    model_name = getattr(embeddings, "model_name", None) or EMBEDDING_MODEL
+    identity = "|".join([model_name, config_version(), chunking_version()])
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()[:12]
+
+
+def _open_flat_index(embeddings, directory: str) -> FlatIndex:
+    logger.info(f"🗄️ Abriendo índice plano compartido en {directory}")
+    try:
+        return FlatIndex(embeddings, directory=directory)
+    except (OSError, ValueError) as e:
+        # Se aparta el directorio y los archivos se vuelven a indexar al subirlos
+        aside = f"{directory}.corrupt-{int(time.time())}"
+        logger.warning(f"⚠️ Índice plano ilegible en {directory} ({e}), "
+                       f"se mueve a {aside} y se empieza vacío")
+        os.replace(directory, aside)
+        return FlatIndex(embeddings, directory=directory)
+
+
+def get_shared_index(embeddings) -> VectorStore:
+    """
+    Devuelve el índice compartido por todas las sesiones (Chroma o, con
+    VECTOR_BACKEND=flat, un FlatIndex). Los chunks se guardan una vez por
+    hash de archivo y persisten entre reinicios, en una colección (o
+    subdirectorio) propia de la configuración (ver index_namespace).
+    """
+    global _index
+    with _index_lock:
+        if _index is None and VECTOR_BACKEND == "flat":
+            _index = _open_flat_index(
+                embeddings, os.path.join(FLAT_INDEX_DIR, index_namespace(embeddings)))
+        elif _index is None:
+            claim_index_directory(exclusive=False)
+            collection = f"{SHARED_COLLECTION_NAME}-{index_namespace(embeddings)}"
+            logger.info(
+                f"🗄️ Abriendo índice compartido '{collection}' en {VECTOR_INDEX_DIR}")
+            _index = Chroma(
+                collection_name=collection,
+                embedding_function=embeddings,
+                persist_directory=VECTOR_INDEX_DIR
+            )
+        return _index
+
+
+def _file_lock(filehash: str) -> threading.Lock:
+    with _file_locks_guard:
+        return _file_locks.setdefault(filehash, threading.Lock())
+
+
+def is_file_indexed(vs: VectorStore, filehash: str) -> bool:
+    """
+    Un archivo está indexado completo si existe su último chunk, que es el
+    único marcado con last_chunk (en streaming el total no se conoce antes).
+    """
+    found = vs.get(where={"$and": [{"filehash": filehash}, {"last_chunk": True}]},
+                   limit=1, include=[])
+    return bool(found["ids"])
+
+
+def _add_with_vectors(vs: VectorStore, documents: List[Document], ids: List[str],
+                      vectors: List[List[float]]):
+    """Indexa documentos cuyo vector ya se conoce, sin pasar por el modelo."""
+    texts = [d.page_content for d in documents]
+    metadatas = [d.metadata for d in documents]
+    if isinstance(vs, FlatIndex):
+        vs.add_embeddings(texts, vectors, metadatas, ids)
+    else:
+        # El Chroma de langchain siempre embebe en add_texts: se va a la colección
+        vs._collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas,
+                              documents=texts)
+
+
+def _add_batch(vs: VectorStore, filehash: str, source: str, doc_type: str,
+               batch: List[Tuple[int, str, Optional[str], Optional[List[float]]]],
+               total: Optional[int] = None):
+    """
+    Indexa un lote; con 'total' el último documento marca el archivo como
+    completo. Los chunks con vector (casi duplicados de otro archivo) se
+    indexan con el del canónico.
+    """
+    embed_group: Tuple[list, list, list] = ([], [], [])
+    vector_group: Tuple[list, list, list] = ([], [], [])
+    for chunk_id, text, duplicate_of, vector in batch:
+        metadata = {
+            'source': source,
+            'filehash': filehash,
+            'doc_type': doc_type,
+            'chunk_id': chunk_id,
+            'chunk_size': len(text),
+        }
+        if duplicate_of:
+            metadata['duplicate_of'] = duplicate_of
+        group = embed_group if vector is None else vector_group
+        group[0].append(Document(page_content=text, metadata=metadata))
+        group[1].append(f"{filehash}-{chunk_id}")
+        group[2].append(vector)
+    last_group = embed_group if batch[-1][3] is None else vector_group
+    if total is not None:
+        last_group[0][-1].metadata.update(last_chunk=True, total_chunks=total)
+    with stage_timer("indexing"):
+        # El grupo con el último chunk va después: el marcador solo existe si
+        # todo lo anterior ya está indexado
+        for documents, ids, vectors in sorted((embed_group, vector_group),
+                                              key=lambda g: g is last_group):
+            if not documents:
+                continue
+            if vectors[0] is None:
+                vs.add_documents(documents, ids=ids)
+            else:
+                _add_with_vectors(vs, documents, ids, vectors)
+
+
+def _canonical_vector(vs: VectorStore, canonical_id: str) -> Optional[List[float]]:
+    """Vector ya indexado del chunk canónico (None si no está en el índice)."""
+    found = vs.get(ids=[canonical_id], include=["embeddings"])
+    embeddings = found.get("embeddings")
+    if not found["ids"] or embeddings is None or len(embeddings) == 0:
+        return None
+    return [float(x) for x in embeddings[0]]
+
+
+def index_chunks(vs: VectorStore, filehash: str, source: str, doc_type: str,
+                 texts: Iterable[str], batch_size: int = INDEX_BATCH_SIZE,
+                 directory: str = CHUNK_STORE_DIR,
+                 complete: Optional[Callable[[], bool]] = None) -> Tuple[FileChunks, bool]:
+    """
+    Consume los chunks a medida que se producen: cada uno se escribe en el
+    ChunkFile de la sesión y, si el archivo no estaba ya en el índice
+    compartido, se embebe e indexa en lotes de batch_size. En memoria sólo
+    queda un lote. Devuelve (FileChunks, hubo_que_embeber).
+
+    Los casi duplicados (ver dedup) no se embeben: si el canónico es del
+    mismo archivo el chunk no se indexa, y si es de otro se indexa con
+    duplicate_of y el vector del canónico, para que la búsqueda filtrada por
+    los archivos de la sesión lo siga encontrando.
+
+    complete() se consulta al agotar 'texts': si devuelve False (p. ej. la
+    extracción omitió páginas) los chunks se indexan pero sin el marcador de
+    último chunk, así que la siguiente subida lo vuelve a indexar entero.
+    Antes de reindexar se borran los chunks de intentos anteriores, cuyos
+    chunk_id ya no corresponden al texto completo.
+    """
+    with _file_lock(filehash):
+        if isinstance(vs, FlatIndex):
+            # Recoge lo que hayan indexado otros procesos (p. ej. ingest_cli)
+            vs.refresh()
+        embed = not is_file_indexed(vs, filehash)
+        dedup = get_dedup_index() if embed else None
+        if embed and vs.get(where={"filehash": filehash}, limit=1, include=[])["ids"]:
+            logger.info(f"🧹 {source}: se descartan los chunks de un intento incompleto")
+            vs.delete(where={"filehash": filehash})
+            dedup.forget(filehash)
+        writer = ChunkFileWriter(directory)
+        pending: List[Tuple[int, str, Optional[str], Optional[List[float]]]] = []
+        skipped = reused = 0
+        try:
+            for text in texts:
+                chunk_id = writer.append(text)
+                if not embed:
+                    continue
+                canonical = dedup.check(text, filehash, chunk_id) if dedup else None
+                duplicate_of = vector = None
+                if canonical is not None:
+                    if canonical[0] == filehash:
+                        skipped += 1
+                        continue
+                    duplicate_of = f"{canonical[0]}-{canonical[1]}"
+                    vector = _canonical_vector(vs, duplicate_of)
+                    reused += vector is not None
+                pending.append((chunk_id, text, duplicate_of, vector))
+                # Se retiene un chunk más que el lote para saber cuál es el último
+                if len(pending) > batch_size:
+                    _add_batch(vs, filehash, source, doc_type, pending[:batch_size])
+                    pending = pending[batch_size:]
+            finished = complete is None or complete()
+            if pending:
+                _add_batch(vs, filehash, source, doc_type, pending,
+                           total=len(writer) if finished else None)
+            # Chroma persiste solo; el índice plano guarda al terminar cada
+            # archivo un segmento con sus chunks (no rehace la matriz entera)
+            if embed and isinstance(vs, FlatIndex) and vs.directory:
+                with stage_timer("indexing"):
+                    vs.save()
+        except BaseException:
+            writer.abort()
+            if dedup is not None:
+                dedup.forget(filehash)
+            raise
+        file_chunks = FileChunks(filehash, source, doc_type, writer.finish())
+
+    if skipped or reused:
+        logger.info(f"♻️ {source}: {skipped} chunks duplicados sin indexar y "
+                    f"{reused} vectores reutilizados de otros archivos")
+    if embed and not finished:
+        logger.warning(f"⚠️ {source} indexado sin completar ({len(file_chunks)} chunks): "
+                       f"se reintentará en la próxima subida")
+    elif embed:
+        logger.info(f"✅ {source} indexado: {len(file_chunks)} chunks")
+    else:
+        logger.info(f"♻️ {source} ya estaba indexado ({len(file_chunks)} chunks)")
+    return file_chunks, embed
+
+
+def session_filter(file_hashes: Iterable[str]) -> dict:
+    """Filtro (sintaxis de Chroma) que restringe la búsqueda a los archivos de una sesión."""
+    return {"filehash": {"$in": sorted(file_hashes)}}